@@ -0,0 +1,587 @@
+"""
+Admission control in front of the Gemini-bound routes.
+
+Every request that may call Gemini is first checked against two token buckets,
+one for the calling client and one for the care recipient it concerns, and is
+answered 429 if either is empty. It then needs one of ADMISSION_MAX_IN_FLIGHT
+slots. When none is free it waits in a bounded queue ordered by priority, then
+arrival, and is answered 503 when the queue is full or its deadline passes.
+Both answers carry a Retry-After header, so a burst is shed in milliseconds
+instead of piling up behind the Gemini quota.
+
+With the sqlite backend the buckets, queue and slots live in one SQLite file
+shared by every gunicorn worker (and worker.py) on the host; the memory backend
+limits each process on its own.
+
+ADMISSION_BACKEND: 'memory' (default), 'sqlite' or 'none'
+ADMISSION_DB_PATH: SQLite file for the sqlite backend (default admission.db)
+ADMISSION_MAX_IN_FLIGHT: requests allowed to call Gemini at once (default 16)
+ADMISSION_MAX_WAITING: requests allowed to wait for a slot (default 64)
+ADMISSION_QUEUE_TIMEOUT: seconds a request waits for a slot (default 10)
+ADMISSION_CLIENT_RATE / ADMISSION_CLIENT_BURST: requests per second and burst
+    per client (default 0.5 and 10)
+ADMISSION_RECIPIENT_RATE / ADMISSION_RECIPIENT_BURST: the same per care
+    recipient (default 0.2 and 5); a rate of 0 turns that limit off
+ADMISSION_TRUSTED_PROXIES: comma-separated addresses or networks of the
+    reverse proxies in front of the app (e.g. '10.0.0.0/8'); only requests
+    from them have their client taken from X-Forwarded-For
+
+Cache hits are never charged: routes hand an Admitter to GeminiService, which
+charges the rate limits only once a request needs the model, before it joins
+a shared single-flight call, and takes an in-flight slot only around the call
+itself. The async paths run the store calls on a worker thread, since the
+sqlite backend blocks.
+"""
+import asyncio
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+import metrics
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 16))
+ADMISSION_MAX_WAITING = int(os.getenv('ADMISSION_MAX_WAITING', 64))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))
+ADMISSION_CLIENT_RATE = float(os.getenv('ADMISSION_CLIENT_RATE', 0.5))
+ADMISSION_CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', 10))
+ADMISSION_RECIPIENT_RATE = float(os.getenv('ADMISSION_RECIPIENT_RATE', 0.2))
+ADMISSION_RECIPIENT_BURST = float(os.getenv('ADMISSION_RECIPIENT_BURST', 5))
+# A slot whose holder died is reclaimed after this long
+ADMISSION_LEASE_SECONDS = float(os.getenv('ADMISSION_LEASE_SECONDS', 300))
+# Retry-After sent when the queue is full or a request waited too long
+ADMISSION_BUSY_RETRY_AFTER = float(os.getenv('ADMISSION_BUSY_RETRY_AFTER', 5))
+ADMISSION_POLL_INTERVAL = float(os.getenv('ADMISSION_POLL_INTERVAL', 0.02))
+
+
+def _parse_networks(spec: str) -> Tuple:
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(',') if item.strip())
+
+
+TRUSTED_PROXIES = _parse_networks(os.getenv('ADMISSION_TRUSTED_PROXIES', ''))
+
+# Higher priorities leave the wait queue first
+PRIORITY_BACKGROUND = 0
+PRIORITY_BATCH = 1
+PRIORITY_INTERACTIVE = 2
+
+# enter() outcomes
+ADMITTED = 'admitted'
+QUEUED = 'queued'
+FULL = 'full'
+
+
+def _is_trusted(address: str, trusted_proxies: Tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_address(remote_addr: Optional[str], forwarded_for: Optional[str] = None,
+                   trusted_proxies: Tuple = None) -> str:
+    """
+    Rate-limit identity of a request: the peer address, unless the peer is a
+    trusted proxy. X-Forwarded-For is then read from the right, skipping hops
+    added by trusted proxies, since everything left of them is client-supplied.
+    """
+    trusted_proxies = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    address = remote_addr or 'unknown'
+    if not forwarded_for or not _is_trusted(address, trusted_proxies):
+        return address
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(',') if hop.strip()]):
+        address = hop
+        if not _is_trusted(hop, trusted_proxies):
+            break
+    return address
+
+
+class AdmissionRejected(Exception):
+    """A request that was shed; `status` is 429 or 503"""
+
+    def __init__(self, status: int, reason: str, retry_after: float, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One request's place in the wait queue, then its slot"""
+
+    __slots__ = ('id', 'priority', 'enqueued_at', 'deadline')
+
+    def __init__(self, priority: int, timeout: float):
+        self.id = uuid.uuid4().hex
+        self.priority = priority
+        self.enqueued_at = time.time()
+        self.deadline = self.enqueued_at + timeout
+
+    def ahead_of(self, other: 'Ticket') -> bool:
+        return (-self.priority, self.enqueued_at, self.id) < (-other.priority, other.enqueued_at, other.id)
+
+
+def _refill(tokens: float, updated: float, rate: float, burst: float, now: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class MemoryAdmissionStore:
+    """Limiter state for one process"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._waiters: Dict[str, Ticket] = {}
+        self._leases: Dict[str, float] = {}
+
+    def take(self, buckets: List[Tuple[str, float, float]], now: float) -> Tuple[float, Optional[str]]:
+        """
+        Take one token from every bucket, or from none of them.
+        Returns (0, None) on success, else (seconds until possible, limiting key).
+        """
+        with self._lock:
+            levels = [
+                (key, _refill(*self._buckets.get(key, (burst, now)), rate, burst, now), rate)
+                for key, rate, burst in buckets
+            ]
+            wait, limited = max(((1 - tokens) / rate, key) for key, tokens, rate in levels) if levels else (0, None)
+            if wait > 0:
+                return wait, limited
+            for key, tokens, _ in levels:
+                self._buckets[key] = (tokens - 1, now)
+            return 0, None
+
+    def purge_buckets(self, idle_before: float):
+        with self._lock:
+            for key in [k for k, (_, updated) in self._buckets.items() if updated < idle_before]:
+                del self._buckets[key]
+
+    def _purge(self, now: float):
+        for ticket_id in [t for t, ticket in self._waiters.items() if ticket.deadline < now]:
+            del self._waiters[ticket_id]
+        for ticket_id in [t for t, expires_at in self._leases.items() if expires_at < now]:
+            del self._leases[ticket_id]
+
+    def _admissible(self, ticket: Ticket, max_in_flight: int) -> bool:
+        ahead = sum(1 for other in self._waiters.values() if other.ahead_of(ticket))
+        return ahead < max_in_flight - len(self._leases)
+
+    def enter(self, ticket: Ticket, max_in_flight: int, max_waiting: int, lease_until: float) -> str:
+        with self._lock:
+            self._purge(ticket.enqueued_at)
+            if not self._waiters and len(self._leases) < max_in_flight:
+                self._leases[ticket.id] = lease_until
+                return ADMITTED
+            if len(self._waiters) >= max_waiting:
+                return FULL
+            self._waiters[ticket.id] = ticket
+            return QUEUED
+
+    def try_admit(self, ticket: Ticket, max_in_flight: int, lease_until: float) -> bool:
+        with self._lock:
+            self._purge(time.time())
+            if ticket.id not in self._waiters or not self._admissible(ticket, max_in_flight):
+                return False
+            del self._waiters[ticket.id]
+            self._leases[ticket.id] = lease_until
+            return True
+
+    def leave(self, ticket: Ticket):
+        with self._lock:
+            self._waiters.pop(ticket.id, None)
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            self._leases.pop(ticket.id, None)
+
+    def counts(self) -> Tuple[int, int]:
+        """(in flight, waiting)"""
+        with self._lock:
+            self._purge(time.time())
+            return len(self._leases), len(self._waiters)
+
+
+class SQLiteAdmissionStore:
+    """
+    Limiter state in a local SQLite file, so every worker process on the host
+    shares one set of buckets, one queue and one in-flight cap.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript('''
+            CREATE TABLE IF NOT EXISTS admission_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS admission_waiters (
+                ticket TEXT PRIMARY KEY,
+                priority INTEGER NOT NULL,
+                enqueued_at REAL NOT NULL,
+                deadline REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS admission_waiters_order ON admission_waiters (priority DESC, enqueued_at);
+            CREATE TABLE IF NOT EXISTS admission_leases (
+                ticket TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+        ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def take(self, buckets: List[Tuple[str, float, float]], now: float) -> Tuple[float, Optional[str]]:
+        with self._transaction() as conn:
+            levels = []
+            for key, rate, burst in buckets:
+                row = conn.execute('SELECT tokens, updated FROM admission_buckets WHERE key = ?', (key,)).fetchone()
+                levels.append((key, _refill(*(row or (burst, now)), rate, burst, now), rate))
+            wait, limited = max(((1 - tokens) / rate, key) for key, tokens, rate in levels) if levels else (0, None)
+            if wait > 0:
+                return wait, limited
+            conn.executemany(
+                'INSERT OR REPLACE INTO admission_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                [(key, tokens - 1, now) for key, tokens, _ in levels]
+            )
+            return 0, None
+
+    def purge_buckets(self, idle_before: float):
+        self._connect().execute('DELETE FROM admission_buckets WHERE updated < ?', (idle_before,))
+
+    def _purge(self, conn: sqlite3.Connection, now: float):
+        conn.execute('DELETE FROM admission_waiters WHERE deadline < ?', (now,))
+        conn.execute('DELETE FROM admission_leases WHERE expires_at < ?', (now,))
+
+    def _count(self, conn: sqlite3.Connection, table: str) -> int:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def enter(self, ticket: Ticket, max_in_flight: int, max_waiting: int, lease_until: float) -> str:
+        with self._transaction() as conn:
+            self._purge(conn, ticket.enqueued_at)
+            waiting = self._count(conn, 'admission_waiters')
+            if not waiting and self._count(conn, 'admission_leases') < max_in_flight:
+                conn.execute('INSERT INTO admission_leases (ticket, expires_at) VALUES (?, ?)', (ticket.id, lease_until))
+                return ADMITTED
+            if waiting >= max_waiting:
+                return FULL
+            conn.execute(
+                'INSERT INTO admission_waiters (ticket, priority, enqueued_at, deadline) VALUES (?, ?, ?, ?)',
+                (ticket.id, ticket.priority, ticket.enqueued_at, ticket.deadline)
+            )
+            return QUEUED
+
+    def try_admit(self, ticket: Ticket, max_in_flight: int, lease_until: float) -> bool:
+        now = time.time()
+        # Cheap read first, so waiters polling a full cap do not take the write lock
+        conn = self._connect()
+        in_flight = conn.execute(
+            'SELECT COUNT(*) FROM admission_leases WHERE expires_at >= ?', (now,)
+        ).fetchone()[0]
+        if in_flight >= max_in_flight:
+            return False
+
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            if conn.execute('SELECT 1 FROM admission_waiters WHERE ticket = ?', (ticket.id,)).fetchone() is None:
+                return False
+            ahead = conn.execute(
+                'SELECT COUNT(*) FROM admission_waiters WHERE priority > ? '
+                'OR (priority = ? AND (enqueued_at < ? OR (enqueued_at = ? AND ticket < ?)))',
+                (ticket.priority, ticket.priority, ticket.enqueued_at, ticket.enqueued_at, ticket.id)
+            ).fetchone()[0]
+            if ahead >= max_in_flight - self._count(conn, 'admission_leases'):
+                return False
+            conn.execute('DELETE FROM admission_waiters WHERE ticket = ?', (ticket.id,))
+            conn.execute('INSERT INTO admission_leases (ticket, expires_at) VALUES (?, ?)', (ticket.id, lease_until))
+            return True
+
+    def leave(self, ticket: Ticket):
+        self._connect().execute('DELETE FROM admission_waiters WHERE ticket = ?', (ticket.id,))
+
+    def release(self, ticket: Ticket):
+        self._connect().execute('DELETE FROM admission_leases WHERE ticket = ?', (ticket.id,))
+
+    def counts(self) -> Tuple[int, int]:
+        conn = self._connect()
+        now = time.time()
+        in_flight = conn.execute('SELECT COUNT(*) FROM admission_leases WHERE expires_at >= ?', (now,)).fetchone()[0]
+        waiting = conn.execute('SELECT COUNT(*) FROM admission_waiters WHERE deadline >= ?', (now,)).fetchone()[0]
+        return in_flight, waiting
+
+
+class AdmissionController:
+    """Rate limits and the in-flight cap with its priority wait queue"""
+
+    # Idle buckets are dropped every this many rate checks
+    PURGE_EVERY = 1000
+
+    def __init__(
+        self,
+        store=None,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_waiting: int = ADMISSION_MAX_WAITING,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        client_rate: float = ADMISSION_CLIENT_RATE,
+        client_burst: float = ADMISSION_CLIENT_BURST,
+        recipient_rate: float = ADMISSION_RECIPIENT_RATE,
+        recipient_burst: float = ADMISSION_RECIPIENT_BURST,
+        lease_seconds: float = ADMISSION_LEASE_SECONDS,
+        busy_retry_after: float = ADMISSION_BUSY_RETRY_AFTER,
+        poll_interval: float = ADMISSION_POLL_INTERVAL
+    ):
+        self.store = store or MemoryAdmissionStore()
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.lease_seconds = lease_seconds
+        self.busy_retry_after = busy_retry_after
+        self.poll_interval = poll_interval
+        # A bucket untouched for this long is full again, so it can be forgotten
+        self._bucket_idle = max(
+            [burst / rate for rate, burst in ((client_rate, client_burst), (recipient_rate, recipient_burst)) if rate > 0]
+            or [0]
+        )
+        self._lock = threading.Lock()
+        self._rate_checks = 0
+        self._counters = {
+            'admitted': 0,
+            'queued': 0,
+            'rate_limited': 0,
+            'queue_full': 0,
+            'queue_timeout': 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _reject(self, status: int, reason: str, retry_after: float, message: str) -> AdmissionRejected:
+        self._count(reason)
+        metrics.record_admission_rejection(reason)
+        return AdmissionRejected(status, reason, retry_after, message)
+
+    # ============= RATE LIMITS =============
+
+    def check_rate(self, client_id: str, care_recipient_id=None):
+        """Take a token for the client and the recipient; raises AdmissionRejected (429) if either is empty"""
+        buckets = []
+        if self.client_rate > 0 and client_id:
+            buckets.append((f'client:{client_id}', self.client_rate, self.client_burst))
+        if self.recipient_rate > 0 and care_recipient_id:
+            buckets.append((f'recipient:{care_recipient_id}', self.recipient_rate, self.recipient_burst))
+        if not buckets:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._rate_checks += 1
+            purge = self._rate_checks % self.PURGE_EVERY == 0
+        if purge:
+            self.store.purge_buckets(now - self._bucket_idle)
+
+        wait, limited = self.store.take(buckets, now)
+        if wait > 0:
+            kind = limited.split(':', 1)[0]
+            raise self._reject(429, 'rate_limited', wait, f'Too many analysis requests for this {kind}')
+
+    # ============= IN-FLIGHT CAP =============
+
+    def _enter(self, priority: int, timeout: float) -> Tuple[Ticket, str]:
+        ticket = Ticket(priority, min(timeout, self.queue_timeout) if timeout else self.queue_timeout)
+        outcome = self.store.enter(ticket, self.max_in_flight, self.max_waiting, ticket.enqueued_at + self.lease_seconds)
+        if outcome == FULL:
+            raise self._reject(503, 'queue_full', self.busy_retry_after, 'Server is busy, please retry shortly')
+        self._count('queued' if outcome == QUEUED else 'admitted')
+        return ticket, outcome
+
+    def _admitted_after_wait(self, ticket: Ticket) -> bool:
+        return self.store.try_admit(ticket, self.max_in_flight, time.time() + self.lease_seconds)
+
+    def _timed_out(self, ticket: Ticket):
+        self.store.leave(ticket)
+        metrics.observe_stage('admission_wait', time.time() - ticket.enqueued_at)
+        return self._reject(503, 'queue_timeout', self.busy_retry_after, 'Server is busy, please retry shortly')
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> Ticket:
+        """
+        Take an in-flight slot, waiting in the priority queue if all are busy.
+        Raises AdmissionRejected (503) if the queue is full or the wait times out.
+        """
+        ticket, outcome = self._enter(priority, timeout)
+        if outcome == ADMITTED:
+            return ticket
+        while not self._admitted_after_wait(ticket):
+            if time.time() >= ticket.deadline:
+                raise self._timed_out(ticket)
+            time.sleep(self.poll_interval)
+        self._count('admitted')
+        metrics.observe_stage('admission_wait', time.time() - ticket.enqueued_at)
+        return ticket
+
+    async def acquire_async(self, priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> Ticket:
+        """acquire() for the event loop; store calls run on a worker thread"""
+        ticket, outcome = await asyncio.to_thread(self._enter, priority, timeout)
+        if outcome == ADMITTED:
+            return ticket
+        try:
+            while not await asyncio.to_thread(self._admitted_after_wait, ticket):
+                if time.time() >= ticket.deadline:
+                    raise await asyncio.to_thread(self._timed_out, ticket)
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            # The client went away while queued; a slot taken by the last poll is freed too
+            self.store.leave(ticket)
+            self.store.release(ticket)
+            raise
+        self._count('admitted')
+        metrics.observe_stage('admission_wait', time.time() - ticket.enqueued_at)
+        return ticket
+
+    def release(self, ticket: Optional[Ticket]):
+        """Give the slot back; safe to call more than once"""
+        if ticket is not None:
+            self.store.release(ticket)
+
+    # ============= REQUESTS =============
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        ticket = self.acquire(priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: int = PRIORITY_INTERACTIVE):
+        ticket = await self.acquire_async(priority)
+        try:
+            yield ticket
+        finally:
+            await asyncio.to_thread(self.release, ticket)
+
+    def stats(self) -> Dict:
+        in_flight, waiting = self.store.counts()
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'backend': self.store.name,
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'max_in_flight': self.max_in_flight,
+            'max_waiting': self.max_waiting,
+            'queue_timeout_seconds': self.queue_timeout,
+            'client_rate': self.client_rate,
+            'recipient_rate': self.recipient_rate,
+            **counters
+        }
+
+
+class Admitter:
+    """
+    Admission for the model calls of one request, so cache hits cost nothing.
+    charge() takes the client and recipient rate-limit tokens, once per
+    request (e.g. for a whole batch, and only if some shift needs the model),
+    in the caller before it joins a shared single-flight call, so one client's
+    429 never reaches another client's request. slot() holds an
+    in-flight slot around the one model call a single-flight group makes.
+    """
+
+    def __init__(
+        self,
+        controller: Optional[AdmissionController],
+        client_id: str = None,
+        care_recipient_id=None,
+        priority: int = PRIORITY_INTERACTIVE
+    ):
+        self.controller = controller
+        self.client_id = client_id
+        self.care_recipient_id = care_recipient_id
+        self.priority = priority
+        # The AdmissionRejected of a failed charge, repeated to the request's later model calls
+        self.rejection: Optional[AdmissionRejected] = None
+        self._charged = False
+        self._lock = threading.Lock()
+
+    def charge(self):
+        """
+        Take this request's rate-limit tokens; raises AdmissionRejected (429)
+        if either bucket is empty, and again on every later charge
+        """
+        if self.controller is None:
+            return
+        with self._lock:
+            if not self._charged:
+                self._charged = True
+                try:
+                    self.controller.check_rate(self.client_id, self.care_recipient_id)
+                except AdmissionRejected as e:
+                    self.rejection = e
+            if self.rejection is not None:
+                e = self.rejection
+                raise AdmissionRejected(e.status, e.reason, e.retry_after, str(e))
+
+    async def charge_async(self):
+        if self.controller is not None and not self._charged:
+            await asyncio.to_thread(self.charge)
+        else:
+            self.charge()
+
+    @contextmanager
+    def slot(self):
+        if self.controller is None:
+            yield None
+            return
+        with self.controller.slot(self.priority) as ticket:
+            yield ticket
+
+    @asynccontextmanager
+    async def slot_async(self):
+        if self.controller is None:
+            yield None
+            return
+        async with self.controller.slot_async(self.priority) as ticket:
+            yield ticket
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    backend_name = os.getenv('ADMISSION_BACKEND', 'memory').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'sqlite':
+        return AdmissionController(SQLiteAdmissionStore(os.getenv('ADMISSION_DB_PATH', 'admission.db')))
+    if backend_name == 'memory':
+        return AdmissionController(MemoryAdmissionStore())
+    raise ValueError(f"Unknown ADMISSION_BACKEND '{backend_name}', expected memory, sqlite or none")
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Cache stored in a local SQLite file so every gunicorn worker on the
+    same machine shares the same entries.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM analysis_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            with self._connect() as conn:
+                conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+            return None
+        return value
+
+    def set(self, key: str, value: str):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, time.time() + self.ttl_seconds)
+            )
+            # Opportunistically drop expired rows so the file does not grow forever
+            conn.execute('DELETE FROM analysis_cache WHERE expires_at < ?', (time.time(),))
+
+    def size(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+
+class AnalysisCache:
+    """Content-addressed cache for Gemini analysis results"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str) -> str:
+        """Hash the built prompt together with the model so either change is a miss"""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(prompt.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never break analysis, treat it as a miss
+            print(f"Error reading analysis cache: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, result: Dict):
+        try:
+            self.backend.set(key, json.dumps(result))
+        except Exception as e:
+            print(f"Error writing analysis cache: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this worker process plus the backend size"""
+        with self._lock:
+            hits, misses, errors = self.hits, self.misses, self.errors
+        lookups = hits + misses
+        try:
+            entries = self.backend.size()
+        except Exception:
+            entries = None
+        return {
+            'backend': self.backend.name,
+            'hits': hits,
+            'misses': misses,
+            'errors': errors,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries
+        }
+
+
+def create_analysis_cache() -> Optional[AnalysisCache]:
+    """
+    Build the analysis cache from environment variables.
+
+    ANALYSIS_CACHE_BACKEND: 'memory' (default), 'sqlite' or 'none'
+    ANALYSIS_CACHE_TTL: seconds an entry stays valid (default 86400)
+    ANALYSIS_CACHE_MAX_ENTRIES: LRU size for the memory backend (default 512)
+    ANALYSIS_CACHE_PATH: SQLite file for the sqlite backend (default analysis_cache.db)
+    """
+    backend_name = os.getenv('ANALYSIS_CACHE_BACKEND', 'memory').lower()
+    ttl_seconds = float(os.getenv('ANALYSIS_CACHE_TTL', 86400))
+
+    if backend_name == 'none':
+        return None
+    if backend_name == 'sqlite':
+        path = os.getenv('ANALYSIS_CACHE_PATH', 'analysis_cache.db')
+        return AnalysisCache(SQLiteCacheBackend(path, ttl_seconds=ttl_seconds))
+    if backend_name == 'memory':
+        max_entries = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 512))
+        return AnalysisCache(MemoryCacheBackend(max_entries=max_entries, ttl_seconds=ttl_seconds))
+
+    raise ValueError(f"Unknown ANALYSIS_CACHE_BACKEND '{backend_name}', expected memory, sqlite or none")
@@ -1,9 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
+import hmac
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from gemini_service import GeminiService
+from gemini_service import GeminiService, StreamingResponseParser
+from clients import client_manager, Lazy, peek
+from analysis_cache import create_analysis_cache
+from single_flight import create_single_flight
+from jobs import create_job_queue
+from summary_store import create_summary_store
+from timeline import RecipientTimeline
+from admission import (
+    create_admission_controller, client_address, Admitter, AdmissionRejected, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+)
+import metrics
+import data_access
+from pagination import PaginationError, parse_limit, parse_fields, decode_cursor, page_response
 
 # Load environment variables
 load_dotenv()
@@ -11,37 +27,412 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React Native app
 
-# Initialize Supabase client
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     print("Warning: SUPABASE_URL or SUPABASE_ANON_KEY not found in environment variables.")
     print("Please add them to your .env file.")
-    supabase: Client = None
-else:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+def _create_supabase():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return None
+    client = client_manager.create_supabase(SUPABASE_URL, SUPABASE_KEY)
     print("Supabase client initialized successfully!")
+    return client
+
+
+def _create_gemini_service():
+    # None if the API key is not configured
+    # Imported here so numpy is loaded with the service, not when the app is imported
+    from near_duplicates import create_near_duplicate_index
+    try:
+        service = GeminiService(
+            cache=create_analysis_cache(),
+            single_flight=create_single_flight(),
+            near_duplicates=create_near_duplicate_index()
+        )
+        print("Gemini AI service initialized successfully!")
+        return service
+    except Exception as e:
+        print(f"Warning: Gemini AI service not available: {e}")
+        return None
+
+
+# Clients and stores are built on first use in each worker process (see
+# clients.Lazy), so importing the app is fast and gunicorn --preload never
+# shares a connection pool or SQLite handle across a fork.
+supabase = Lazy('supabase', _create_supabase)
+gemini_service = Lazy('gemini', _create_gemini_service)
+
+# Queue for background analysis jobs run by worker.py (None if disabled)
+job_queue = Lazy('jobs', create_job_queue)
+
+# Per-shift summaries and rolling digests reused by /summary and timeline analyses
+summary_store = Lazy('summary_store', create_summary_store)
+
+# Rate limits, in-flight cap and wait queue for Gemini-bound requests (None if disabled)
+admission = Lazy('admission', create_admission_controller)
+
+# Recipient timeline analysis covers this many recent shifts by default
+TIMELINE_SHIFTS = int(os.getenv('TIMELINE_SHIFTS', 10))
+TIMELINE_MAX_SHIFTS = int(os.getenv('TIMELINE_MAX_SHIFTS', 50))
+
+# Upper bounds for /shifts/analyze-batch
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv('ANALYZE_BATCH_CONCURRENCY', 4))
+ANALYZE_BATCH_MAX_SHIFTS = int(os.getenv('ANALYZE_BATCH_MAX_SHIFTS', 50))
+
+# ============= HELPERS =============
+
+def _shift_to_notes(shift):
+    """
+    Convert a shift's single content string to the format expected by gemini_service.
+    The gemini_service expects a list of note dictionaries.
+    """
+    return [{
+        'content': shift.get('content'),
+        'caregiver_name': 'Shift Caregiver',
+        'timestamp': shift.get('date', '')
+    }]
+
+
+def _shift_context(shift):
+    """Prepare shift context for the analysis prompt"""
+    return {
+        'shift_number': shift.get('shift_no'),
+        'date': shift.get('date'),
+        'start_time': shift.get('start_time'),
+        'end_time': shift.get('end_time')
+    }
+
+
+def _load_shift_with_recipient(shift_id):
+    """
+    Get a shift and its care recipient profile (with all personal data) from Supabase
+    in a single query. Returns (None, None) if the shift does not exist.
+    """
+    return data_access.load_shift_with_recipient(supabase, shift_id)
+
+
+def _client_key(headers, remote_addr):
+    """Caller identity for per-client rate limits; X-Forwarded-For only counts behind ADMISSION_TRUSTED_PROXIES"""
+    return client_address(remote_addr, headers.get('X-Forwarded-For'))
+
+
+def _admitter(client_id=None, care_recipient_id=None, priority=PRIORITY_INTERACTIVE):
+    """
+    Admission for a request's model calls. GeminiService charges its rate
+    limits and takes a slot only when the model is actually called, raising
+    AdmissionRejected if the request is shed. Without a client or recipient only the in-flight cap applies (e.g.
+    per-shift calls of an already admitted batch, or background work).
+    """
+    controller = admission.resolve() if isinstance(admission, Lazy) else admission
+    return Admitter(controller or None, client_id, care_recipient_id, priority)
+
+
+def _request_admitter(care_recipient_id=None, priority=PRIORITY_INTERACTIVE):
+    """_admitter charging the calling client and the care recipient"""
+    return _admitter(_client_key(request.headers, request.remote_addr), care_recipient_id, priority)
+
+
+def _rejection(error):
+    """Body and headers for a request shed by admission control"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    return {'error': str(error), 'reason': error.reason, 'retry_after': retry_after}, {'Retry-After': str(retry_after)}
+
+
+def _rejected_response(error):
+    body, headers = _rejection(error)
+    return jsonify(body), error.status, headers
+
+
+def _analysis_fingerprint(shift, care_recipient_profile):
+    """
+    What a precomputed analysis is valid for: the key of the prompt and model
+    the shift would be analyzed with, so editing the notes, date or shift
+    number, the profile, or the model makes a stored result stale
+    """
+    return gemini_service.analysis_key(
+        shift_notes=_shift_to_notes(shift),
+        care_recipient_name=care_recipient_profile.get('name') if care_recipient_profile else None,
+        shift_context=_shift_context(shift),
+        care_recipient_profile=care_recipient_profile
+    )
+
+
+def _precomputed_analysis(shift, care_recipient_profile):
+    """Stored analysis for the shift's current analysis inputs, if any"""
+    if not job_queue:
+        return None
+    try:
+        with metrics.stage('precomputed_lookup'):
+            return job_queue.get_result(shift['uuid'], _analysis_fingerprint(shift, care_recipient_profile))
+    except Exception as e:
+        print(f"Error reading precomputed analysis: {e}")
+        return None
+
+
+def _analyze_and_store(shift, care_recipient_profile, admitter=None):
+    """
+    Run the Gemini analysis for a shift and keep a successful result in the job
+    store, so later reads (and worker.py) can reuse it. The admitter is only
+    entered if the model has to be called.
+    """
+    analysis = gemini_service.analyze_shift_notes(
+        shift_notes=_shift_to_notes(shift),
+        care_recipient_name=care_recipient_profile.get('name') if care_recipient_profile else None,
+        shift_context=_shift_context(shift),
+        care_recipient_profile=care_recipient_profile,
+        admit=admitter
+    )
+    _store_analysis(shift, care_recipient_profile, analysis)
+    return analysis
+
+
+def _store_analysis(shift, care_recipient_profile, analysis):
+    """Keep a successful analysis in the job store"""
+    if job_queue and not analysis.get('error'):
+        try:
+            job_queue.store_result(shift['uuid'], _analysis_fingerprint(shift, care_recipient_profile), analysis)
+        except Exception as e:
+            print(f"Error storing analysis result: {e}")
+
+
+def _stored_summary(shift):
+    """Stored summary for the shift's current notes, if any"""
+    if summary_store:
+        return summary_store.get_shift_summary(shift['uuid'], shift['content'])
+    return None
+
+
+def _shift_summary(shift, admitter=None):
+    """Stored summary for the shift's current notes, generating and storing it if missing"""
+    stored = _stored_summary(shift)
+    if stored:
+        return stored
+
+    summary = gemini_service.generate_shift_summary(_shift_to_notes(shift), admit=admitter)
+    _store_summary(shift, summary)
+    return summary
+
 
-# Initialize Gemini service (will be None if API key not configured)
-try:
-    gemini_service = GeminiService()
-    print("Gemini AI service initialized successfully!")
-except Exception as e:
-    gemini_service = None
-    print(f"Warning: Gemini AI service not available: {e}")
+def _store_summary(shift, summary):
+    """Keep a successful summary for the shift's current notes"""
+    if summary_store and not gemini_service.summary_failed(summary):
+        summary_store.set_shift_summary(shift['uuid'], shift['content'], summary)
+
+
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _replay_events(analysis):
+    """Stream events of an analysis that is already complete"""
+    yield from StreamingResponseParser.events_for(analysis)
+    yield {'event': 'done', 'data': analysis}
+
+def _parse_batch_request(body):
+    """
+    Validate an /shifts/analyze-batch body.
+    Returns (params, None) on success or (None, error message).
+    """
+    shift_ids = body.get('shift_ids')
+    care_recipient_id = body.get('care_recipient_id')
+
+    if shift_ids is not None and not isinstance(shift_ids, list):
+        return None, 'shift_ids must be a list of shift UUIDs'
+    if not shift_ids and not care_recipient_id:
+        return None, 'Provide either shift_ids or care_recipient_id'
+    if shift_ids and len(shift_ids) > ANALYZE_BATCH_MAX_SHIFTS:
+        return None, f'At most {ANALYZE_BATCH_MAX_SHIFTS} shifts can be analyzed per batch'
+
+    try:
+        concurrency = int(body.get('concurrency', ANALYZE_BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        return None, 'concurrency must be an integer'
+
+    return {
+        'shift_ids': shift_ids,
+        'care_recipient_id': care_recipient_id,
+        'start_date': body.get('start_date'),
+        'end_date': body.get('end_date'),
+        'concurrency': max(1, min(concurrency, ANALYZE_BATCH_CONCURRENCY))
+    }, None
+
+
+def _batch_shifts_query(client, params):
+    """Single select covering every shift in the batch (works for sync and async clients)"""
+    query = client.table('shifts').select('*')
+    if params['shift_ids']:
+        return query.in_('uuid', params['shift_ids'])
+
+    query = query.eq('care_recipient_id', params['care_recipient_id'])
+    if params['start_date']:
+        query = query.gte('date', params['start_date'])
+    if params['end_date']:
+        query = query.lte('date', params['end_date'])
+    return query.order('date', desc=True).limit(ANALYZE_BATCH_MAX_SHIFTS)
+
+
+def _batch_entry(shift, analysis):
+    """Per-shift result of a batch analysis"""
+    if analysis.get('error'):
+        return {'shift_id': shift['uuid'], 'status': 'error', 'error': analysis['error']}
+    return {'shift_id': shift['uuid'], 'status': 'ok', 'analysis': analysis}
+
+
+def _batch_shed(admitter, results):
+    """True if the batch was rate limited and no shift could be answered without the model"""
+    return admitter.rejection is not None and not any(r['status'] == 'ok' for r in results)
+
+
+def _batch_response(results, params, shifts):
+    """Build the batch response, reporting requested shifts that do not exist"""
+    if params['shift_ids']:
+        found = {s['uuid'] for s in shifts}
+        results.extend(
+            {'shift_id': shift_id, 'status': 'not_found', 'error': 'Shift not found'}
+            for shift_id in params['shift_ids'] if shift_id not in found
+        )
+
+    return {
+        'results': results,
+        'total': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': sum(1 for r in results if r['status'] != 'ok')
+    }
+
+
+def _service_state(service, available):
+    """Health label of a client or store; never builds a lazy one"""
+    if isinstance(service, Lazy) and not service.built:
+        return 'not initialized'
+    return available if peek(service) else 'not configured'
+
+
+def _readiness():
+    """
+    Build every client and store this process needs and report which are
+    usable; ready once the database and the AI service are both configured.
+    """
+    checks = {
+        'supabase': 'connected' if supabase else 'not configured',
+        'gemini': 'available' if gemini_service else 'not configured',
+        'jobs': 'available' if job_queue else 'disabled',
+        'summary_store': 'available' if summary_store else 'disabled',
+        'admission': 'available' if admission else 'disabled'
+    }
+    ready = checks['supabase'] == 'connected' and checks['gemini'] == 'available'
+    return ready, checks
+
+
+def _init_seconds():
+    return {
+        service.name: round(service.init_seconds, 4)
+        for service in (supabase, gemini_service, job_queue, summary_store, admission)
+        if isinstance(service, Lazy) and service.built
+    }
+
+
+def _health_status():
+    """
+    Status payload shared by the WSGI and ASGI /health endpoints. Reports on
+    clients as they are and does not build them; /health/ready does.
+    """
+    service = peek(gemini_service)
+    queue, store, controller = peek(job_queue), peek(summary_store), peek(admission)
+    return {
+        'status': 'ok',
+        'message': 'Server is running',
+        'live': True,
+        'ready': bool(peek(supabase) and service),
+        'supabase': _service_state(supabase, 'connected'),
+        'gemini': _service_state(gemini_service, 'available'),
+        'analysis_cache': service.cache.stats() if service and service.cache else 'disabled',
+        'clients': client_manager.stats(),
+        'client_init_seconds': _init_seconds(),
+        'single_flight': service.single_flight.stats() if service else 'disabled',
+        'profile_prompts': service.profile_prompts.stats() if service else 'disabled',
+        'models': service.router.stats() if service else 'disabled',
+        'near_duplicates': service.near_duplicates.stats() if service and service.near_duplicates else 'disabled',
+        'jobs': queue.stats() if queue else _service_state(job_queue, 'disabled'),
+        'summary_store': store.stats() if store else _service_state(summary_store, 'disabled'),
+        'recipient_cache': data_access.recipient_cache.stats(),
+        'admission': controller.stats() if controller else _service_state(admission, 'disabled')
+    }
+
+
+def _analysis_source(analysis):
+    """X-Analysis-Source of an analysis produced for this request"""
+    if analysis.get('near_duplicate'):
+        return 'similar'
+    # Exact analysis-cache hits are marked by GeminiService
+    return 'cache' if analysis.get('prompt_metadata', {}).get('cached') else 'live'
+
+
+def _empty_analysis():
+    """Analysis returned for shifts without any notes"""
+    return {
+        'suggestions': [],
+        'summary': 'No shift notes available for this shift.',
+        'priorities': []
+    }
+
+
+# ============= REQUEST METRICS =============
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.stage_timings = metrics.start_request()
+
+
+def _record_request_metrics(status_code: int) -> float:
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.finish_request(route, request.method, status_code, elapsed)
+    return elapsed
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    if g.get('streaming'):
+        # Recorded by the stream's generator once the last event is sent
+        elapsed = time.perf_counter() - g.request_started
+    else:
+        elapsed = _record_request_metrics(response.status_code)
+    if metrics.METRICS_TIMING_HEADER:
+        response.headers['Server-Timing'] = metrics.server_timing(g.stage_timings, elapsed)
+    return response
 
 # ============= API ENDPOINTS =============
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'ok',
-        'message': 'Server is running',
-        'supabase': 'connected' if supabase else 'not configured',
-        'gemini': 'available' if gemini_service else 'not configured'
-    })
+    return jsonify(_health_status())
+
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process answers requests; touches no client"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: builds this worker's clients on first call; 503 until they are usable"""
+    ready, checks = _readiness()
+    body = {'status': 'ready' if ready else 'not ready', **checks, 'client_init_seconds': _init_seconds()}
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms, Gemini usage and error counts in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # ============= AI/GEMINI ENDPOINTS =============
 
@@ -62,62 +453,243 @@ def analyze_shift_notes(shift_id):
         }), 503
 
     try:
-        # Get shift information from Supabase
-        shift_response = supabase.table('shifts').select('*').eq('uuid', shift_id).single().execute()
+        shift, care_recipient_profile = _load_shift_with_recipient(shift_id)
 
-        if not shift_response.data:
+        if not shift:
             return jsonify({'error': 'Shift not found'}), 404
 
-        shift = shift_response.data
+        # In the new schema, shift notes are stored in the 'content' field
+        if not shift.get('content'):
+            return jsonify(_empty_analysis())
+
+        # Serve the analysis precomputed by worker.py if the inputs have not changed
+        precomputed = _precomputed_analysis(shift, care_recipient_profile)
+        if precomputed is not None:
+            response = jsonify(precomputed)
+            response.headers['X-Analysis-Source'] = 'precomputed'
+            return response
+
+        # Call Gemini service to analyze notes with recipient profile; only a
+        # model call (not a cache hit) goes through admission control
+        analysis = _analyze_and_store(shift, care_recipient_profile, _request_admitter(shift.get('care_recipient_id')))
+        response = jsonify(analysis)
+        response.headers['X-Analysis-Source'] = _analysis_source(analysis)
+        return response
+
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        print(f"Error analyzing shift notes: {e}")
+        return jsonify({
+            'error': f'Error analyzing shift notes: {str(e)}',
+            'suggestions': [],
+            'summary': '',
+            'priorities': []
+        }), 500
 
-        # Get care recipient profile with all personal data
-        care_recipient_name = None
-        care_recipient_profile = None
-        if shift.get('care_recipient_id'):
-            recipient_response = supabase.table('care_recipients').select('*').eq('id', shift['care_recipient_id']).single().execute()
-            if recipient_response.data:
-                care_recipient_name = recipient_response.data.get('name')
-                care_recipient_profile = recipient_response.data
 
-        # In the new schema, shift notes are stored in the 'content' field
-        shift_content = shift.get('content')
-
-        if not shift_content:
-            return jsonify({
-                'suggestions': [],
-                'summary': 'No shift notes available for this shift.',
-                'priorities': []
-            })
-
-        # Convert single content string to the format expected by gemini_service
-        # The gemini_service expects a list of note dictionaries
-        notes = [{
-            'content': shift_content,
-            'caregiver_name': 'Shift Caregiver',
-            'timestamp': shift.get('date', '')
-        }]
-
-        # Prepare shift context
-        shift_context = {
-            'shift_number': shift.get('shift_no'),
-            'date': shift.get('date'),
-            'start_time': shift.get('start_time'),
-            'end_time': shift.get('end_time')
-        }
-
-        # Call Gemini service to analyze notes with recipient profile
+@app.route('/shifts/<shift_id>/analyze/stream', methods=['GET', 'POST'])
+def stream_shift_analysis(shift_id):
+    """
+    Server-sent events variant of /shifts/<shift_id>/analyze.
+    Emits 'summary', then one 'suggestion'/'priority' event per bullet as the
+    model produces it, and finally 'done' with the full analysis (or 'error').
+    """
+    if not gemini_service:
+        return jsonify({
+            'error': 'AI service not available. Please configure GEMINI_API_KEY in .env file.'
+        }), 503
+
+    if not supabase:
+        return jsonify({
+            'error': 'Database not configured. Please set SUPABASE_URL and SUPABASE_ANON_KEY in .env file.'
+        }), 503
+
+    try:
+        shift, care_recipient_profile = _load_shift_with_recipient(shift_id)
+    except Exception as e:
+        print(f"Error loading shift for streaming analysis: {e}")
+        return jsonify({'error': f'Error analyzing shift notes: {str(e)}'}), 500
+
+    if not shift:
+        return jsonify({'error': 'Shift not found'}), 404
+
+    precomputed = _precomputed_analysis(shift, care_recipient_profile) if shift.get('content') else None
+    if not shift.get('content'):
+        events = iter([{'event': 'done', 'data': _empty_analysis()}])
+    elif precomputed is not None:
+        # Replay the analysis precomputed by worker.py as the same events
+        events = _replay_events(precomputed)
+    else:
+        events = gemini_service.stream_shift_analysis(
+            shift_notes=_shift_to_notes(shift),
+            care_recipient_name=care_recipient_profile.get('name') if care_recipient_profile else None,
+            shift_context=_shift_context(shift),
+            care_recipient_profile=care_recipient_profile,
+            admit=_request_admitter(shift.get('care_recipient_id'))
+        )
+
+    # Run up to the first event before responding, so a request shed by
+    # admission control (which only a model call enters) still gets a 429/503
+    try:
+        first = next(events)
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        print(f"Error streaming shift analysis: {e}")
+        first = {'event': 'error', 'data': {'error': str(e)}}
+        events = iter(())
+
+    def generate():
+        try:
+            yield _sse_event(first['event'], first['data'])
+            for event in events:
+                yield _sse_event(event['event'], event['data'])
+        except Exception as e:
+            print(f"Error streaming shift analysis: {e}")
+            yield _sse_event('error', {'error': str(e)})
+        finally:
+            _record_request_metrics(200)
+
+    g.streaming = True
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stop proxies from buffering the stream, which would defeat the point
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if precomputed is not None:
+        response.headers['X-Analysis-Source'] = 'precomputed'
+    # Runs when the stream ends, including when the client disconnects, and
+    # frees the admission slot of an unfinished model stream
+    response.call_on_close(getattr(events, 'close', lambda: None))
+    return response
+
+
+@app.route('/shifts/analyze-batch', methods=['POST'])
+def analyze_shifts_batch():
+    """
+    Analyze many shifts in one request.
+
+    Body is either {"shift_ids": [...]} or
+    {"care_recipient_id": "...", "start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"}
+    with an optional "concurrency" (capped at ANALYZE_BATCH_CONCURRENCY).
+    Each shift gets its own entry in 'results'; one failing shift does not fail the batch.
+    """
+    if not gemini_service:
+        return jsonify({
+            'error': 'AI service not available. Please configure GEMINI_API_KEY in .env file.'
+        }), 503
+
+    if not supabase:
+        return jsonify({
+            'error': 'Database not configured. Please set SUPABASE_URL and SUPABASE_ANON_KEY in .env file.'
+        }), 503
+
+    params, error = _parse_batch_request(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'error': error}), 400
+
+    # The batch is charged once, when its first shift needs the model; each model call takes its own slot
+    admitter = _request_admitter(params['care_recipient_id'], PRIORITY_BATCH)
+
+    try:
+        # Fetch every requested shift in a single query
+        shifts = _batch_shifts_query(supabase, params).execute().data or []
+
+        # Load each care recipient profile once, however many shifts share it
+        recipients = data_access.recipients_for(supabase, shifts)
+    except Exception as e:
+        print(f"Error loading shifts for batch analysis: {e}")
+        return jsonify({'error': f'Error loading shifts: {str(e)}'}), 500
+
+    def analyze_one(shift):
+        if not shift.get('content'):
+            return _batch_entry(shift, _empty_analysis())
+
+        profile = recipients.get(shift.get('care_recipient_id'))
+        try:
+            analysis = _precomputed_analysis(shift, profile)
+            if analysis is None:
+                analysis = _analyze_and_store(shift, profile, admitter)
+        except AdmissionRejected as e:
+            return _batch_entry(shift, {'error': str(e)})
+        except Exception as e:
+            print(f"Error analyzing shift {shift['uuid']} in batch: {e}")
+            return _batch_entry(shift, {'error': str(e)})
+        return _batch_entry(shift, analysis)
+
+    with ThreadPoolExecutor(max_workers=params['concurrency']) as executor:
+        results = list(executor.map(analyze_one, shifts))
+
+    if _batch_shed(admitter, results):
+        return _rejected_response(admitter.rejection)
+    return jsonify(_batch_response(results, params, shifts))
+
+
+@app.route('/care-recipients/<care_recipient_id>/analyze-timeline', methods=['POST'])
+def analyze_recipient_timeline(care_recipient_id):
+    """
+    Analyze a care recipient's latest shift in the context of their recent history.
+
+    Covers the last ?shifts=N shifts (default TIMELINE_SHIFTS). The newest shift
+    with notes is sent in full; earlier shifts are sent as a rolling digest built
+    from stored per-shift summaries and weekly digests, so prompt size stays
+    flat as history grows.
+    """
+    if not gemini_service:
+        return jsonify({
+            'error': 'AI service not available. Please configure GEMINI_API_KEY in .env file.'
+        }), 503
+
+    if not supabase:
+        return jsonify({
+            'error': 'Database not configured. Please set SUPABASE_URL and SUPABASE_ANON_KEY in .env file.'
+        }), 503
+
+    try:
+        shift_count = int(request.args.get('shifts', TIMELINE_SHIFTS))
+    except ValueError:
+        return jsonify({'error': 'shifts must be an integer'}), 400
+    shift_count = max(1, min(shift_count, TIMELINE_MAX_SHIFTS))
+
+    try:
+        care_recipient_profile = data_access.load_recipient(supabase, care_recipient_id)
+        if not care_recipient_profile:
+            return jsonify({'error': 'Care recipient not found'}), 404
+
+        recent = data_access.load_recent_shifts(supabase, care_recipient_id, shift_count)
+        shifts = [s for s in recent if s.get('content')]
+
+        if not shifts:
+            return jsonify({**_empty_analysis(), 'timeline': {'shifts_covered': 0}})
+
+        latest, earlier = shifts[0], list(reversed(shifts[1:]))
+        # Each summary or analysis model call takes its own slot; stored
+        # summaries and cache hits take none
+        admitter = _request_admitter(care_recipient_id, PRIORITY_BATCH)
+        digest, stats = RecipientTimeline(gemini_service, summary_store, admit=admitter).build_digest(
+            earlier, current_date=latest.get('date'), care_recipient_id=care_recipient_id,
+            # A full window may start partway into its oldest week
+            truncated=len(recent) >= shift_count
+        )
+
         analysis = gemini_service.analyze_shift_notes(
-            shift_notes=notes,
-            care_recipient_name=care_recipient_name,
-            shift_context=shift_context,
-            care_recipient_profile=care_recipient_profile
+            shift_notes=_shift_to_notes(latest),
+            care_recipient_name=care_recipient_profile.get('name'),
+            shift_context=_shift_context(latest),
+            care_recipient_profile=care_recipient_profile,
+            history_digest=digest,
+            admit=admitter
         )
-        return jsonify(analysis)
+        return jsonify({**analysis, 'timeline': {**stats, 'latest_shift_id': latest['uuid']}})
 
+    except AdmissionRejected as e:
+        return _rejected_response(e)
     except Exception as e:
-        print(f"Error analyzing shift notes: {e}")
+        print(f"Error analyzing recipient timeline: {e}")
         return jsonify({
-            'error': f'Error analyzing shift notes: {str(e)}',
+            'error': f'Error analyzing recipient timeline: {str(e)}',
             'suggestions': [],
             'summary': '',
             'priorities': []
@@ -142,27 +714,20 @@ def get_shift_summary(shift_id):
 
     try:
         # Get shift information from Supabase
-        shift_response = supabase.table('shifts').select('*').eq('uuid', shift_id).single().execute()
+        shift = data_access.load_shift(supabase, shift_id)
 
-        if not shift_response.data:
+        if not shift:
             return jsonify({'error': 'Shift not found'}), 404
 
-        shift = shift_response.data
-        shift_content = shift.get('content')
-
-        if not shift_content:
+        if not shift.get('content'):
             return jsonify({'summary': 'No notes recorded for this shift.'})
 
-        # Convert to format expected by gemini_service
-        notes = [{
-            'content': shift_content,
-            'caregiver_name': 'Shift Caregiver',
-            'timestamp': shift.get('date', '')
-        }]
-
-        summary = gemini_service.generate_shift_summary(notes)
+        # Only a summary that still has to be generated goes through admission control
+        summary = _shift_summary(shift, _request_admitter(shift.get('care_recipient_id')))
         return jsonify({'summary': summary})
 
+    except AdmissionRejected as e:
+        return _rejected_response(e)
     except Exception as e:
         print(f"Error generating summary: {e}")
         return jsonify({
@@ -171,36 +736,183 @@ def get_shift_summary(shift_id):
         }), 500
 
 
+# ============= BACKGROUND ANALYSIS JOBS =============
+
+JOBS_WEBHOOK_SECRET = os.getenv('JOBS_WEBHOOK_SECRET')
+
+
+def _jobs_unauthorized():
+    """
+    Error response unless the request carries JOBS_WEBHOOK_SECRET in
+    X-Webhook-Secret. Queued jobs spend Gemini quota, so the endpoints that
+    queue them stay closed while no secret is configured.
+    """
+    if not JOBS_WEBHOOK_SECRET:
+        return jsonify({'error': 'Job endpoints are disabled until JOBS_WEBHOOK_SECRET is set'}), 503
+    provided = request.headers.get('X-Webhook-Secret', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), JOBS_WEBHOOK_SECRET.encode('utf-8')):
+        return jsonify({'error': 'Invalid webhook secret'}), 401
+    return None
+
+
+@app.route('/webhooks/shift-updated', methods=['POST'])
+def shift_updated_webhook():
+    """
+    Supabase database webhook for the shifts table.
+    Queues a precompute job whenever a shift is inserted or its content changes.
+    """
+    if not job_queue:
+        return jsonify({'error': 'Background jobs are disabled'}), 503
+
+    unauthorized = _jobs_unauthorized()
+    if unauthorized:
+        return unauthorized
+
+    payload = request.get_json(silent=True) or {}
+    record = payload.get('record') or {}
+    old_record = payload.get('old_record') or {}
+
+    if payload.get('type') not in ('INSERT', 'UPDATE') or not record.get('uuid'):
+        return jsonify({'queued': False, 'reason': 'ignored event'})
+    if not record.get('content') or record.get('content') == old_record.get('content'):
+        return jsonify({'queued': False, 'reason': 'content unchanged'})
+
+    try:
+        job = job_queue.enqueue(record['uuid'])
+        return jsonify({'queued': True, 'job': job}), 202
+    except Exception as e:
+        print(f"Error queueing analysis job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/shifts/<shift_id>/analyze-jobs', methods=['POST'])
+def enqueue_shift_analysis(shift_id):
+    """Queue a background analysis for one shift"""
+    if not job_queue:
+        return jsonify({'error': 'Background jobs are disabled'}), 503
+
+    unauthorized = _jobs_unauthorized()
+    if unauthorized:
+        return unauthorized
+
+    try:
+        return jsonify(job_queue.enqueue(shift_id)), 202
+    except Exception as e:
+        print(f"Error queueing analysis job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/care-recipients/<care_recipient_id>/analyze-jobs', methods=['POST'])
+def enqueue_recipient_analyses(care_recipient_id):
+    """Queue background analyses for every shift of a care recipient that has notes"""
+    if not job_queue:
+        return jsonify({'error': 'Background jobs are disabled'}), 503
+
+    unauthorized = _jobs_unauthorized()
+    if unauthorized:
+        return unauthorized
+
+    if not supabase:
+        return jsonify({'error': 'Database not configured'}), 503
+
+    try:
+        response = supabase.table('shifts').select('uuid,content').eq('care_recipient_id', care_recipient_id).execute()
+        shift_ids = [s['uuid'] for s in response.data or [] if s.get('content')]
+        jobs = job_queue.enqueue_many(shift_ids)
+        return jsonify({'queued': len(jobs), 'jobs': jobs}), 202
+    except Exception as e:
+        print(f"Error queueing analysis jobs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a background analysis job"""
+    if not job_queue:
+        return jsonify({'error': 'Background jobs are disabled'}), 503
+
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs', methods=['GET'])
+def get_job_stats():
+    """Counts of background jobs by status"""
+    if not job_queue:
+        return jsonify({'error': 'Background jobs are disabled'}), 503
+    return jsonify(job_queue.stats())
+
+
 # ============= ADDITIONAL ENDPOINTS FOR SUPABASE DATA =============
 
 @app.route('/care-recipients', methods=['GET'])
 def get_care_recipients():
-    """Get all care recipients from Supabase"""
+    """
+    Get care recipients from Supabase, one page at a time.
+
+    Query params: limit, cursor (from the X-Next-Cursor header of the previous
+    page) and fields (comma-separated columns). Supports If-None-Match.
+    """
     if not supabase:
         return jsonify({'error': 'Database not configured'}), 503
 
+    key_columns = ['id']
     try:
-        response = supabase.table('care_recipients').select('*').execute()
-        return jsonify(response.data)
+        limit = parse_limit()
+        columns = parse_fields(key_columns)
+        cursor = decode_cursor(request.args.get('cursor'), key_columns)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        query = supabase.table('care_recipients').select(columns)
+        if cursor:
+            query = query.gt('id', cursor[0])
+
+        response = query.order('id').limit(limit + 1).execute()
+        return page_response(response.data, limit, key_columns)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/shifts', methods=['GET'])
 def get_shifts():
-    """Get all shifts, optionally filtered by care_recipient_id"""
+    """
+    Get shifts newest first, optionally filtered by care_recipient_id.
+
+    Pages are keyed on (date, uuid). Query params: limit, cursor and fields,
+    as for /care-recipients. Supports If-None-Match.
+    """
     if not supabase:
         return jsonify({'error': 'Database not configured'}), 503
 
     care_recipient_id = request.args.get('care_recipient_id')
+    key_columns = ['date', 'uuid']
+    try:
+        limit = parse_limit()
+        columns = parse_fields(key_columns)
+        cursor = decode_cursor(request.args.get('cursor'), key_columns)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
-        query = supabase.table('shifts').select('*')
+        query = supabase.table('shifts').select(columns)
         if care_recipient_id:
             query = query.eq('care_recipient_id', care_recipient_id)
-
-        response = query.order('date', desc=True).execute()
-        return jsonify(response.data)
+        if cursor:
+            # Rows strictly after the cursor in (date desc nulls first, uuid desc) order
+            last_date, last_uuid = cursor
+            if last_date is None:
+                query = query.or_(f'date.not.is.null,and(date.is.null,uuid.lt.{last_uuid})')
+            else:
+                query = query.or_(f'date.lt.{last_date},and(date.eq.{last_date},uuid.lt.{last_uuid})')
+
+        response = (
+            query.order('date', desc=True, nullsfirst=True).order('uuid', desc=True).limit(limit + 1).execute()
+        )
+        return page_response(response.data, limit, key_columns)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -212,9 +924,9 @@ def get_shift(shift_id):
         return jsonify({'error': 'Database not configured'}), 503
 
     try:
-        response = supabase.table('shifts').select('*').eq('uuid', shift_id).single().execute()
-        if response.data:
-            return jsonify(response.data)
+        shift = data_access.load_shift(supabase, shift_id)
+        if shift:
+            return jsonify(shift)
         return jsonify({'error': 'Shift not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,403 @@
+"""
+ASGI serving mode for the backend.
+
+Serves the same routes as app.py. The Gemini-bound routes (analyze, analyze
+stream, analyze-batch and summary) are implemented natively with the async
+Supabase client and GeminiService's async methods, so a single worker can keep
+many Gemini calls in flight without blocking /health or other requests.
+Every other route is handed to the Flask app, which runs on a thread pool.
+
+Run with:
+    gunicorn asgi_app:app -k uvicorn.workers.UvicornWorker --workers 2 --bind 0.0.0.0:$PORT
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+
+import app as flask_backend
+import metrics
+import data_access
+from clients import client_manager, GEMINI_POOL_SIZE, Lazy
+from admission import AdmissionRejected, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from app import (
+    _shift_to_notes,
+    _shift_context,
+    _sse_event,
+    _empty_analysis,
+    _analysis_source,
+    _parse_batch_request,
+    _batch_shifts_query,
+    _batch_entry,
+    _batch_response,
+    _batch_shed,
+    _health_status,
+    _precomputed_analysis,
+    _store_analysis,
+    _stored_summary,
+    _replay_events,
+    _store_summary,
+    _client_key,
+    _admitter,
+    _rejection,
+)
+
+# Threads available to the Flask routes mounted below the async ones
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+
+# The async Supabase client has to be created inside the running event loop
+async_supabase = None
+_async_supabase_lock = asyncio.Lock()
+
+
+async def get_async_supabase():
+    """Return the shared async Supabase client, creating it on first use"""
+    global async_supabase
+    if async_supabase is None and flask_backend.SUPABASE_URL and flask_backend.SUPABASE_KEY:
+        async with _async_supabase_lock:
+            if async_supabase is None:
+                async_supabase = await client_manager.create_async_supabase(
+                    flask_backend.SUPABASE_URL, flask_backend.SUPABASE_KEY
+                )
+    return async_supabase
+
+
+async def get_gemini_service():
+    """
+    Return this worker's GeminiService. The first call builds it (and imports
+    the google-genai SDK) on a thread so the event loop keeps serving.
+    """
+    service = flask_backend.gemini_service
+    if isinstance(service, Lazy) and not service.built:
+        await asyncio.get_running_loop().run_in_executor(None, service.resolve)
+    return service
+
+
+def _services_unavailable(gemini_service, db):
+    """Same 503 responses as the Flask routes when a backing service is missing"""
+    if not gemini_service:
+        return JSONResponse({
+            'error': 'AI service not available. Please configure GEMINI_API_KEY in .env file.'
+        }, status_code=503)
+    if not db:
+        return JSONResponse({
+            'error': 'Database not configured. Please set SUPABASE_URL and SUPABASE_ANON_KEY in .env file.'
+        }, status_code=503)
+    return None
+
+
+def _request_client_key(request: Request):
+    return _client_key(request.headers, request.client.host if request.client else None)
+
+
+def _request_admitter(request: Request, care_recipient_id=None, priority=PRIORITY_INTERACTIVE):
+    """Async counterpart of app._request_admitter; pass it as admit= to the async GeminiService calls"""
+    return _admitter(_request_client_key(request), care_recipient_id, priority)
+
+
+async def _iterate_async(events):
+    for event in events:
+        yield event
+
+
+def _rejected_response(error: AdmissionRejected):
+    body, headers = _rejection(error)
+    return JSONResponse(body, status_code=error.status, headers=headers)
+
+
+# ============= API ENDPOINTS =============
+
+async def health_check(request: Request):
+    """Health check endpoint, answered on the event loop so it never queues behind LLM calls"""
+    return JSONResponse({**_health_status(), 'serving': 'asgi'})
+
+
+async def liveness_check(request: Request):
+    """Liveness on the event loop; touches no client"""
+    return JSONResponse({'status': 'ok', 'pid': os.getpid()})
+
+
+async def analyze_shift_notes(request: Request):
+    """Async version of POST /shifts/<shift_id>/analyze"""
+    gemini_service = await get_gemini_service()
+    db = await get_async_supabase()
+    unavailable = _services_unavailable(gemini_service, db)
+    if unavailable:
+        return unavailable
+
+    try:
+        shift, care_recipient_profile = await data_access.load_shift_with_recipient_async(db, request.path_params['shift_id'])
+
+        if not shift:
+            return JSONResponse({'error': 'Shift not found'}, status_code=404)
+
+        if not shift.get('content'):
+            return JSONResponse(_empty_analysis())
+
+        precomputed = _precomputed_analysis(shift, care_recipient_profile)
+        if precomputed is not None:
+            return JSONResponse(precomputed, headers={'X-Analysis-Source': 'precomputed'})
+
+        # Only a model call (not a cache hit) goes through admission control
+        analysis = await gemini_service.analyze_shift_notes_async(
+            shift_notes=_shift_to_notes(shift),
+            care_recipient_name=care_recipient_profile.get('name') if care_recipient_profile else None,
+            shift_context=_shift_context(shift),
+            care_recipient_profile=care_recipient_profile,
+            admit=_request_admitter(request, shift.get('care_recipient_id'))
+        )
+        _store_analysis(shift, care_recipient_profile, analysis)
+        return JSONResponse(analysis, headers={'X-Analysis-Source': _analysis_source(analysis)})
+
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        print(f"Error analyzing shift notes: {e}")
+        return JSONResponse({
+            'error': f'Error analyzing shift notes: {str(e)}',
+            'suggestions': [],
+            'summary': '',
+            'priorities': []
+        }, status_code=500)
+
+
+async def stream_shift_analysis(request: Request):
+    """Async version of /shifts/<shift_id>/analyze/stream"""
+    gemini_service = await get_gemini_service()
+    db = await get_async_supabase()
+    unavailable = _services_unavailable(gemini_service, db)
+    if unavailable:
+        return unavailable
+
+    try:
+        shift, care_recipient_profile = await data_access.load_shift_with_recipient_async(db, request.path_params['shift_id'])
+    except Exception as e:
+        print(f"Error loading shift for streaming analysis: {e}")
+        return JSONResponse({'error': f'Error analyzing shift notes: {str(e)}'}, status_code=500)
+
+    if not shift:
+        return JSONResponse({'error': 'Shift not found'}, status_code=404)
+
+    precomputed = _precomputed_analysis(shift, care_recipient_profile) if shift.get('content') else None
+    if not shift.get('content'):
+        events = _iterate_async([{'event': 'done', 'data': _empty_analysis()}])
+    elif precomputed is not None:
+        events = _iterate_async(_replay_events(precomputed))
+    else:
+        events = gemini_service.stream_shift_analysis_async(
+            shift_notes=_shift_to_notes(shift),
+            care_recipient_name=care_recipient_profile.get('name') if care_recipient_profile else None,
+            shift_context=_shift_context(shift),
+            care_recipient_profile=care_recipient_profile,
+            admit=_request_admitter(request, shift.get('care_recipient_id'))
+        )
+
+    # Run up to the first event before responding, so a request shed by
+    # admission control (which only a model call enters) still gets a 429/503
+    try:
+        first = await events.__anext__()
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        print(f"Error streaming shift analysis: {e}")
+        first = {'event': 'error', 'data': {'error': str(e)}}
+        events = _iterate_async([])
+
+    async def generate():
+        try:
+            yield _sse_event(first['event'], first['data'])
+            async for event in events:
+                yield _sse_event(event['event'], event['data'])
+        except Exception as e:
+            print(f"Error streaming shift analysis: {e}")
+            yield _sse_event('error', {'error': str(e)})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            **({'X-Analysis-Source': 'precomputed'} if precomputed is not None else {})
+        },
+        # Frees the admission slot if the stream never started; aclose() is idempotent
+        background=BackgroundTask(events.aclose)
+    )
+
+
+async def analyze_shifts_batch(request: Request):
+    """Async version of POST /shifts/analyze-batch, bounded by an asyncio semaphore"""
+    gemini_service = await get_gemini_service()
+    db = await get_async_supabase()
+    unavailable = _services_unavailable(gemini_service, db)
+    if unavailable:
+        return unavailable
+
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    params, error = _parse_batch_request(body if isinstance(body, dict) else {})
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+
+    # The batch is charged once, when its first shift needs the model; each model call takes its own slot
+    admitter = _request_admitter(request, params['care_recipient_id'], PRIORITY_BATCH)
+
+    try:
+        shifts = (await _batch_shifts_query(db, params).execute()).data or []
+
+        recipients = await data_access.recipients_for_async(db, shifts)
+    except Exception as e:
+        print(f"Error loading shifts for batch analysis: {e}")
+        return JSONResponse({'error': f'Error loading shifts: {str(e)}'}, status_code=500)
+
+    semaphore = asyncio.Semaphore(params['concurrency'])
+
+    async def analyze_one(shift):
+        if not shift.get('content'):
+            return _batch_entry(shift, _empty_analysis())
+
+        profile = recipients.get(shift.get('care_recipient_id'))
+        precomputed = _precomputed_analysis(shift, profile)
+        if precomputed is not None:
+            return _batch_entry(shift, precomputed)
+
+        try:
+            async with semaphore:
+                analysis = await gemini_service.analyze_shift_notes_async(
+                    shift_notes=_shift_to_notes(shift),
+                    care_recipient_name=profile.get('name') if profile else None,
+                    shift_context=_shift_context(shift),
+                    care_recipient_profile=profile,
+                    admit=admitter
+                )
+            _store_analysis(shift, profile, analysis)
+        except AdmissionRejected as e:
+            return _batch_entry(shift, {'error': str(e)})
+        except Exception as e:
+            print(f"Error analyzing shift {shift['uuid']} in batch: {e}")
+            return _batch_entry(shift, {'error': str(e)})
+        return _batch_entry(shift, analysis)
+
+    results = list(await asyncio.gather(*(analyze_one(shift) for shift in shifts)))
+    if _batch_shed(admitter, results):
+        return _rejected_response(admitter.rejection)
+    return JSONResponse(_batch_response(results, params, shifts))
+
+
+async def get_shift_summary(request: Request):
+    """Async version of GET /shifts/<shift_id>/summary"""
+    gemini_service = await get_gemini_service()
+    db = await get_async_supabase()
+    unavailable = _services_unavailable(gemini_service, db)
+    if unavailable:
+        return unavailable
+
+    try:
+        shift = await data_access.load_shift_async(db, request.path_params['shift_id'])
+
+        if not shift:
+            return JSONResponse({'error': 'Shift not found'}, status_code=404)
+
+        if not shift.get('content'):
+            return JSONResponse({'summary': 'No notes recorded for this shift.'})
+
+        # Only a summary that still has to be generated goes through admission control
+        summary = _stored_summary(shift)
+        if not summary:
+            summary = await gemini_service.generate_shift_summary_async(
+                _shift_to_notes(shift), admit=_request_admitter(request, shift.get('care_recipient_id'))
+            )
+            _store_summary(shift, summary)
+        return JSONResponse({'summary': summary})
+
+    except AdmissionRejected as e:
+        return _rejected_response(e)
+    except Exception as e:
+        print(f"Error generating summary: {e}")
+        return JSONResponse({
+            'error': f'Error generating summary: {str(e)}',
+            'summary': ''
+        }, status_code=500)
+
+
+class RequestMetricsMiddleware:
+    """
+    Request latency/status metrics and the optional Server-Timing header for
+    the native async routes. Requests passed on to the Flask app are recorded
+    by its own request hooks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = metrics.start_request()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if metrics.METRICS_TIMING_HEADER and scope.get('endpoint') in _route_names:
+                    value = metrics.server_timing(timings, time.perf_counter() - started)
+                    message = {**message, 'headers': [*message.get('headers', []), (b'server-timing', value.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = _route_names.get(scope.get('endpoint'))
+            if route:
+                metrics.finish_request(route, scope['method'], status, time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # google-genai runs its async calls on the loop's default executor, so size
+    # it to match the Gemini connection pool instead of the small stdlib default
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=GEMINI_POOL_SIZE))
+    yield
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/health/live', liveness_check, methods=['GET']),
+        Route('/shifts/analyze-batch', analyze_shifts_batch, methods=['POST']),
+        Route('/shifts/{shift_id}/analyze', analyze_shift_notes, methods=['POST']),
+        Route('/shifts/{shift_id}/analyze/stream', stream_shift_analysis, methods=['GET', 'POST']),
+        Route('/shifts/{shift_id}/summary', get_shift_summary, methods=['GET']),
+        # Plain read endpoints are served by the Flask app on a thread pool
+        Mount('/', app=WSGIMiddleware(flask_backend.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    middleware=[
+        # Enable CORS for React Native app
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(RequestMetricsMiddleware)
+    ]
+)
+
+# Metrics use the Flask rule syntax so both serving modes report the same route labels
+_route_names = {
+    route.endpoint: route.path.replace('{', '<').replace('}', '>')
+    for route in app.routes if isinstance(route, Route)
+}
@@ -0,0 +1,91 @@
+"""
+Compare analyze throughput of the sync (gunicorn sync workers) and ASGI serving modes.
+
+Both apps run in-process against the fakes in benchmarks/fakes.py, so no
+network or API keys are needed. The sync mode is modelled as N workers that
+each handle one request at a time; the ASGI mode is a single worker.
+
+    cd backend && python benchmarks/asgi_load_test.py --latency 0.3 --sync-workers 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Every request should reach the (fake) model: no stored results, no shedding
+os.environ.setdefault('JOBS_BACKEND', 'none')
+os.environ.setdefault('SUMMARY_STORE_BACKEND', 'none')
+os.environ.setdefault('ANALYSIS_CACHE_BACKEND', 'none')
+os.environ.setdefault('NEAR_DUPLICATE_BACKEND', 'none')
+os.environ.setdefault('ADMISSION_BACKEND', 'none')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import app as flask_backend  # noqa: E402
+import asgi_app  # noqa: E402
+from gemini_service import GeminiService  # noqa: E402
+from benchmarks.fakes import FakeGenaiClient, FakeSupabase, FakeAsyncSupabase, seed_tables  # noqa: E402
+
+
+def install_fakes(latency):
+    tables = seed_tables(recipients=20, shifts_per_recipient=20)
+    flask_backend.supabase = FakeSupabase(tables)
+    asgi_app.async_supabase = FakeAsyncSupabase(tables)
+    # No cache, so every request really waits on the (fake) model
+    flask_backend.gemini_service = GeminiService(cache=None, client=FakeGenaiClient(latency=latency))
+    return [shift['uuid'] for shift in tables['shifts']]
+
+
+def run_sync(shift_ids, requests, sync_workers):
+    """Sync workers: at most sync_workers requests are in flight at once"""
+    def worker_request(i):
+        with flask_backend.app.test_client() as client:
+            response = client.post(f'/shifts/{shift_ids[i % len(shift_ids)]}/analyze')
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sync_workers) as executor:
+        list(executor.map(worker_request, range(requests)))
+    return time.perf_counter() - start
+
+
+async def run_asgi(shift_ids, requests, concurrency):
+    """One ASGI worker with up to `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=asgi_app.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def one(i):
+            async with semaphore:
+                response = await client.post(f'/shifts/{shift_ids[i % len(shift_ids)]}/analyze')
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.5, help='fake Gemini latency in seconds')
+    parser.add_argument('--sync-workers', type=int, default=2, help='gunicorn sync workers to model')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    shift_ids = install_fakes(args.latency)
+
+    print(f"Fake Gemini latency {args.latency}s, sync mode with {args.sync_workers} workers, ASGI mode with 1 worker")
+    print(f"{'in-flight':>10} {'requests':>9} {'sync req/s':>11} {'asgi req/s':>11}")
+    for concurrency in args.concurrency:
+        requests = max(concurrency * 2, 8)
+        sync_elapsed = run_sync(shift_ids, requests, min(concurrency, args.sync_workers))
+        asgi_elapsed = asyncio.run(run_asgi(shift_ids, requests, concurrency))
+        print(f"{concurrency:>10} {requests:>9} {requests / sync_elapsed:>11.1f} {requests / asgi_elapsed:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
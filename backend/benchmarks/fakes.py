@@ -0,0 +1,385 @@
+"""
+Local stand-ins for the Gemini and Supabase clients used by the benchmarks.
+
+Nothing here touches the network: the fake genai client sleeps for a
+configurable latency and returns canned text, and the fake Supabase client
+answers the subset of the PostgREST query builder that the backend uses from
+in-memory tables.
+"""
+import asyncio
+import datetime
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+import requests
+from google.genai import errors as genai_errors
+
+CANNED_ANALYSIS = """SUMMARY:
+The care recipient had a calm shift, ate most of lunch and took all medication on time.
+
+SUGGESTIONS:
+- Offer a short walk after breakfast to support mobility.
+- Keep instructions short and speak at a slow pace.
+- Bring up their favourite topics during lunch.
+
+PRIORITIES:
+- Give morning medication with breakfast.
+- Check the walking path for fall hazards.
+"""
+
+# What the model returns for CANNED_ANALYSIS when asked for schema-constrained JSON
+CANNED_ANALYSIS_JSON = json.dumps({
+    'summary': 'The care recipient had a calm shift, ate most of lunch and took all medication on time.',
+    'suggestions': [
+        'Offer a short walk after breakfast to support mobility.',
+        'Keep instructions short and speak at a slow pace.',
+        'Bring up their favourite topics during lunch.'
+    ],
+    'priorities': [
+        'Give morning medication with breakfast.',
+        'Check the walking path for fall hazards.'
+    ]
+})
+
+CANNED_SUMMARY = "A calm shift with good appetite and medication taken on time."
+
+# Analysis outputs of different shapes, for exercising the response parser
+RESPONSE_SHAPES = {
+    'canned': CANNED_ANALYSIS,
+    # A verbose answer with many bullets
+    'long': (
+        "SUMMARY:\n" + " ".join(f"Observation {i}: the care recipient was settled and cooperative." for i in range(8)) + "\n\n"
+        + "SUGGESTIONS:\n" + "".join(f"- Suggestion {i}: keep the routine consistent and check in every hour.\n" for i in range(15))
+        + "\nPRIORITIES:\n" + "".join(f"- Priority {i}: follow up on the medication schedule.\n" for i in range(8))
+    ),
+    # Markdown decoration the parser does not understand, so nothing is extracted
+    'markdown': CANNED_ANALYSIS.replace('SUMMARY:', '**Summary**').replace('SUGGESTIONS:', '**Suggestions**')
+                               .replace('PRIORITIES:', '**Priorities**'),
+    # Free text without any of the expected sections
+    'unstructured': "The shift went well overall. She ate lunch, rested in the afternoon and took her medication.\n",
+}
+
+
+# ============= GEMINI =============
+
+def _usage(contents, text):
+    """Rough usage_metadata (about 4 characters per token)"""
+    prompt_tokens, response_tokens = len(contents) // 4, len(text) // 4
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=response_tokens,
+        total_token_count=prompt_tokens + response_tokens
+    )
+
+
+def _server_error():
+    """The APIError the SDK raises for an overloaded model (retryable)"""
+    response = requests.Response()
+    response.status_code = 503
+    response._content = b'{"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}}'
+    return genai_errors.ServerError(503, response)
+
+
+def _wants_json(config):
+    return bool(config) and config.get('response_mime_type') == 'application/json'
+
+
+class _FakeModels:
+    def __init__(self, latency, analysis_text, summary_text, error_rate=0.0, seed=None, json_text=None):
+        self.latency = latency
+        self.analysis_text = analysis_text
+        self.json_text = json_text
+        self.summary_text = summary_text
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _text_for(self, contents, config=None):
+        self.calls += 1
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise _server_error()
+        if contents.startswith('Summarize'):
+            return self.summary_text
+        # Without json_text the fake behaves like a model ignoring response_schema
+        return self.json_text if _wants_json(config) and self.json_text else self.analysis_text
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        text = self._text_for(contents, config)
+        return SimpleNamespace(text=text, usage_metadata=_usage(contents, text))
+
+    def generate_content_stream(self, model, contents, config=None):
+        text = self._text_for(contents, config)
+        lines = text.splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            time.sleep(self.latency / len(lines))
+            # Like the real API, token usage comes with the last chunk
+            yield SimpleNamespace(text=line, usage_metadata=_usage(contents, text) if i == len(lines) - 1 else None)
+
+
+class _FakeAsyncModels:
+    def __init__(self, models):
+        self._models = models
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(self._models.latency)
+        text = self._models._text_for(contents, config)
+        return SimpleNamespace(text=text, usage_metadata=_usage(contents, text))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        text = self._models._text_for(contents, config)
+        lines = text.splitlines(keepends=True)
+        latency = self._models.latency
+
+        async def chunks():
+            for i, line in enumerate(lines):
+                await asyncio.sleep(latency / len(lines))
+                yield SimpleNamespace(text=line, usage_metadata=_usage(contents, text) if i == len(lines) - 1 else None)
+
+        return chunks()
+
+
+class FakeGenaiClient:
+    """
+    Mimics genai.Client: .models (sync) and .aio.models (async).
+
+    response_shape picks one of RESPONSE_SHAPES for analyses (analysis_text
+    overrides it); error_rate is the fraction of calls that fail with a 503.
+    JSON-mode requests get json_text, which defaults to CANNED_ANALYSIS_JSON
+    for the canned shape; other shapes ignore the schema like a drifting model.
+    """
+
+    def __init__(
+        self,
+        latency=0.5,
+        analysis_text=None,
+        summary_text=CANNED_SUMMARY,
+        response_shape='canned',
+        error_rate=0.0,
+        seed=None,
+        json_text=None
+    ):
+        if json_text is None and analysis_text is None and response_shape == 'canned':
+            json_text = CANNED_ANALYSIS_JSON
+        analysis_text = analysis_text if analysis_text is not None else RESPONSE_SHAPES[response_shape]
+        self.models = _FakeModels(latency, analysis_text, summary_text, error_rate, seed, json_text)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self.models))
+
+
+# ============= SUPABASE =============
+
+class _Query:
+    """Minimal PostgREST query builder over a list of row dicts"""
+
+    def __init__(self, rows, latency, index=None, embed=None):
+        self._rows = rows
+        self._latency = latency
+        self._index = index
+        self._embed = embed
+        self._embeds = []
+        self._lookup = None
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._single = False
+
+    def select(self, columns='*'):
+        # Foreign-key embeds such as '*, care_recipients(*)'
+        self._embeds = re.findall(r'(\w+)\(\*\)', columns)
+        return self
+
+    def eq(self, column, value):
+        if self._lookup is None:
+            self._lookup = (column, value)
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def lt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def or_(self, filters):
+        """Supports 'col.op.value' terms and one level of 'and(...)' groups"""
+        groups = []
+        for term in re.findall(r'and\([^)]*\)|[^,]+', filters):
+            if term.startswith('and('):
+                groups.append([_parse_condition(t) for t in term[4:-1].split(',')])
+            else:
+                groups.append([_parse_condition(term)])
+        self._filters.append(lambda row: any(all(cond(row) for cond in group) for group in groups))
+        return self
+
+    def order(self, column, desc=False, nullsfirst=False):
+        # Postgres puts NULLs first in descending order unless told otherwise
+        self._order.append((column, desc, nullsfirst or desc))
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def _run(self):
+        rows = self._rows
+        if self._lookup and self._index:
+            # Narrow down with an equality index so large seeded tables stay cheap to query
+            column, value = self._lookup
+            rows = self._index(column).get(value, [])
+        rows = [row for row in rows if all(f(row) for f in self._filters)]
+        # Stable sorts applied last key first give a multi-column order
+        for column, desc, nulls_first in reversed(self._order):
+            rows.sort(key=lambda row: row.get(column) or '', reverse=desc)
+            rows.sort(key=lambda row: (row.get(column) is None) != nulls_first)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        rows = [self._with_embeds(row) for row in rows]
+        if self._single:
+            if len(rows) != 1:
+                # postgrest raises when .single() does not match exactly one row
+                raise Exception('JSON object requested, multiple (or no) rows returned')
+            return SimpleNamespace(data=rows[0])
+        return SimpleNamespace(data=rows)
+
+    def _with_embeds(self, row):
+        row = dict(row)
+        for name in self._embeds:
+            row[name] = self._embed(name, row)
+        return row
+
+
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+}
+
+
+def _parse_condition(term):
+    column, op, value = term.split('.', 2)
+    if op == 'not':
+        condition = _parse_condition(f'{column}.{value}')
+        return lambda row: not condition(row)
+    if op == 'is':
+        return lambda row: row.get(column) is None
+    value = value.strip('"')
+    compare = _OPERATORS[op]
+    return lambda row: compare(None if row.get(column) is None else str(row[column]), value)
+
+
+class _SyncQuery(_Query):
+    def execute(self):
+        time.sleep(self._latency)
+        return self._run()
+
+
+class _AsyncQuery(_Query):
+    async def execute(self):
+        await asyncio.sleep(self._latency)
+        return self._run()
+
+
+class FakeSupabase:
+    """Mimics supabase.Client.table(...) over in-memory tables"""
+
+    query_class = _SyncQuery
+
+    # Many-to-one foreign keys: (table, embedded table) -> (column, referenced column)
+    relations = {('shifts', 'care_recipients'): ('care_recipient_id', 'id')}
+
+    def __init__(self, tables, latency=0.005):
+        self.tables = tables
+        self.latency = latency
+        self._indexes = {}
+
+    def table(self, name):
+        rows = self.tables.setdefault(name, [])
+        return self.query_class(
+            rows, self.latency,
+            lambda column: self._index(name, rows, column),
+            lambda embedded, row: self._embedded(name, embedded, row)
+        )
+
+    def _embedded(self, name, embedded, row):
+        """The referenced row embedded in `row`, as PostgREST returns it for a many-to-one key"""
+        column, referenced = self.relations[(name, embedded)]
+        matches = self._index(embedded, self.tables.setdefault(embedded, []), referenced).get(row.get(column))
+        return dict(matches[0]) if matches else None
+
+    def _index(self, name, rows, column):
+        """
+        Rows grouped by one column's value. Rebuilt when rows are added or
+        removed; edits to an indexed column of an existing row are not seen.
+        """
+        size, index = self._indexes.get((name, column), (None, None))
+        if size != len(rows):
+            index = {}
+            for row in rows:
+                index.setdefault(row.get(column), []).append(row)
+            self._indexes[(name, column)] = (len(rows), index)
+        return index
+
+
+class FakeAsyncSupabase(FakeSupabase):
+    """Mimics supabase.AsyncClient, whose execute() is awaitable"""
+
+    query_class = _AsyncQuery
+
+
+_FIRST_SHIFT_DATE = datetime.date(2026, 1, 1)
+
+
+def seed_tables(recipients=10, shifts_per_recipient=10):
+    """Build care_recipients and shifts rows shaped like the real schema"""
+    tables = {'care_recipients': [], 'shifts': []}
+    for r in range(recipients):
+        recipient_id = f'recipient-{r}'
+        tables['care_recipients'].append({
+            'id': recipient_id,
+            'name': f'Recipient {r}',
+            'age': 70 + r % 25,
+            'preferred_form_of_address': f'Auntie {r}',
+            'breakfast': '08:00',
+            'lunch': '12:30',
+            'dinner': '18:30',
+            'fall_risk': 'High' if r % 3 == 0 else 'Low',
+            'allergies': 'Peanuts' if r % 4 == 0 else None,
+            'hobbies': 'Gardening, mahjong',
+            'favourite_topics': 'Grandchildren, old movies',
+        })
+        for n in range(shifts_per_recipient):
+            tables['shifts'].append({
+                'uuid': f'shift-{r}-{n}',
+                'care_recipient_id': recipient_id,
+                'shift_no': n + 1,
+                'date': (_FIRST_SHIFT_DATE + datetime.timedelta(days=n)).isoformat(),
+                'start_time': '08:00',
+                'end_time': '16:00',
+                'content': f'Shift {n}: ate breakfast, took medication, walked in the garden. Note {r}-{n}.',
+                'updated_at': f'{(_FIRST_SHIFT_DATE + datetime.timedelta(days=n)).isoformat()}T16:00:00+00:00',
+            })
+    return tables
@@ -0,0 +1,288 @@
+"""
+Offline latency and throughput benchmark for the backend.
+
+Drives the real Flask app (or the ASGI app with --mode asgi) against the fake
+Gemini and Supabase clients in benchmarks/fakes.py, seeded with thousands of
+recipients and shifts, and reports p50/p95/p99 latency and throughput per
+endpoint plus the average time spent in each stage. Microbenchmarks cover
+_build_analysis_prompt and _parse_gemini_response. Nothing touches the
+network, so it can run anywhere to catch regressions:
+
+    cd backend && python benchmarks/load_test.py --concurrency 16
+    python benchmarks/load_test.py --save baseline.json
+    python benchmarks/load_test.py --compare baseline.json   # exit 1 on a regression
+
+The job queue, summary store, analysis cache and admission control are turned
+off (unless set in the environment) so every run measures the same work.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('JOBS_BACKEND', 'none')
+os.environ.setdefault('SUMMARY_STORE_BACKEND', 'none')
+os.environ.setdefault('ANALYSIS_CACHE_BACKEND', 'none')
+os.environ.setdefault('ADMISSION_BACKEND', 'none')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import app as flask_backend  # noqa: E402
+import asgi_app  # noqa: E402
+import metrics  # noqa: E402
+from analysis_cache import AnalysisCache, MemoryCacheBackend  # noqa: E402
+from gemini_service import GeminiService  # noqa: E402
+from benchmarks.fakes import (  # noqa: E402
+    CANNED_ANALYSIS_JSON, FakeGenaiClient, FakeSupabase, FakeAsyncSupabase, RESPONSE_SHAPES, seed_tables
+)
+from benchmarks.prompt_build_benchmark import full_profile  # noqa: E402
+
+
+# ============= SCENARIOS =============
+
+def build_scenarios(tables, rng, hot_shifts):
+    """(name, method, path factory, json body factory, gemini service kind)"""
+    recipient_ids = [r['id'] for r in tables['care_recipients']]
+    shift_ids = [s['uuid'] for s in tables['shifts']]
+
+    def any_shift():
+        return rng.choice(shift_ids)
+
+    return [
+        ('GET /health', 'GET', lambda: '/health', None, 'cold'),
+        ('GET /care-recipients', 'GET', lambda: '/care-recipients?limit=100', None, 'cold'),
+        ('GET /shifts', 'GET', lambda: f'/shifts?care_recipient_id={rng.choice(recipient_ids)}&limit=50', None, 'cold'),
+        ('GET /shifts/<id>', 'GET', lambda: f'/shifts/{any_shift()}', None, 'cold'),
+        ('POST /shifts/<id>/analyze', 'POST', lambda: f'/shifts/{any_shift()}/analyze', None, 'cold'),
+        ('POST /shifts/<id>/analyze (cached)', 'POST',
+         lambda: f'/shifts/{rng.choice(hot_shifts)}/analyze', None, 'cached'),
+        ('GET /shifts/<id>/analyze/stream', 'GET', lambda: f'/shifts/{any_shift()}/analyze/stream', None, 'cold'),
+        ('GET /shifts/<id>/summary', 'GET', lambda: f'/shifts/{any_shift()}/summary', None, 'cold'),
+        ('POST /shifts/analyze-batch', 'POST', lambda: '/shifts/analyze-batch',
+         lambda: {'shift_ids': rng.sample(shift_ids, 5)}, 'cold'),
+        ('POST /care-recipients/<id>/analyze-timeline', 'POST',
+         lambda: f'/care-recipients/{rng.choice(recipient_ids)}/analyze-timeline?shifts=5', None, 'cold'),
+    ]
+
+
+def install_fakes(args):
+    tables = seed_tables(recipients=args.recipients, shifts_per_recipient=args.shifts_per_recipient)
+    # Richer profiles than the seed rows, so prompt building does realistic work
+    for i, recipient in enumerate(tables['care_recipients']):
+        recipient.update({**full_profile(i), 'id': recipient['id']})
+
+    flask_backend.supabase = FakeSupabase(tables, latency=args.db_latency)
+    asgi_app.async_supabase = FakeAsyncSupabase(tables, latency=args.db_latency)
+
+    def client():
+        return FakeGenaiClient(
+            latency=args.latency, response_shape=args.response_shape, error_rate=args.error_rate, seed=args.seed
+        )
+
+    services = {
+        'cold': GeminiService(cache=None, client=client()),
+        'cached': GeminiService(cache=AnalysisCache(MemoryCacheBackend()), client=client()),
+    }
+    return tables, services
+
+
+# ============= DRIVERS =============
+
+def run_flask(method, make_path, make_body, requests, concurrency):
+    """Latencies (seconds) and error count with `concurrency` requests in flight"""
+    def one(_):
+        path, body = make_path(), make_body() if make_body else None
+        start = time.perf_counter()
+        with flask_backend.app.test_client() as client:
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            # WSGI servers close every response; streams release their admission slot here
+            response.close()
+        return time.perf_counter() - start, response.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one, range(requests)))
+
+
+async def run_asgi(method, make_path, make_body, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=asgi_app.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def one(_):
+            path, body = make_path(), make_body() if make_body else None
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                return time.perf_counter() - start, response.status_code
+
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def stage_means(before, after):
+    """Mean milliseconds per stage between two STAGE_SECONDS snapshots"""
+    means = {}
+    for labels, (count, total) in after.items():
+        prev_count, prev_total = before.get(labels, (0, 0.0))
+        if count > prev_count:
+            means[labels[0]] = round((total - prev_total) / (count - prev_count) * 1000, 3)
+    return means
+
+
+def run_endpoints(args, tables, services):
+    rng = random.Random(args.seed)
+    hot_shifts = [s['uuid'] for s in rng.sample(tables['shifts'], 20)]
+    results = {}
+
+    # Fill the cache for the cached scenario before timing it
+    flask_backend.gemini_service = services['cached']
+    run_flask('POST', iter(f'/shifts/{s}/analyze' for s in hot_shifts).__next__, None, len(hot_shifts), 4)
+
+    for name, method, make_path, make_body, kind in build_scenarios(tables, rng, hot_shifts):
+        flask_backend.gemini_service = services[kind]
+        before = metrics.STAGE_SECONDS.snapshot()
+        start = time.perf_counter()
+        if args.mode == 'asgi':
+            samples = asyncio.run(run_asgi(method, make_path, make_body, args.requests, args.concurrency))
+        else:
+            samples = run_flask(method, make_path, make_body, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in samples)
+        results[name] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, status in samples if status >= 500),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'stages_ms': stage_means(before, metrics.STAGE_SECONDS.snapshot()),
+        }
+    return results
+
+
+# ============= MICROBENCHMARKS =============
+
+def best_per_call(fn, number):
+    """Best of five timing runs, in microseconds per call"""
+    return round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 2)
+
+
+def run_micro(services, number):
+    service = services['cold']
+    profile = full_profile(1)
+    notes = [{'content': 'Ate breakfast, took medication, walked in the garden. ' * 4,
+              'caregiver_name': 'Shift Caregiver', 'timestamp': '2026-01-05'}]
+    context = {'shift_number': 2, 'date': '2026-01-05'}
+
+    results = {
+        '_build_analysis_prompt (profile)': best_per_call(
+            lambda: service._build_analysis_prompt(notes, profile['name'], context, profile), number
+        ),
+        '_build_analysis_prompt (no profile)': best_per_call(
+            lambda: service._build_analysis_prompt(notes, None, context, None), number
+        ),
+    }
+    for shape, text in RESPONSE_SHAPES.items():
+        results[f'_parse_gemini_response ({shape})'] = best_per_call(
+            lambda text=text: service._parse_gemini_response(text), number
+        )
+    results['_parse_structured_response (json)'] = best_per_call(
+        lambda: service._parse_structured_response(CANNED_ANALYSIS_JSON), number
+    )
+    return results
+
+
+# ============= REPORTING =============
+
+def print_report(args, endpoints, micro):
+    print(f"mode={args.mode} concurrency={args.concurrency} requests/endpoint={args.requests} "
+          f"gemini latency={args.latency}s db latency={args.db_latency}s "
+          f"rows={args.recipients} recipients x {args.shifts_per_recipient} shifts")
+    print(f"\n{'endpoint':<46} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'5xx':>5}")
+    for name, r in endpoints.items():
+        print(f"{name:<46} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['throughput_rps']:>8.1f} {r['errors']:>5}")
+
+    print("\nmean ms per stage")
+    for name, r in endpoints.items():
+        if r['stages_ms']:
+            stages = ', '.join(f"{stage}={ms:.2f}" for stage, ms in sorted(r['stages_ms'].items()))
+            print(f"  {name}: {stages}")
+
+    print(f"\n{'microbenchmark':<46} {'us/call':>8}")
+    for name, us in micro.items():
+        print(f"{name:<46} {us:>8.2f}")
+
+
+def compare(baseline, current, tolerance):
+    """Regressions of endpoint p95 or microbenchmark time beyond the tolerance"""
+    regressions = []
+    for name, r in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if old and r['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['p95_ms']}ms -> {r['p95_ms']}ms")
+    for name, us in current['micro'].items():
+        old = baseline.get('micro', {}).get(name)
+        if old and us > old * (1 + tolerance):
+            regressions.append(f"{name}: {old}us -> {us}us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['flask', 'asgi'], default='flask')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--recipients', type=int, default=1000)
+    parser.add_argument('--shifts-per-recipient', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Gemini latency in seconds')
+    parser.add_argument('--db-latency', type=float, default=0.002, help='fake Supabase latency in seconds')
+    parser.add_argument('--response-shape', choices=sorted(RESPONSE_SHAPES), default='canned')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of Gemini calls failing with 503')
+    parser.add_argument('--micro-number', type=int, default=2000, help='calls per microbenchmark run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON from --save to check against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before failing --compare')
+    args = parser.parse_args()
+
+    tables, services = install_fakes(args)
+    endpoints = run_endpoints(args, tables, services)
+    micro = run_micro(services, args.micro_number)
+    print_report(args, endpoints, micro)
+
+    results = {'endpoints': endpoints, 'micro': micro}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Compare analysis prompt building with the memoized profile section against
+the original implementation, which rebuilt the profile block on every call.
+
+Runs offline (no API keys); every prompt is checked to be byte-identical.
+
+    cd backend && python benchmarks/prompt_build_benchmark.py --prompts 20000 --recipients 50
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_service import GeminiService  # noqa: E402
+from benchmarks.fakes import FakeGenaiClient  # noqa: E402
+
+
+def full_profile(r):
+    """A recipient with every profile field filled in"""
+    return {
+        'id': f'recipient-{r}',
+        'name': f'Recipient {r}',
+        'preferred_form_of_address': f'Auntie {r}',
+        'age': 70 + r % 25,
+        'birthday': '1948-03-14',
+        'wake_up': '07:00',
+        'breakfast': '08:00',
+        'lunch': '12:30',
+        'dinner': '18:30',
+        'bedtime': '21:30',
+        'speech_pace': 'Slow and clear',
+        'hearing_status': 'Hard of hearing on the left',
+        'visual_cues': 'Responds well to picture cards',
+        'instructions': 'One step at a time',
+        'food_preferences': 'Soft food, no spicy dishes',
+        'medication_preferences': 'Crushed into porridge',
+        'mobility_support': 'Walker indoors, wheelchair outside',
+        'hearing_vision_support': 'Hearing aid, reading glasses',
+        'memory_reminders': 'Remind about afternoon medication',
+        'fall_risk': 'High' if r % 3 == 0 else 'Low',
+        'allergies': 'Peanuts, penicillin' if r % 4 == 0 else None,
+        'medical_conditions': 'Type 2 diabetes, hypertension',
+        'hobbies': 'Gardening, mahjong, Cantonese opera',
+        'favourite_topics': 'Grandchildren, old movies',
+        'privacy_boundaries': 'Knock before entering the bedroom',
+        'sensitive_topics': 'Late husband',
+        'independence_preferences': 'Likes to dress on her own',
+        'physical_comfort': 'Extra blanket in the evening',
+    }
+
+
+# Original GeminiService._build_analysis_prompt, kept for comparison
+def legacy_build_analysis_prompt(
+    shift_notes: List[Dict],
+    care_recipient_name: str,
+    shift_context: Dict,
+    care_recipient_profile: Dict = None,
+    history_digest: str = None
+) -> str:
+    """Build a detailed prompt for Gemini to analyze shift notes"""
+
+    # Format shift notes into readable text
+    notes_text = ""
+    for i, note in enumerate(shift_notes, 1):
+        caregiver = note.get('caregiver_name', 'Unknown')
+        content = note.get('content', '')
+        timestamp = note.get('timestamp', '')
+        notes_text += f"{i}. [{caregiver} at {timestamp}]: {content}\n"
+
+    # Add context if available
+    context_text = ""
+    if care_recipient_name:
+        context_text += f"Care Recipient: {care_recipient_name}\n"
+    if shift_context:
+        if shift_context.get('date'):
+            context_text += f"Date: {shift_context['date']}\n"
+        if shift_context.get('shift_number'):
+            context_text += f"Shift Number: {shift_context['shift_number']}\n"
+
+    # Build recipient profile section if available
+    profile_text = ""
+    if care_recipient_profile:
+        profile_text = "\nCARE RECIPIENT PROFILE:\n"
+
+        # Basic info
+        if care_recipient_profile.get('preferred_form_of_address'):
+            profile_text += f"- Preferred Form of Address: {care_recipient_profile['preferred_form_of_address']}\n"
+        if care_recipient_profile.get('age'):
+            profile_text += f"- Age: {care_recipient_profile['age']}\n"
+        if care_recipient_profile.get('birthday'):
+            profile_text += f"- Birthday: {care_recipient_profile['birthday']}\n"
+
+        # Daily routine times
+        routine_times = []
+        if care_recipient_profile.get('wake_up'):
+            routine_times.append(f"Wake up: {care_recipient_profile['wake_up']}")
+        if care_recipient_profile.get('breakfast'):
+            routine_times.append(f"Breakfast: {care_recipient_profile['breakfast']}")
+        if care_recipient_profile.get('lunch'):
+            routine_times.append(f"Lunch: {care_recipient_profile['lunch']}")
+        if care_recipient_profile.get('dinner'):
+            routine_times.append(f"Dinner: {care_recipient_profile['dinner']}")
+        if care_recipient_profile.get('bedtime'):
+            routine_times.append(f"Bedtime: {care_recipient_profile['bedtime']}")
+        if routine_times:
+            profile_text += f"- Daily Routine: {', '.join(routine_times)}\n"
+
+        # Communication preferences
+        if care_recipient_profile.get('speech_pace'):
+            profile_text += f"- Speech Pace Preference: {care_recipient_profile['speech_pace']}\n"
+        if care_recipient_profile.get('hearing_status'):
+            profile_text += f"- Hearing Status: {care_recipient_profile['hearing_status']}\n"
+        if care_recipient_profile.get('visual_cues'):
+            profile_text += f"- Visual Cues: {care_recipient_profile['visual_cues']}\n"
+        if care_recipient_profile.get('instructions'):
+            profile_text += f"- Instructions Preference: {care_recipient_profile['instructions']}\n"
+
+        # Food and medication
+        if care_recipient_profile.get('food_preferences'):
+            profile_text += f"- Food Preferences: {care_recipient_profile['food_preferences']}\n"
+        if care_recipient_profile.get('medication_preferences'):
+            profile_text += f"- Medication Preferences: {care_recipient_profile['medication_preferences']}\n"
+
+        # Support needs
+        if care_recipient_profile.get('mobility_support'):
+            profile_text += f"- Mobility Support: {care_recipient_profile['mobility_support']}\n"
+        if care_recipient_profile.get('hearing_vision_support'):
+            profile_text += f"- Hearing/Vision Support: {care_recipient_profile['hearing_vision_support']}\n"
+        if care_recipient_profile.get('memory_reminders'):
+            profile_text += f"- Memory Reminders: {care_recipient_profile['memory_reminders']}\n"
+
+        # Safety information
+        if care_recipient_profile.get('fall_risk'):
+            profile_text += f"- Fall Risk: {care_recipient_profile['fall_risk']}\n"
+        if care_recipient_profile.get('allergies'):
+            profile_text += f"- ALLERGIES: {care_recipient_profile['allergies']}\n"
+        if care_recipient_profile.get('medical_conditions'):
+            profile_text += f"- Medical Conditions: {care_recipient_profile['medical_conditions']}\n"
+
+        # Personal interests
+        if care_recipient_profile.get('hobbies'):
+            profile_text += f"- Hobbies: {care_recipient_profile['hobbies']}\n"
+        if care_recipient_profile.get('favourite_topics'):
+            profile_text += f"- Favorite Topics: {care_recipient_profile['favourite_topics']}\n"
+
+        # Boundaries and preferences
+        if care_recipient_profile.get('privacy_boundaries'):
+            profile_text += f"- Privacy Boundaries: {care_recipient_profile['privacy_boundaries']}\n"
+        if care_recipient_profile.get('sensitive_topics'):
+            profile_text += f"- Sensitive Topics to Avoid: {care_recipient_profile['sensitive_topics']}\n"
+        if care_recipient_profile.get('independence_preferences'):
+            profile_text += f"- Independence Preferences: {care_recipient_profile['independence_preferences']}\n"
+        if care_recipient_profile.get('physical_comfort'):
+            profile_text += f"- Physical Comfort Preferences: {care_recipient_profile['physical_comfort']}\n"
+
+    # Condensed history of earlier shifts (recipient timeline mode)
+    if history_digest:
+        profile_text += f"\nPREVIOUS SHIFTS (summarized, oldest first):\n{history_digest}\n"
+
+    prompt = f"""You are an expert healthcare assistant analyzing caregiver shift notes for elderly care.
+
+{context_text}
+{profile_text}
+SHIFT NOTES:
+{notes_text}
+
+Please analyze these shift notes and provide personalized recommendations based on the care recipient's profile.
+
+1. SUMMARY: A brief 2-3 sentence summary of the key events and observations from this shift.
+
+2. SUGGESTIONS: 3-5 specific, actionable suggestions for the next shift to improve care quality. Consider:
+   - The recipient's preferred daily routine and meal times
+   - Their communication preferences and how to address them
+   - Any mobility, hearing, or vision support needs
+   - Their hobbies and interests for engagement activities
+   - Respect their privacy boundaries and avoid sensitive topics
+   - Any allergies or medical conditions to be aware of
+   - Follow-up actions needed based on shift observations
+
+3. PRIORITIES: Identify 2-3 top priority items that the next caregiver should focus on immediately, taking into account:
+   - Upcoming meals or routine activities based on their schedule
+   - Any safety concerns (fall risk, allergies, medical conditions)
+   - Observations from the shift notes that need immediate attention
+
+Format your response EXACTLY as follows:
+SUMMARY:
+[Your summary here]
+
+SUGGESTIONS:
+- [Suggestion 1]
+- [Suggestion 2]
+- [Suggestion 3]
+...
+
+PRIORITIES:
+- [Priority 1]
+- [Priority 2]
+- [Priority 3]
+"""
+    return prompt
+
+
+def build_inputs(prompts, recipients):
+    profiles = [full_profile(r) for r in range(recipients)]
+    inputs = []
+    for i in range(prompts):
+        profile = profiles[i % recipients]
+        inputs.append((
+            [{'content': f'Shift {i}: ate breakfast, took medication, walked in the garden.',
+              'caregiver_name': 'Shift Caregiver', 'timestamp': '2026-01-05'}],
+            profile['name'],
+            {'shift_number': i % 3 + 1, 'date': '2026-01-05'},
+            profile
+        ))
+    return inputs
+
+
+def measure(build, inputs):
+    """(seconds, peak traced bytes) for building every prompt in the batch"""
+    start = time.perf_counter()
+    for args in inputs:
+        build(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for args in inputs:
+        build(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompts', type=int, default=20000)
+    parser.add_argument('--recipients', type=int, default=50)
+    args = parser.parse_args()
+
+    # The original builder only had the text output format
+    service = GeminiService(cache=None, client=FakeGenaiClient(latency=0), output_mode='text')
+    inputs = build_inputs(args.prompts, args.recipients)
+
+    for notes, name, context, profile in inputs[:args.recipients]:
+        assert service._build_analysis_prompt(notes, name, context, profile) == \
+            legacy_build_analysis_prompt(notes, name, context, profile), 'prompts differ'
+
+    results = {
+        'original': measure(legacy_build_analysis_prompt, inputs),
+        # Unwrapped, so the per-stage metrics timer is not counted against the new builder
+        'memoized': measure(functools.partial(GeminiService._build_budgeted_prompt.__wrapped__, service), inputs),
+    }
+
+    print(f"{args.prompts} prompts over {args.recipients} recipients")
+    for label, (elapsed, peak) in results.items():
+        print(f"{label:>9}: {elapsed * 1000:8.1f} ms total, {elapsed / args.prompts * 1e6:6.2f} us/prompt, "
+              f"peak {peak / 1024:7.1f} KiB")
+    print(f"speedup: {results['original'][0] / results['memoized'][0]:.2f}x")
+    print(f"profile cache: {service.profile_prompts.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Measure backend startup: time to import the app, to answer the first
+liveness probe and to become ready (all clients built).
+
+Each run is a fresh interpreter, so module import caches do not carry over.
+Placeholder credentials are used; building the clients does not touch the
+network. --eager builds every client before the first request, as the app
+did before clients were created lazily.
+
+    cd backend && python benchmarks/startup_benchmark.py --runs 5
+    cd backend && python benchmarks/startup_benchmark.py --runs 5 --eager
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if EAGER:
+    for service in (app.supabase, app.gemini_service, app.job_queue, app.summary_store, app.admission):
+        service.resolve()
+client = app.app.test_client()
+assert client.get('/health/live').status_code == 200
+live = time.perf_counter()
+ready_response = client.get('/health/ready')
+ready = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'first_live_s': live - started,
+    'ready_s': ready - started,
+    'ready': ready_response.status_code == 200,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def run_once(eager, workdir):
+    env = {
+        **os.environ,
+        'PYTHONPATH': BACKEND_DIR,
+        'SUPABASE_URL': 'http://127.0.0.1:54321',
+        'SUPABASE_ANON_KEY': 'bench.placeholder.key',
+        'GEMINI_API_KEY': 'bench-placeholder-key',
+    }
+    # The SQLite-backed stores write their files into the working directory
+    output = subprocess.run(
+        [sys.executable, '-c', f'EAGER = {eager}\n' + CHILD],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help='build every client before the first request')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [run_once(args.eager, workdir) for _ in range(args.runs)]
+
+    print(f"{'eager' if args.eager else 'lazy'} startup, median of {args.runs} runs")
+    for key, label in (('import_s', 'import app'), ('first_live_s', 'first /health/live'), ('ready_s', '/health/ready')):
+        values = [run[key] for run in runs]
+        print(f'  {label:<20} {statistics.median(values) * 1000:8.1f} ms  (max {max(values) * 1000:.1f} ms)')
+    print(f"  ready: {all(run['ready'] for run in runs)}, modules loaded: {runs[-1]['modules']}")
+
+
+if __name__ == '__main__':
+    main()
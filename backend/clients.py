@@ -0,0 +1,351 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Callable, Dict
+
+# The google-genai and supabase SDKs take most of the backend's import time,
+# so they are imported where a client is first built rather than here.
+if TYPE_CHECKING:
+    import supabase
+    from google import genai
+
+# Connection pool and timeout settings. Every gunicorn worker builds its own
+# clients after fork, so these limits apply per worker process.
+GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', 32))
+GEMINI_ATTEMPT_TIMEOUT = float(os.getenv('GEMINI_ATTEMPT_TIMEOUT', 30))
+GEMINI_DEADLINE = float(os.getenv('GEMINI_DEADLINE', 60))
+GEMINI_MAX_ATTEMPTS = int(os.getenv('GEMINI_MAX_ATTEMPTS', 4))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', 0.5))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', 8))
+GEMINI_RETRY_BUDGET_RATIO = float(os.getenv('GEMINI_RETRY_BUDGET_RATIO', 0.2))
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', 10))
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call runs out of time before it could succeed"""
+
+
+class ModelBusy(Exception):
+    """Raised when a model stays at its concurrency limit for a whole attempt"""
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of traffic so a struggling backend is not hit
+    with a retry storm. Every first attempt deposits `ratio` tokens, every
+    retry spends one, and a small per-second floor keeps retries possible
+    when traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 20):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return round(self._tokens, 2)
+
+
+class RetryPolicy:
+    """
+    Per-call deadline plus jittered exponential backoff.
+
+    `fn` is called with the timeout (seconds) for that attempt, which never
+    exceeds the time left before the deadline.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = GEMINI_MAX_ATTEMPTS,
+        attempt_timeout: float = GEMINI_ATTEMPT_TIMEOUT,
+        deadline: float = GEMINI_DEADLINE,
+        backoff_base: float = GEMINI_BACKOFF_BASE,
+        backoff_max: float = GEMINI_BACKOFF_MAX,
+        budget: RetryBudget = None
+    ):
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget or RetryBudget(ratio=GEMINI_RETRY_BUDGET_RATIO)
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'attempts': 0,
+            'retries': 0,
+            'retries_denied_by_budget': 0,
+            'failures': 0,
+            'deadline_exceeded': 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform between 0 and the capped exponential delay
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _next_delay(self, error: Exception, attempt: int, started: float):
+        """Seconds to wait before retrying, or None if the error should be raised"""
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= started + self.deadline:
+            self._count('deadline_exceeded')
+            return None
+        if not self.budget.try_spend():
+            self._count('retries_denied_by_budget')
+            return None
+        self._count('retries')
+        return delay
+
+    def _attempt_timeout(self, started: float) -> float:
+        remaining = started + self.deadline - time.monotonic()
+        if remaining <= 0:
+            self._count('deadline_exceeded')
+            raise DeadlineExceeded(f'Deadline of {self.deadline}s exceeded')
+        return min(self.attempt_timeout, remaining)
+
+    def call(self, fn: Callable[[float], object]):
+        self._count('calls')
+        self.budget.record_request()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(started)
+            self._count('attempts')
+            try:
+                return fn(timeout)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    self._count('failures')
+                    raise
+                print(f"Retrying Gemini call in {delay:.2f}s after error: {e}")
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, fn: Callable[[float], object]):
+        """Same as call() for a coroutine function; waits with asyncio.sleep"""
+        self._count('calls')
+        self.budget.record_request()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(started)
+            self._count('attempts')
+            try:
+                return await fn(timeout)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    self._count('failures')
+                    raise
+                print(f"Retrying Gemini call in {delay:.2f}s after error: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters['retry_budget_tokens'] = self.budget.available()
+        counters['max_attempts'] = self.max_attempts
+        counters['attempt_timeout_seconds'] = self.attempt_timeout
+        counters['deadline_seconds'] = self.deadline
+        return counters
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, transient server errors, timeouts, dropped connections and saturated models"""
+    from google.genai import errors as genai_errors
+    if isinstance(error, ModelBusy):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+def timeout_config(timeout: float) -> Dict:
+    """Per-request generate_content config that applies an attempt timeout"""
+    return {'http_options': {'timeout': int(timeout * 1000)}}
+
+
+def _install_pooled_session(client, pool_size: int) -> bool:
+    """
+    google-genai 1.0 opens a new requests.Session for every API-key request,
+    so no connection is ever reused. Route those requests through one shared,
+    thread-safe pooled session instead. Returns False if the SDK internals
+    differ from what we expect, in which case the SDK default is left alone.
+
+    The SDK has no supported hook for this (HttpOptions only takes base_url,
+    api_version, headers and timeout), so this replaces the private
+    ApiClient._request_unauthorized. requirements.txt pins google-genai and
+    tests/test_clients.py fails if an upgrade moves that method.
+    """
+    from google.genai import errors as genai_errors
+    from google.genai._api_client import HttpResponse
+
+    api_client = getattr(client, '_api_client', None)
+    if api_client is None or not hasattr(api_client, '_request_unauthorized'):
+        return False
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    def request_with_pool(http_request, stream=False):
+        data = http_request.data
+        if data and not isinstance(data, bytes):
+            data = json.dumps(data)
+        response = session.request(
+            method=http_request.method,
+            url=http_request.url,
+            headers=http_request.headers,
+            data=data or None,
+            timeout=http_request.timeout,
+            stream=stream,
+        )
+        genai_errors.APIError.raise_for_response(response)
+        return HttpResponse(response.headers, response if stream else [response.text])
+
+    api_client._request_unauthorized = request_with_pool
+    return True
+
+
+class ClientManager:
+    """Builds the pooled Supabase and Gemini clients and reports their settings"""
+
+    def __init__(self):
+        self.gemini_pooled = False
+        self.retry_policy = RetryPolicy()
+
+    def create_supabase(self, url: str, key: str) -> 'supabase.Client':
+        from supabase import create_client
+        from supabase.lib.client_options import ClientOptions
+        options = ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+        return create_client(url, key, options=options)
+
+    async def create_async_supabase(self, url: str, key: str) -> 'supabase.AsyncClient':
+        from supabase import acreate_client
+        from supabase.lib.client_options import AsyncClientOptions
+        options = AsyncClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+        return await acreate_client(url, key, options=options)
+
+    def create_gemini(self, api_key: str) -> 'genai.Client':
+        from google import genai
+        client = genai.Client(
+            api_key=api_key,
+            http_options={'timeout': int(GEMINI_ATTEMPT_TIMEOUT * 1000)}
+        )
+        self.gemini_pooled = _install_pooled_session(client, GEMINI_POOL_SIZE)
+        if not self.gemini_pooled:
+            print("google-genai internals changed; Gemini requests are not pooled")
+        return client
+
+    def stats(self) -> Dict:
+        return {
+            'gemini_pool': {
+                'pooled': self.gemini_pooled,
+                'max_connections': GEMINI_POOL_SIZE,
+            },
+            'supabase': {
+                'timeout_seconds': SUPABASE_TIMEOUT,
+            },
+            'gemini_retries': self.retry_policy.stats(),
+        }
+
+
+client_manager = ClientManager()
+
+
+class Lazy:
+    """
+    Builds a client or store on first use in each process and forwards
+    attribute access to it, so importing the app stays cheap and nothing is
+    created before gunicorn forks. A child process that inherits a built
+    object builds its own instead of sharing the parent's connections.
+
+    `factory` returns None when the service is not configured, which makes
+    the Lazy falsy just like the None it replaces.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self.name = name
+        self.init_seconds = None
+        self._factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # The parent's lock may be held by a thread that does not exist in the child
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """The object for this process, building it on first use"""
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                started = time.perf_counter()
+                self._value = self._factory()
+                self.init_seconds = time.perf_counter() - started
+                self._pid = os.getpid()
+        return self._value
+
+    @property
+    def built(self) -> bool:
+        return self._pid == os.getpid()
+
+    def peek(self):
+        """The object if this process already built it, without building it"""
+        return self._value if self.built else None
+
+    def __bool__(self):
+        return bool(self.resolve())
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f'Lazy({self.name}, built={self.built})'
+
+
+def peek(service):
+    """A Lazy's object if already built (None otherwise); any other value as is"""
+    return service.peek() if isinstance(service, Lazy) else service
@@ -0,0 +1,255 @@
+"""
+Supabase reads shared by the Flask and ASGI routes and the worker.
+
+A shift is fetched together with its care recipient in one request through
+PostgREST's foreign-key embed (shifts.care_recipient_id -> care_recipients.id),
+instead of one query for the shift and a second for the recipient. Recipient
+profiles seen by any route are kept in a short-TTL cache, so bulk and
+per-recipient reads only query the profiles they have not seen recently.
+
+RECIPIENT_CACHE_TTL: seconds a cached profile is served (default 30, 0 disables the cache)
+RECIPIENT_CACHE_SIZE: most profiles kept per process (default 1024)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import metrics
+
+RECIPIENT_CACHE_TTL = float(os.getenv('RECIPIENT_CACHE_TTL', 30))
+RECIPIENT_CACHE_SIZE = int(os.getenv('RECIPIENT_CACHE_SIZE', 1024))
+
+# Shift columns plus the embedded care recipient row
+SHIFT_WITH_RECIPIENT = '*, care_recipients(*)'
+EMBEDDED_RECIPIENT = 'care_recipients'
+
+# Shift columns needed to summarize a shift or to place it on a timeline
+CHANGED_SHIFT_COLUMNS = 'uuid,care_recipient_id,date,content'
+TIMELINE_COLUMNS = 'uuid,date,shift_no,start_time,end_time,content'
+
+
+class RecipientCache:
+    """Read-through LRU cache of care recipient rows with a short TTL"""
+
+    def __init__(self, ttl_seconds: float = RECIPIENT_CACHE_TTL, max_entries: int = RECIPIENT_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get_many(self, recipient_ids: Iterable) -> Tuple[Dict, List]:
+        """(cached profiles by id, ids that have to be fetched)"""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for recipient_id in recipient_ids:
+                entry = self._entries.get(recipient_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(recipient_id)
+                    found[recipient_id] = entry[0]
+                else:
+                    missing.append(recipient_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, profiles: Iterable[Dict]):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for profile in profiles:
+                if profile and profile.get('id') is not None:
+                    self._entries[profile['id']] = (profile, expires_at)
+                    self._entries.move_to_end(profile['id'])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, recipient_id=None):
+        """Drop one recipient, or every recipient"""
+        with self._lock:
+            if recipient_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(recipient_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'entries': len(self._entries),
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+# Shared by every route in the process
+recipient_cache = RecipientCache()
+
+
+# ============= QUERIES =============
+# Each query builder works for both the sync and the async Supabase client;
+# the *_async functions only differ in awaiting execute().
+
+def _shift_query(client, shift_id, columns='*'):
+    return client.table('shifts').select(columns).eq('uuid', shift_id).single()
+
+
+def _shifts_query(client, shift_ids, columns='*'):
+    return client.table('shifts').select(columns).in_('uuid', list(shift_ids))
+
+
+def _recipients_query(client, recipient_ids):
+    return client.table('care_recipients').select('*').in_('id', list(recipient_ids))
+
+
+def split_embedded_recipient(row: Dict) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Separate a shift row fetched with SHIFT_WITH_RECIPIENT into (shift, profile),
+    keeping the profile in the recipient cache.
+    """
+    shift = dict(row)
+    profile = shift.pop(EMBEDDED_RECIPIENT, None)
+    # PostgREST returns a list when it cannot tell the relationship is many-to-one
+    if isinstance(profile, list):
+        profile = profile[0] if profile else None
+    if profile:
+        recipient_cache.put([profile])
+    return shift, profile or None
+
+
+def _recipient_ids(shifts: Iterable[Dict]) -> List:
+    return list({s['care_recipient_id'] for s in shifts if s.get('care_recipient_id')})
+
+
+def _cache_fetched(cached: Dict, rows: Optional[List[Dict]]) -> Dict:
+    rows = rows or []
+    recipient_cache.put(rows)
+    return {**cached, **{r['id']: r for r in rows}}
+
+
+def load_shift(client, shift_id) -> Optional[Dict]:
+    """A shift row, or None if it does not exist"""
+    with metrics.stage('shift_query'):
+        response = _shift_query(client, shift_id).execute()
+    return response.data or None
+
+
+async def load_shift_async(client, shift_id) -> Optional[Dict]:
+    with metrics.stage('shift_query'):
+        response = await _shift_query(client, shift_id).execute()
+    return response.data or None
+
+
+def load_shift_with_recipient(client, shift_id) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    A shift and its care recipient profile (with all personal data) in one query.
+    Returns (None, None) if the shift does not exist.
+    """
+    with metrics.stage('shift_query'):
+        response = _shift_query(client, shift_id, SHIFT_WITH_RECIPIENT).execute()
+    if not response.data:
+        return None, None
+    return split_embedded_recipient(response.data)
+
+
+async def load_shift_with_recipient_async(client, shift_id) -> Tuple[Optional[Dict], Optional[Dict]]:
+    with metrics.stage('shift_query'):
+        response = await _shift_query(client, shift_id, SHIFT_WITH_RECIPIENT).execute()
+    if not response.data:
+        return None, None
+    return split_embedded_recipient(response.data)
+
+
+def load_recipients(client, recipient_ids: Iterable) -> Dict:
+    """Care recipient profiles by id; only profiles missing from the cache are queried"""
+    cached, missing = recipient_cache.get_many(recipient_ids)
+    if not missing:
+        return cached
+    with metrics.stage('recipient_query'):
+        response = _recipients_query(client, missing).execute()
+    return _cache_fetched(cached, response.data)
+
+
+async def load_recipients_async(client, recipient_ids: Iterable) -> Dict:
+    cached, missing = recipient_cache.get_many(recipient_ids)
+    if not missing:
+        return cached
+    with metrics.stage('recipient_query'):
+        response = await _recipients_query(client, missing).execute()
+    return _cache_fetched(cached, response.data)
+
+
+def load_recipient(client, recipient_id) -> Optional[Dict]:
+    """One care recipient profile, or None if it does not exist"""
+    return load_recipients(client, [recipient_id]).get(recipient_id)
+
+
+def load_shifts_with_recipients(client, shift_ids: Iterable) -> Tuple[List[Dict], Dict]:
+    """
+    Bulk variant of load_shift_with_recipient: (shifts, profiles by recipient id)
+    in at most two queries, one for the shifts and one for the recipients that
+    are not cached. Shift ids that do not exist are left out.
+    """
+    with metrics.stage('shift_query'):
+        shifts = _shifts_query(client, shift_ids).execute().data or []
+    return shifts, load_recipients(client, _recipient_ids(shifts))
+
+
+async def load_shifts_with_recipients_async(client, shift_ids: Iterable) -> Tuple[List[Dict], Dict]:
+    with metrics.stage('shift_query'):
+        shifts = (await _shifts_query(client, shift_ids).execute()).data or []
+    return shifts, await load_recipients_async(client, _recipient_ids(shifts))
+
+
+def load_recent_shifts(client, recipient_id, limit: int) -> List[Dict]:
+    """A recipient's newest `limit` shifts, newest first, with the columns timeline analyses use"""
+    with metrics.stage('shift_query'):
+        response = (
+            client.table('shifts')
+            .select(TIMELINE_COLUMNS)
+            .eq('care_recipient_id', recipient_id)
+            .order('date', desc=True)
+            .order('uuid', desc=True)
+            .limit(limit)
+            .execute()
+        )
+    return response.data or []
+
+
+def load_changed_shifts(client, column: str, after: Optional[Tuple] = None, limit: int = 200) -> List[Dict]:
+    """
+    One page of shifts in (column, uuid) order, starting strictly after the
+    `after` key (column value, uuid). Used to walk every shift changed since a
+    checkpoint without OFFSET scans. Shifts whose column is NULL come first,
+    so a key with a NULL value continues with the rest of them, then every
+    shift with a value.
+    """
+    query = client.table('shifts').select(f'{CHANGED_SHIFT_COLUMNS},{column}')
+    if after:
+        value, uuid = after
+        if value is None:
+            query = query.or_(f'{column}.not.is.null,and({column}.is.null,uuid.gt."{uuid}")')
+        else:
+            query = query.or_(f'{column}.gt."{value}",and({column}.eq."{value}",uuid.gt."{uuid}")')
+    with metrics.stage('shift_query'):
+        response = query.order(column, nullsfirst=True).order('uuid').limit(limit).execute()
+    return response.data or []
+
+
+def recipients_for(client, shifts: List[Dict]) -> Dict:
+    """Profiles for the recipients of already loaded shifts"""
+    return load_recipients(client, _recipient_ids(shifts))
+
+
+async def recipients_for_async(client, shifts: List[Dict]) -> Dict:
+    return await load_recipients_async(client, _recipient_ids(shifts))
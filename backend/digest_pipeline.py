@@ -0,0 +1,262 @@
+"""
+Scheduled pipeline that summarizes every shift changed since its last run.
+
+Walks the shifts table in pages ordered by DIGEST_CHANGED_COLUMN, starting
+after the checkpoint kept in the summary store. Each page's shifts are
+grouped by care recipient and summarized with generate_shift_summary, several
+recipients at a time. A page's summaries are written to the summary store in
+one transaction before the checkpoint moves past it, so a run that is stopped
+or fails resumes where it left off. Shifts whose stored summary already
+matches their notes are skipped, so the morning's /shifts/<id>/summary and
+timeline reads are served from the store.
+
+Run once from cron (flock keeps runs from overlapping):
+    0 5 * * * cd /app/backend && flock -n /tmp/digest_pipeline.lock python digest_pipeline.py
+
+    python digest_pipeline.py                   # resume from the checkpoint
+    python digest_pipeline.py --since 2026-01-01 # start at this change time
+    python digest_pipeline.py --reset           # start from the first shift
+    python digest_pipeline.py --timelines       # also build recipients' weekly digests
+
+DIGEST_CHANGED_COLUMN: shifts column that records the last change (default updated_at)
+DIGEST_PAGE_SIZE: shifts per page (default 200)
+DIGEST_CONCURRENCY: recipients summarized at once (default 4)
+DIGEST_MAX_ATTEMPTS: runs a shift may fail before it is quarantined (default 3)
+
+Exits with 1 if any summary failed; the checkpoint then stays before the
+first failed shift, so the next run retries it. A shift that has failed
+DIGEST_MAX_ATTEMPTS runs in a row is quarantined: it is skipped and the
+checkpoint moves past it, so one bad shift cannot hold the pipeline back.
+The run's stats list the quarantined shifts; they are tried again once
+their notes change, or after --reset.
+"""
+import argparse
+import json
+import os
+import signal
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import app as backend
+import data_access
+from admission import PRIORITY_BACKGROUND
+from summary_store import content_hash
+from timeline import RecipientTimeline
+
+DIGEST_CHANGED_COLUMN = os.getenv('DIGEST_CHANGED_COLUMN', 'updated_at')
+DIGEST_PAGE_SIZE = int(os.getenv('DIGEST_PAGE_SIZE', 200))
+DIGEST_CONCURRENCY = int(os.getenv('DIGEST_CONCURRENCY', 4))
+DIGEST_MAX_ATTEMPTS = int(os.getenv('DIGEST_MAX_ATTEMPTS', 3))
+
+CHECKPOINT_NAME = 'digest_pipeline'
+# {shift id: [content hash, failed runs]} of shifts that failed and have not been summarized since
+FAILURES_NAME = 'digest_pipeline_failures'
+
+
+def _summarize(shift):
+    """Summary of one shift, or None if generation failed"""
+    notes = backend._shift_to_notes(shift)
+    summary = backend.gemini_service.generate_shift_summary(
+        notes, admit=backend._admitter(priority=PRIORITY_BACKGROUND)
+    )
+    return None if backend.gemini_service.summary_failed(summary) else summary
+
+
+def _summarize_recipient(shifts):
+    """(shift, summary or None) for one recipient's shifts, oldest change first"""
+    results = []
+    for shift in shifts:
+        try:
+            results.append((shift, _summarize(shift)))
+        except Exception as e:
+            print(f"Error summarizing shift {shift['uuid']}: {e}")
+            results.append((shift, None))
+    return results
+
+
+def _warm_timeline(recipient_id):
+    """Build the recipient's weekly digests the way the analyze-timeline route would"""
+    recent = data_access.load_recent_shifts(backend.supabase, recipient_id, backend.TIMELINE_SHIFTS)
+    shifts = [s for s in recent if s.get('content')]
+    if len(shifts) < 2:
+        return
+    latest, earlier = shifts[0], list(reversed(shifts[1:]))
+    timeline = RecipientTimeline(
+        backend.gemini_service, backend.summary_store, admit=backend._admitter(priority=PRIORITY_BACKGROUND)
+    )
+    timeline.build_digest(
+        earlier, current_date=latest.get('date'), care_recipient_id=recipient_id,
+        truncated=len(recent) >= backend.TIMELINE_SHIFTS
+    )
+
+
+class DigestPipeline:
+    """One run over the shifts changed since the checkpoint"""
+
+    def __init__(
+        self,
+        column: str = DIGEST_CHANGED_COLUMN,
+        page_size: int = DIGEST_PAGE_SIZE,
+        concurrency: int = DIGEST_CONCURRENCY,
+        timelines: bool = False,
+        max_attempts: int = DIGEST_MAX_ATTEMPTS
+    ):
+        self.column = column
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.timelines = timelines
+        self.max_attempts = max(1, max_attempts)
+        self.stopping = False
+        self.failures = {}
+        self.stats = {
+            'pages': 0, 'shifts': 0, 'summarized': 0, 'unchanged': 0, 'empty': 0, 'failed': 0,
+            'quarantined': 0, 'recipients': 0, 'timelines': 0
+        }
+
+    def run(self, after=None) -> bool:
+        """Process pages until none are left or a summary fails; True if nothing failed"""
+        store = backend.summary_store
+        if after is None:
+            after = store.get_checkpoint(CHECKPOINT_NAME)
+        self.failures = store.get_checkpoint(FAILURES_NAME) or {}
+        recipients = set()
+        while not self.stopping:
+            shifts = data_access.load_changed_shifts(backend.supabase, self.column, after, self.page_size)
+            if not shifts:
+                break
+            self.stats['pages'] += 1
+            self.stats['shifts'] += len(shifts)
+
+            completed, page_recipients = self._process_page(shifts)
+            recipients.update(page_recipients)
+            store.set_checkpoint(FAILURES_NAME, self.failures or None)
+            if completed:
+                last = shifts[completed - 1]
+                after = [last[self.column], last['uuid']]
+                store.set_checkpoint(CHECKPOINT_NAME, after)
+            if completed < len(shifts) or len(shifts) < self.page_size:
+                break
+
+        self.stats['recipients'] = len(recipients)
+        if self.timelines:
+            self._warm_timelines(recipients)
+        self.stats['checkpoint'] = after
+        self.stats['quarantine'] = sorted(
+            shift_id for shift_id, (_, attempts) in self.failures.items() if attempts >= self.max_attempts
+        )
+        return self.stats['failed'] == 0
+
+    def _process_page(self, shifts):
+        """
+        Summarize the page and store the results in one write. Returns how many
+        leading shifts are done (everything before the first failure that is
+        not quarantined) and the recipients whose summaries changed.
+        """
+        stored = backend.summary_store.get_content_hashes(s['uuid'] for s in shifts)
+        by_recipient = OrderedDict()
+        quarantined = set()
+        for shift in shifts:
+            if not shift.get('content'):
+                self.stats['empty'] += 1
+            elif stored.get(shift['uuid']) == content_hash(shift['content']):
+                self.stats['unchanged'] += 1
+            elif self._quarantined(shift):
+                quarantined.add(shift['uuid'])
+            else:
+                by_recipient.setdefault(shift.get('care_recipient_id'), []).append(shift)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = [r for group in executor.map(_summarize_recipient, by_recipient.values()) for r in group]
+
+        summaries = [(shift['uuid'], shift['content'], summary) for shift, summary in results if summary]
+        if summaries:
+            backend.summary_store.set_shift_summaries(summaries)
+        failed = set()
+        for shift, summary in results:
+            if summary:
+                self.failures.pop(shift['uuid'], None)
+            elif self._record_failure(shift):
+                quarantined.add(shift['uuid'])
+            else:
+                failed.add(shift['uuid'])
+        self.stats['summarized'] += len(summaries)
+        self.stats['failed'] += len(failed)
+        self.stats['quarantined'] += len(quarantined)
+
+        completed = next((i for i, shift in enumerate(shifts) if shift['uuid'] in failed), len(shifts))
+        changed = {shift.get('care_recipient_id') for shift, summary in results if summary}
+        return completed, changed - {None}
+
+    def _quarantined(self, shift) -> bool:
+        """True if the shift's current notes have already failed max_attempts runs"""
+        entry = self.failures.get(shift['uuid'])
+        return bool(entry) and entry[0] == content_hash(shift['content']) and entry[1] >= self.max_attempts
+
+    def _record_failure(self, shift) -> bool:
+        """Count a failed run of the shift; True once it is quarantined"""
+        notes_hash = content_hash(shift['content'])
+        entry = self.failures.get(shift['uuid'])
+        # Edited notes start over
+        attempts = entry[1] + 1 if entry and entry[0] == notes_hash else 1
+        self.failures[shift['uuid']] = [notes_hash, attempts]
+        if attempts >= self.max_attempts:
+            print(f"Quarantined shift {shift['uuid']} after {attempts} failed runs")
+            return True
+        return False
+
+    def _warm_timelines(self, recipients):
+        def warm(recipient_id):
+            try:
+                _warm_timeline(recipient_id)
+                return True
+            except Exception as e:
+                print(f"Error building timeline digests for recipient {recipient_id}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            self.stats['timelines'] = sum(executor.map(warm, sorted(recipients, key=str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--since', help=f'start at this {DIGEST_CHANGED_COLUMN} value instead of the checkpoint')
+    parser.add_argument('--reset', action='store_true',
+                        help='clear the checkpoint and the quarantine, and start from the first shift')
+    parser.add_argument('--page-size', type=int, default=DIGEST_PAGE_SIZE)
+    parser.add_argument('--concurrency', type=int, default=DIGEST_CONCURRENCY)
+    parser.add_argument('--max-attempts', type=int, default=DIGEST_MAX_ATTEMPTS,
+                        help='failed runs before a shift is quarantined')
+    parser.add_argument('--timelines', action='store_true', help="also build each changed recipient's weekly digests")
+    args = parser.parse_args()
+
+    if not backend.summary_store:
+        raise SystemExit('The digest pipeline needs the summary store (SUMMARY_STORE_BACKEND=sqlite)')
+    if not backend.gemini_service or not backend.supabase:
+        raise SystemExit('The digest pipeline needs both GEMINI_API_KEY and SUPABASE_URL/SUPABASE_ANON_KEY configured')
+
+    if args.reset:
+        backend.summary_store.set_checkpoint(CHECKPOINT_NAME, None)
+        backend.summary_store.set_checkpoint(FAILURES_NAME, None)
+    # An empty uuid sorts before every uuid, so the --since value itself is included
+    after = [args.since, ''] if args.since else None
+
+    pipeline = DigestPipeline(
+        page_size=args.page_size, concurrency=args.concurrency, timelines=args.timelines, max_attempts=args.max_attempts
+    )
+
+    def stop(signum, frame):
+        print('Stopping digest pipeline after the current page...')
+        pipeline.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    started = time.perf_counter()
+    ok = pipeline.run(after)
+    print(json.dumps({**pipeline.stats, 'seconds': round(time.perf_counter() - started, 2)}))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
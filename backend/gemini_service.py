@@ -1,27 +1,184 @@
-from google import genai
+import functools
+import json
 import os
-from typing import List, Dict
+import re
+import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, List, Dict, Iterator, AsyncIterator, Tuple
+from analysis_cache import AnalysisCache
+from clients import client_manager, timeout_config, RetryPolicy, ModelBusy
+from model_router import ModelRouter
+from single_flight import SingleFlight
+from profile_prompt import ProfilePromptCache, PROFILE_KEYS, render_profile_section
+from prompt_budget import (
+    PROMPT_TOKEN_BUDGET, CHARS_PER_TOKEN, LOW_PRIORITY_PROFILE_FIELDS, estimate_tokens, truncate_middle, drop_oldest_lines
+)
+import metrics
+
+if TYPE_CHECKING:
+    from admission import Admitter
+    # near_duplicates imports numpy, which the service only loads when the index is enabled
+    from near_duplicates import NearDuplicateIndex
+
+# generate_shift_summary returns its errors as text starting with this
+SUMMARY_ERROR_PREFIX = 'Error generating summary'
+
+# 'json' asks the model for schema-constrained JSON, 'text' for the SUMMARY:/SUGGESTIONS:/PRIORITIES: format
+ANALYSIS_OUTPUT_MODE = os.getenv('ANALYSIS_OUTPUT_MODE', 'json').lower()
+
+# Shift details the analysis prompt includes; a reused near-duplicate analysis is re-stamped with them
+SHIFT_CONTEXT_KEYS = ('date', 'shift_number')
+
+
+@functools.lru_cache(maxsize=None)
+def analysis_schema():
+    """response_schema of JSON-mode analyses (google.genai.types is only imported on first use)"""
+    from google.genai import types
+    return types.Schema(
+        type='OBJECT',
+        properties={
+            'summary': types.Schema(type='STRING'),
+            'suggestions': types.Schema(type='ARRAY', items=types.Schema(type='STRING')),
+            'priorities': types.Schema(type='ARRAY', items=types.Schema(type='STRING'))
+        },
+        required=['summary', 'suggestions', 'priorities'],
+        property_ordering=['summary', 'suggestions', 'priorities']
+    )
+
+TEXT_FORMAT_INSTRUCTIONS = """Format your response EXACTLY as follows:
+SUMMARY:
+[Your summary here]
+
+SUGGESTIONS:
+- [Suggestion 1]
+- [Suggestion 2]
+- [Suggestion 3]
+...
+
+PRIORITIES:
+- [Priority 1]
+- [Priority 2]
+- [Priority 3]
+"""
+
+JSON_FORMAT_INSTRUCTIONS = """Respond with a JSON object with a "summary" string and "suggestions" and "priorities" arrays of strings.
+"""
+
+
+def _admitted(fn: Callable[[], object], admit: 'Admitter' = None) -> Callable[[], object]:
+    """fn run inside an in-flight slot, for the single-flight leader that makes the model call"""
+    if admit is None:
+        return fn
+
+    def run():
+        with admit.slot():
+            return fn()
+    return run
+
+
+def _admitted_async(fn: Callable, admit: 'Admitter' = None) -> Callable:
+    if admit is None:
+        return fn
+
+    async def run():
+        async with admit.slot_async():
+            return await fn()
+    return run
+
+
+def _restamp(analysis: Dict, source: Tuple, target: Tuple) -> Dict:
+    """
+    Analysis written for a shift with context `source` (SHIFT_CONTEXT_KEYS
+    values), with that shift's date and shift number in the text replaced by
+    the ones in `target` ("this shift" where the target has none)
+    """
+    replacements = []
+    for key, old, new in zip(SHIFT_CONTEXT_KEYS, source or (), target or ()):
+        if old in (None, '') or old == new:
+            continue
+        if key == 'shift_number':
+            pattern = rf'\b(shift\s*(?:number\s*|no\.?\s*|#\s*)?){re.escape(str(old))}\b'
+            replacement = (lambda m, new=new: m.group(1) + str(new)) if new not in (None, '') else 'this shift'
+        else:
+            pattern = rf'\b{re.escape(str(old))}\b'
+            replacement = (lambda m, new=new: str(new)) if new not in (None, '') else 'this shift'
+        replacements.append((re.compile(pattern, re.IGNORECASE), replacement))
+    if not replacements:
+        return analysis
+
+    def stamp(text: str) -> str:
+        for pattern, replacement in replacements:
+            text = pattern.sub(replacement, text)
+        return text
+
+    return {
+        **analysis,
+        'summary': stamp(analysis['summary']),
+        'suggestions': [stamp(item) for item in analysis['suggestions']],
+        'priorities': [stamp(item) for item in analysis['priorities']]
+    }
+
 
 class GeminiService:
     """Service for interacting with Google Gemini API"""
 
-    def __init__(self):
-        """Initialize Gemini API with API key from environment"""
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError(
-                "GEMINI_API_KEY not found in environment variables. "
-                "Please add it to your .env file or set it as an environment variable."
-            )
-        self.client = genai.Client(api_key=api_key)
-        self.model_name = 'gemini-2.5-flash'  # Use Gemini 2.5 Flash
+    def __init__(
+        self,
+        cache: AnalysisCache = None,
+        client=None,
+        retry_policy: RetryPolicy = None,
+        single_flight: SingleFlight = None,
+        profile_prompts: ProfilePromptCache = None,
+        output_mode: str = None,
+        token_budget: int = None,
+        router: ModelRouter = None,
+        near_duplicates: 'NearDuplicateIndex' = None
+    ):
+        """
+        Initialize Gemini API with API key from environment
+
+        Args:
+            cache: Optional AnalysisCache used to reuse results for identical prompts
+            client: Optional pre-built genai.Client (or a stand-in with the same interface)
+            retry_policy: Deadline/backoff policy for generate_content calls
+            single_flight: Shares one model call between concurrent identical requests
+            profile_prompts: Memoizes each recipient's rendered profile section
+            output_mode: 'json' (schema-constrained output) or 'text'; defaults to ANALYSIS_OUTPUT_MODE
+            token_budget: Estimated-token limit for analysis prompts; defaults to PROMPT_TOKEN_BUDGET, 0 disables it
+            router: Picks the model per call and enforces per-model concurrency limits
+            near_duplicates: Optional NearDuplicateIndex used to reuse analyses of near-identical notes
+        """
+        if client is None:
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                raise ValueError(
+                    "GEMINI_API_KEY not found in environment variables. "
+                    "Please add it to your .env file or set it as an environment variable."
+                )
+            client = client_manager.create_gemini(api_key)
+        self.client = client
+        self.retry_policy = retry_policy or client_manager.retry_policy
+        self.router = router or ModelRouter()
+        # Default model; calls are routed per request by self.router
+        self.model_name = self.router.analysis_model
+        self.cache = cache
+        self.single_flight = single_flight or SingleFlight()
+        self.profile_prompts = profile_prompts or ProfilePromptCache()
+        output_mode = (output_mode or ANALYSIS_OUTPUT_MODE).lower()
+        if output_mode not in ('json', 'text'):
+            raise ValueError(f"Unknown ANALYSIS_OUTPUT_MODE '{output_mode}', expected json or text")
+        self.structured_output = output_mode == 'json'
+        self.token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.near_duplicates = near_duplicates
 
     def analyze_shift_notes(
         self,
         shift_notes: List[Dict],
         care_recipient_name: str = None,
         shift_context: Dict = None,
-        care_recipient_profile: Dict = None
+        care_recipient_profile: Dict = None,
+        history_digest: str = None,
+        admit: 'Admitter' = None
     ) -> Dict:
         """
         Analyze shift notes and provide suggestions for improvement
@@ -31,49 +188,387 @@ class GeminiService:
             care_recipient_name: Optional name of care recipient
             shift_context: Optional dict with additional context (shift_number, date, etc.)
             care_recipient_profile: Optional dict with recipient's personal data (birthday, meal times, preferences, etc.)
+            history_digest: Optional condensed summary of the recipient's earlier shifts
+            admit: Optional Admitter, used only when the model has to be called: its
+                rate limits are charged here, its in-flight slot only by the caller
+                that makes the shared single-flight call
 
         Returns:
             Dict with 'suggestions', 'summary', and 'priorities' keys
         """
         if not shift_notes:
-            return {
-                'suggestions': [],
-                'summary': 'No shift notes available for analysis.',
-                'priorities': []
-            }
+            return self._no_notes_analysis()
 
         # Build the prompt for Gemini
-        prompt = self._build_analysis_prompt(shift_notes, care_recipient_name, shift_context, care_recipient_profile)
-
+        prompt, prompt_metadata = self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile, history_digest,
+            structured=self.structured_output
+        )
+
+        model = self._route_analysis(prompt_metadata)
+        probe = self._similarity_probe(
+            shift_notes, care_recipient_name, care_recipient_profile, shift_context, history_digest
+        )
+        cache_key, cached = self._lookup_cached_analysis(prompt, model, probe)
+        if cached is not None:
+            return {**cached, 'prompt_metadata': {**prompt_metadata, 'cached': True}}
+
+        if admit:
+            # Charged to this caller before it can join another caller's call
+            admit.charge()
+        # Concurrent requests for the same prompt share one Gemini call
+        result = self.single_flight.do(
+            cache_key,
+            _admitted(lambda: self._run_analysis(prompt, cache_key, model), admit),
+            recheck=lambda: self._cached(cache_key)
+        )
+        self._index_analysis(probe, result)
+        return {**result, 'prompt_metadata': prompt_metadata}
+
+    def analysis_key(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str = None,
+        shift_context: Dict = None,
+        care_recipient_profile: Dict = None
+    ) -> str:
+        """
+        Key of the analysis analyze_shift_notes would give these inputs: the
+        built prompt hashed with its routed model, so any change to a prompt
+        input, the output mode or the model gives a new key
+        """
+        prompt, prompt_metadata = self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile,
+            structured=self.structured_output
+        )
+        model = self.router.model_for('analysis', prompt_metadata['estimated_tokens'])
+        return AnalysisCache.make_key(prompt, model)
+
+    def _run_analysis(self, prompt: str, cache_key: str, model: str = None) -> Dict:
         try:
             # Generate response from Gemini using new SDK
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
+            response = self._generate(prompt, structured=self.structured_output, model=model)
+            return self._finish_analysis(response.text, cache_key, self.structured_output)
 
-            # Parse the response
-            result = self._parse_gemini_response(response.text)
-            return result
+        except Exception as e:
+            return self._analysis_error(e)
+
+    async def analyze_shift_notes_async(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str = None,
+        shift_context: Dict = None,
+        care_recipient_profile: Dict = None,
+        admit: 'Admitter' = None
+    ) -> Dict:
+        """
+        Awaitable version of analyze_shift_notes for the ASGI app.
+        Uses the SDK's async client so the event loop is free while Gemini is generating.
+        `admit` is the request's Admitter, as for analyze_shift_notes.
+        """
+        if not shift_notes:
+            return self._no_notes_analysis()
+
+        prompt, prompt_metadata = self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile,
+            structured=self.structured_output
+        )
+
+        model = self._route_analysis(prompt_metadata)
+        probe = self._similarity_probe(shift_notes, care_recipient_name, care_recipient_profile, shift_context)
+        cache_key, cached = self._lookup_cached_analysis(prompt, model, probe)
+        if cached is not None:
+            return {**cached, 'prompt_metadata': {**prompt_metadata, 'cached': True}}
+
+        if admit:
+            await admit.charge_async()
+        result = await self.single_flight.do_async(
+            cache_key,
+            _admitted_async(lambda: self._run_analysis_async(prompt, cache_key, model), admit),
+            recheck=lambda: self._cached(cache_key)
+        )
+        self._index_analysis(probe, result)
+        return {**result, 'prompt_metadata': prompt_metadata}
+
+    async def _run_analysis_async(self, prompt: str, cache_key: str, model: str = None) -> Dict:
+        try:
+            response = await self._generate_async(prompt, structured=self.structured_output, model=model)
+            return self._finish_analysis(response.text, cache_key, self.structured_output)
 
         except Exception as e:
-            print(f"Error calling Gemini API: {e}")
-            return {
-                'suggestions': [],
-                'summary': f'Error analyzing notes: {str(e)}',
-                'priorities': [],
-                'error': str(e)
-            }
+            return self._analysis_error(e)
+
+    def _generate(self, prompt: str, operation: str = 'analysis', structured: bool = False, model: str = None):
+        """
+        generate_content with a per-attempt timeout, overall deadline and retries.
+        Attempts run on `model` until it times out or is rate limited, then on its fallback.
+        """
+        call = self.router.call(
+            model or self.model_name,
+            lambda routed_model, timeout: self.client.models.generate_content(
+                model=routed_model,
+                contents=prompt,
+                config=self._generation_config(timeout, structured)
+            )
+        )
+        try:
+            with metrics.stage('gemini_call'):
+                response = self.retry_policy.call(call)
+        except Exception:
+            metrics.record_gemini_error(operation)
+            raise
+        self._record_generation(call.model, operation, prompt, response)
+        return response
+
+    async def _generate_async(
+        self, prompt: str, operation: str = 'analysis', structured: bool = False, model: str = None
+    ):
+        call = self.router.call_async(
+            model or self.model_name,
+            lambda routed_model, timeout: self.client.aio.models.generate_content(
+                model=routed_model,
+                contents=prompt,
+                config=self._generation_config(timeout, structured)
+            )
+        )
+        try:
+            with metrics.stage('gemini_call'):
+                response = await self.retry_policy.call_async(call)
+        except Exception:
+            metrics.record_gemini_error(operation)
+            raise
+        self._record_generation(call.model, operation, prompt, response)
+        return response
+
+    def _generation_config(self, timeout: float, structured: bool) -> Dict:
+        config = timeout_config(timeout)
+        if structured:
+            # The API enforces the schema, so the output always parses into the three fields
+            config['response_mime_type'] = 'application/json'
+            config['response_schema'] = analysis_schema()
+        return config
+
+    def _record_generation(self, model: str, operation: str, prompt: str, response):
+        usage = getattr(response, 'usage_metadata', None)
+        metrics.record_generation(model, operation, prompt, response.text, usage)
+        self.router.record_usage(model, usage)
+
+    def _route_analysis(self, prompt_metadata: Dict) -> str:
+        """Pick the model for an analysis prompt and note it in the prompt metadata"""
+        model = self.router.route('analysis', prompt_metadata['estimated_tokens'])
+        prompt_metadata['model'] = model
+        return model
+
+    def _no_notes_analysis(self) -> Dict:
+        return {
+            'suggestions': [],
+            'summary': 'No shift notes available for analysis.',
+            'priorities': []
+        }
+
+    def _lookup_cached_analysis(self, prompt: str, model: str = None, probe=None):
+        """
+        Identical prompt + model means identical input, so reuse the earlier result.
+        `model` is the routed model, so a fallback answer is cached under the
+        model the request asked for. Without an exact match, a `probe` from
+        _similarity_probe looks for an analysis of near-identical notes.
+        Returns (key, cached result or None); the key also identifies the call for single-flight.
+        """
+        cache_key = AnalysisCache.make_key(prompt, model or self.model_name)
+        with metrics.stage('cache_lookup'):
+            cached = self._cached(cache_key)
+            if cached is None and probe is not None:
+                cached = self._similar_analysis(cache_key, probe)
+            return cache_key, cached
+
+    def _similarity_probe(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str = None,
+        care_recipient_profile: Dict = None,
+        shift_context: Dict = None,
+        history_digest: str = None
+    ):
+        """
+        Near-duplicate lookup key of a shift's notes, or None when reuse does
+        not apply: no index, no recipient profile, or a timeline analysis
+        (its history digest is part of the input). Matches are per recipient and
+        profile version; the shift context only travels along for re-stamping.
+        """
+        if not self.near_duplicates or not care_recipient_profile or history_digest:
+            return None
+        version = (care_recipient_name, *(care_recipient_profile.get(k) for k in PROFILE_KEYS))
+        context = tuple((shift_context or {}).get(k) for k in SHIFT_CONTEXT_KEYS)
+        text = '\n'.join(note.get('content') or '' for note in shift_notes)
+        return self.near_duplicates.probe(care_recipient_profile.get('id'), version, text, context)
+
+    def _similar_analysis(self, cache_key: str, probe):
+        """
+        Analysis of a near-identical shift of the same recipient, with the other
+        shift's date and shift number replaced by this one's, cached under this
+        prompt's key
+        """
+        match = self.near_duplicates.find(probe)
+        if match is None:
+            return None
+        analysis, similarity, context = match
+        metrics.record_near_duplicate_reuse()
+        result = {
+            **_restamp(analysis, context, probe.context),
+            'near_duplicate': {'similarity': round(similarity, 3)}
+        }
+        self._store_analysis(cache_key, result)
+        return result
+
+    def _index_analysis(self, probe, result: Dict):
+        """Make a fresh model analysis available for near-duplicate reuse"""
+        # Reused analyses are not indexed again, so reuse never chains across drifting notes
+        if probe is None or result.get('error') or 'near_duplicate' in result:
+            return
+        if result['summary'] or result['suggestions'] or result['priorities']:
+            self.near_duplicates.add(probe, result)
+
+    def _cached(self, cache_key: str):
+        return self.cache.get(cache_key) if self.cache else None
+
+    def _finish_analysis(self, response_text: str, cache_key: str = None, structured: bool = False) -> Dict:
+        """Parse the model output and cache it if it is usable"""
+        # One parse observation per response, including a structured->text fallback
+        with metrics.stage('parse'):
+            if structured:
+                result = self._parse_structured_response(response_text)
+            else:
+                result = self._parse_gemini_response(response_text)
+        self._store_analysis(cache_key, result)
+        return result
+
+    def _store_analysis(self, cache_key: str, result: Dict):
+        # Only cache usable results so a bad response gets retried next time
+        if self.cache and (result['summary'] or result['suggestions'] or result['priorities']):
+            self.cache.set(cache_key, result)
+
+    def _analysis_error(self, error: Exception) -> Dict:
+        print(f"Error calling Gemini API: {error}")
+        return {
+            'suggestions': [],
+            'summary': f'Error analyzing notes: {str(error)}',
+            'priorities': [],
+            'error': str(error)
+        }
 
     def _build_analysis_prompt(
         self,
         shift_notes: List[Dict],
         care_recipient_name: str,
         shift_context: Dict,
-        care_recipient_profile: Dict = None
+        care_recipient_profile: Dict = None,
+        history_digest: str = None,
+        structured: bool = False
     ) -> str:
-        """Build a detailed prompt for Gemini to analyze shift notes"""
+        """Analysis prompt only; see _build_budgeted_prompt"""
+        return self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile, history_digest, structured
+        )[0]
+
+    @metrics.timed('prompt_build')
+    def _build_budgeted_prompt(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str,
+        shift_context: Dict,
+        care_recipient_profile: Dict = None,
+        history_digest: str = None,
+        structured: bool = False
+    ) -> Tuple[str, Dict]:
+        """
+        Build a detailed prompt for Gemini to analyze shift notes, compacted to
+        fit self.token_budget. `structured` swaps the SUMMARY:/SUGGESTIONS:/
+        PRIORITIES: format instructions for a request for the JSON object of
+        analysis_schema().
 
+        Returns (prompt, metadata) where metadata has the estimated token count,
+        the budget and the compaction steps that were needed, if any.
+        """
+        # Recipient profile section, rendered once per profile version
+        profile_text = self.profile_prompts.render(care_recipient_profile)
+        prompt = self._render_analysis_prompt(
+            shift_notes, care_recipient_name, shift_context, profile_text, history_digest, structured
+        )
+        tokens = estimate_tokens(prompt)
+        if not self.token_budget or tokens <= self.token_budget:
+            return prompt, {'estimated_tokens': tokens, 'token_budget': self.token_budget, 'compacted': []}
+
+        return self._compact_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile, history_digest, structured
+        )
+
+    def _compact_prompt(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str,
+        shift_context: Dict,
+        care_recipient_profile: Dict,
+        history_digest: str,
+        structured: bool
+    ) -> Tuple[str, Dict]:
+        """
+        Shrink an over-budget prompt, least important input first: low-priority
+        profile fields (never safety fields like allergies or fall_risk), then
+        the oldest lines of the shift history, then older notes, and only then
+        the latest note.
+        """
+        budget = self.token_budget
+        profile = dict(care_recipient_profile or {})
+        notes = [dict(note) for note in shift_notes]
+        steps = []
+
+        def render():
+            profile_text = render_profile_section(profile) if care_recipient_profile else ''
+            return self._render_analysis_prompt(
+                notes, care_recipient_name, shift_context, profile_text, history_digest, structured
+            )
+
+        prompt = render()
+
+        dropped = []
+        for field in LOW_PRIORITY_PROFILE_FIELDS:
+            if estimate_tokens(prompt) <= budget:
+                break
+            if profile.get(field):
+                profile.pop(field)
+                dropped.append(field)
+                prompt = render()
+        if dropped:
+            steps.append({'step': 'dropped_profile_fields', 'fields': dropped})
+
+        if history_digest and estimate_tokens(prompt) > budget:
+            excess_chars = (estimate_tokens(prompt) - budget) * CHARS_PER_TOKEN
+            history_digest = drop_oldest_lines(history_digest, excess_chars) or None
+            steps.append({'step': 'trimmed_history'})
+            prompt = render()
+
+        # Older notes first, the latest one last
+        for i in range(len(notes)):
+            excess_chars = (estimate_tokens(prompt) - budget) * CHARS_PER_TOKEN
+            if excess_chars <= 0:
+                break
+            content = notes[i].get('content') or ''
+            if content:
+                notes[i]['content'] = truncate_middle(content, max(0, len(content) - excess_chars))
+                steps.append({'step': 'truncated_note', 'note': i + 1, 'original_chars': len(content)})
+                prompt = render()
+
+        return prompt, {'estimated_tokens': estimate_tokens(prompt), 'token_budget': budget, 'compacted': steps}
+
+    def _render_analysis_prompt(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str,
+        shift_context: Dict,
+        profile_text: str,
+        history_digest: str,
+        structured: bool
+    ) -> str:
         # Format shift notes into readable text
         notes_text = ""
         for i, note in enumerate(shift_notes, 1):
@@ -92,81 +587,9 @@ class GeminiService:
             if shift_context.get('shift_number'):
                 context_text += f"Shift Number: {shift_context['shift_number']}\n"
 
-        # Build recipient profile section if available
-        profile_text = ""
-        if care_recipient_profile:
-            profile_text = "\nCARE RECIPIENT PROFILE:\n"
-
-            # Basic info
-            if care_recipient_profile.get('preferred_form_of_address'):
-                profile_text += f"- Preferred Form of Address: {care_recipient_profile['preferred_form_of_address']}\n"
-            if care_recipient_profile.get('age'):
-                profile_text += f"- Age: {care_recipient_profile['age']}\n"
-            if care_recipient_profile.get('birthday'):
-                profile_text += f"- Birthday: {care_recipient_profile['birthday']}\n"
-
-            # Daily routine times
-            routine_times = []
-            if care_recipient_profile.get('wake_up'):
-                routine_times.append(f"Wake up: {care_recipient_profile['wake_up']}")
-            if care_recipient_profile.get('breakfast'):
-                routine_times.append(f"Breakfast: {care_recipient_profile['breakfast']}")
-            if care_recipient_profile.get('lunch'):
-                routine_times.append(f"Lunch: {care_recipient_profile['lunch']}")
-            if care_recipient_profile.get('dinner'):
-                routine_times.append(f"Dinner: {care_recipient_profile['dinner']}")
-            if care_recipient_profile.get('bedtime'):
-                routine_times.append(f"Bedtime: {care_recipient_profile['bedtime']}")
-            if routine_times:
-                profile_text += f"- Daily Routine: {', '.join(routine_times)}\n"
-
-            # Communication preferences
-            if care_recipient_profile.get('speech_pace'):
-                profile_text += f"- Speech Pace Preference: {care_recipient_profile['speech_pace']}\n"
-            if care_recipient_profile.get('hearing_status'):
-                profile_text += f"- Hearing Status: {care_recipient_profile['hearing_status']}\n"
-            if care_recipient_profile.get('visual_cues'):
-                profile_text += f"- Visual Cues: {care_recipient_profile['visual_cues']}\n"
-            if care_recipient_profile.get('instructions'):
-                profile_text += f"- Instructions Preference: {care_recipient_profile['instructions']}\n"
-
-            # Food and medication
-            if care_recipient_profile.get('food_preferences'):
-                profile_text += f"- Food Preferences: {care_recipient_profile['food_preferences']}\n"
-            if care_recipient_profile.get('medication_preferences'):
-                profile_text += f"- Medication Preferences: {care_recipient_profile['medication_preferences']}\n"
-
-            # Support needs
-            if care_recipient_profile.get('mobility_support'):
-                profile_text += f"- Mobility Support: {care_recipient_profile['mobility_support']}\n"
-            if care_recipient_profile.get('hearing_vision_support'):
-                profile_text += f"- Hearing/Vision Support: {care_recipient_profile['hearing_vision_support']}\n"
-            if care_recipient_profile.get('memory_reminders'):
-                profile_text += f"- Memory Reminders: {care_recipient_profile['memory_reminders']}\n"
-
-            # Safety information
-            if care_recipient_profile.get('fall_risk'):
-                profile_text += f"- Fall Risk: {care_recipient_profile['fall_risk']}\n"
-            if care_recipient_profile.get('allergies'):
-                profile_text += f"- ALLERGIES: {care_recipient_profile['allergies']}\n"
-            if care_recipient_profile.get('medical_conditions'):
-                profile_text += f"- Medical Conditions: {care_recipient_profile['medical_conditions']}\n"
-
-            # Personal interests
-            if care_recipient_profile.get('hobbies'):
-                profile_text += f"- Hobbies: {care_recipient_profile['hobbies']}\n"
-            if care_recipient_profile.get('favourite_topics'):
-                profile_text += f"- Favorite Topics: {care_recipient_profile['favourite_topics']}\n"
-
-            # Boundaries and preferences
-            if care_recipient_profile.get('privacy_boundaries'):
-                profile_text += f"- Privacy Boundaries: {care_recipient_profile['privacy_boundaries']}\n"
-            if care_recipient_profile.get('sensitive_topics'):
-                profile_text += f"- Sensitive Topics to Avoid: {care_recipient_profile['sensitive_topics']}\n"
-            if care_recipient_profile.get('independence_preferences'):
-                profile_text += f"- Independence Preferences: {care_recipient_profile['independence_preferences']}\n"
-            if care_recipient_profile.get('physical_comfort'):
-                profile_text += f"- Physical Comfort Preferences: {care_recipient_profile['physical_comfort']}\n"
+        # Condensed history of earlier shifts (recipient timeline mode)
+        if history_digest:
+            profile_text += f"\nPREVIOUS SHIFTS (summarized, oldest first):\n{history_digest}\n"
 
         prompt = f"""You are an expert healthcare assistant analyzing caregiver shift notes for elderly care.
 
@@ -193,75 +616,187 @@ Please analyze these shift notes and provide personalized recommendations based
    - Any safety concerns (fall risk, allergies, medical conditions)
    - Observations from the shift notes that need immediate attention
 
-Format your response EXACTLY as follows:
-SUMMARY:
-[Your summary here]
-
-SUGGESTIONS:
-- [Suggestion 1]
-- [Suggestion 2]
-- [Suggestion 3]
-...
-
-PRIORITIES:
-- [Priority 1]
-- [Priority 2]
-- [Priority 3]
-"""
+{JSON_FORMAT_INSTRUCTIONS if structured else TEXT_FORMAT_INSTRUCTIONS}"""
         return prompt
 
+    def _parse_structured_response(self, response_text: str) -> Dict:
+        """
+        Validate schema-constrained JSON output. Text that is not valid JSON
+        for the schema (e.g. from a model ignoring response_schema) goes
+        through the line-based parser instead.
+        """
+        try:
+            return AnalysisResult.from_json(response_text).to_dict()
+        except ValueError as e:
+            metrics.record_structured_fallback()
+            print(f"Structured analysis output did not validate, using text parser: {e}")
+            return self._parse_gemini_response(response_text)
+
     def _parse_gemini_response(self, response_text: str) -> Dict:
         """Parse Gemini's structured response into a dictionary"""
-        result = {
-            'suggestions': [],
-            'summary': '',
-            'priorities': []
-        }
-
-        # Split response into sections
-        lines = response_text.strip().split('\n')
-        current_section = None
-
-        for line in lines:
-            line = line.strip()
-
-            if line.startswith('SUMMARY:'):
-                current_section = 'summary'
-                # Get summary text after "SUMMARY:"
-                summary_text = line.replace('SUMMARY:', '').strip()
-                if summary_text:
-                    result['summary'] = summary_text
-                continue
-            elif line.startswith('SUGGESTIONS:'):
-                current_section = 'suggestions'
-                continue
-            elif line.startswith('PRIORITIES:'):
-                current_section = 'priorities'
-                continue
-
-            # Process content based on current section
-            if current_section == 'summary' and line:
-                if result['summary']:
-                    result['summary'] += ' ' + line
-                else:
-                    result['summary'] = line
-            elif current_section == 'suggestions' and line.startswith('-'):
-                suggestion = line[1:].strip()
-                if suggestion:
-                    result['suggestions'].append(suggestion)
-            elif current_section == 'priorities' and line.startswith('-'):
-                priority = line[1:].strip()
-                if priority:
-                    result['priorities'].append(priority)
+        parser = StreamingResponseParser()
+        parser.feed(response_text.strip())
+        parser.close()
+        return parser.result
 
-        return result
-
-    def generate_shift_summary(self, shift_notes: List[Dict]) -> str:
+    def stream_shift_analysis(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str = None,
+        shift_context: Dict = None,
+        care_recipient_profile: Dict = None,
+        admit: 'Admitter' = None
+    ) -> Iterator[Dict]:
+        """
+        Streaming variant of analyze_shift_notes.
+
+        `admit` (an Admitter) is charged and holds a slot around the model
+        stream only, so a cached result is replayed without admission. Yields events as soon as each piece of
+        the analysis is complete:
+        {'event': 'summary', 'data': {'text': ...}},
+        {'event': 'suggestion' | 'priority', 'data': {'index': n, 'text': ...}},
+        then a final {'event': 'done', 'data': <full analysis dict>}
+        or {'event': 'error', 'data': {'error': ...}}.
+        """
+        if not shift_notes:
+            yield {'event': 'done', 'data': self._no_notes_analysis()}
+            return
+
+        prompt, prompt_metadata = self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile
+        )
+
+        model = self._route_analysis(prompt_metadata)
+        probe = self._similarity_probe(shift_notes, care_recipient_name, care_recipient_profile, shift_context)
+        cache_key, cached = self._lookup_cached_analysis(prompt, model, probe)
+        if cached is not None:
+            # Replay the cached result as events so clients see the same stream
+            yield from StreamingResponseParser.events_for(cached)
+            yield {'event': 'done', 'data': {**cached, 'prompt_metadata': {**prompt_metadata, 'cached': True}}}
+            return
+
+        # Admission is only needed when the model is called
+        if admit:
+            admit.charge()
+        with admit.slot() if admit else nullcontext():
+            parser = StreamingResponseParser()
+            stream_text, usage, error = [], None, None
+            start = time.perf_counter()
+            try:
+                # Overflows to the fallback model when this one is saturated
+                model = self.router.acquire(model, self.retry_policy.attempt_timeout)
+            except ModelBusy as e:
+                error = e
+            else:
+                try:
+                    for chunk in self.client.models.generate_content_stream(
+                        model=model,
+                        contents=prompt,
+                        # A stream cannot be retried once text has been sent, so it only gets a timeout
+                        config=timeout_config(self.retry_policy.attempt_timeout)
+                    ):
+                        usage = getattr(chunk, 'usage_metadata', None) or usage
+                        if chunk.text:
+                            stream_text.append(chunk.text)
+                            yield from parser.feed(chunk.text)
+                    yield from parser.close()
+                except Exception as e:
+                    error = e
+                finally:
+                    self.router.release(model, time.perf_counter() - start, error)
+            if error is not None:
+                print(f"Error streaming from Gemini API: {error}")
+                metrics.record_gemini_error('stream')
+                yield {'event': 'error', 'data': {'error': str(error)}}
+                return
+
+            metrics.observe_stage('gemini_stream', time.perf_counter() - start)
+            metrics.record_generation(model, 'stream', prompt, ''.join(stream_text), usage)
+            self.router.record_usage(model, usage)
+
+            self._store_analysis(cache_key, parser.result)
+            self._index_analysis(probe, parser.result)
+            yield {'event': 'done', 'data': {**parser.result, 'prompt_metadata': prompt_metadata}}
+
+    async def stream_shift_analysis_async(
+        self,
+        shift_notes: List[Dict],
+        care_recipient_name: str = None,
+        shift_context: Dict = None,
+        care_recipient_profile: Dict = None,
+        admit: 'Admitter' = None
+    ) -> AsyncIterator[Dict]:
+        """Async generator version of stream_shift_analysis, yielding the same events"""
+        if not shift_notes:
+            yield {'event': 'done', 'data': self._no_notes_analysis()}
+            return
+
+        prompt, prompt_metadata = self._build_budgeted_prompt(
+            shift_notes, care_recipient_name, shift_context, care_recipient_profile
+        )
+
+        model = self._route_analysis(prompt_metadata)
+        probe = self._similarity_probe(shift_notes, care_recipient_name, care_recipient_profile, shift_context)
+        cache_key, cached = self._lookup_cached_analysis(prompt, model, probe)
+        if cached is not None:
+            for event in StreamingResponseParser.events_for(cached):
+                yield event
+            yield {'event': 'done', 'data': {**cached, 'prompt_metadata': {**prompt_metadata, 'cached': True}}}
+            return
+
+        if admit:
+            await admit.charge_async()
+        async with admit.slot_async() if admit else nullcontext():
+            parser = StreamingResponseParser()
+            events = []
+            stream_text, usage, error = [], None, None
+            start = time.perf_counter()
+            try:
+                model = await self.router.acquire_async(model, self.retry_policy.attempt_timeout)
+            except ModelBusy as e:
+                error = e
+            else:
+                try:
+                    async for chunk in await self.client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=prompt,
+                        # A stream cannot be retried once text has been sent, so it only gets a timeout
+                        config=timeout_config(self.retry_policy.attempt_timeout)
+                    ):
+                        usage = getattr(chunk, 'usage_metadata', None) or usage
+                        if chunk.text:
+                            stream_text.append(chunk.text)
+                            for event in parser.feed(chunk.text):
+                                yield event
+                    events = parser.close()
+                except Exception as e:
+                    error = e
+                finally:
+                    self.router.release(model, time.perf_counter() - start, error)
+            if error is not None:
+                print(f"Error streaming from Gemini API: {error}")
+                metrics.record_gemini_error('stream')
+                yield {'event': 'error', 'data': {'error': str(error)}}
+                return
+
+            metrics.observe_stage('gemini_stream', time.perf_counter() - start)
+            metrics.record_generation(model, 'stream', prompt, ''.join(stream_text), usage)
+            self.router.record_usage(model, usage)
+
+            for event in events:
+                yield event
+
+            self._store_analysis(cache_key, parser.result)
+            self._index_analysis(probe, parser.result)
+            yield {'event': 'done', 'data': {**parser.result, 'prompt_metadata': prompt_metadata}}
+
+    def generate_shift_summary(self, shift_notes: List[Dict], admit: 'Admitter' = None) -> str:
         """
         Generate a concise summary of shift notes
 
         Args:
             shift_notes: List of shift note dictionaries
+            admit: Optional Admitter, used only when the model has to be called
 
         Returns:
             String summary of the shift
@@ -269,23 +804,217 @@ PRIORITIES:
         if not shift_notes:
             return "No notes recorded for this shift."
 
+        prompt = self._build_summary_prompt(shift_notes)
+        # Short summaries go to the fast model
+        model = self.router.route('summary', estimate_tokens(prompt))
+        cache_key, cached = self._lookup_cached_analysis(prompt, model)
+        if cached is not None:
+            return cached['summary']
+
+        if admit:
+            admit.charge()
+        return self.single_flight.do(
+            cache_key,
+            _admitted(lambda: self._run_summary(prompt, cache_key, model), admit),
+            recheck=lambda: (self._cached(cache_key) or {}).get('summary')
+        )
+
+    def _run_summary(self, prompt: str, cache_key: str, model: str = None) -> str:
+        try:
+            response = self._generate(prompt, 'summary', model=model)
+            return self._finish_summary(response.text, cache_key)
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            return f"{SUMMARY_ERROR_PREFIX}: {str(e)}"
+
+    async def generate_shift_summary_async(self, shift_notes: List[Dict], admit: 'Admitter' = None) -> str:
+        """Awaitable version of generate_shift_summary for the ASGI app"""
+        if not shift_notes:
+            return "No notes recorded for this shift."
+
+        prompt = self._build_summary_prompt(shift_notes)
+        # Short summaries go to the fast model
+        model = self.router.route('summary', estimate_tokens(prompt))
+        cache_key, cached = self._lookup_cached_analysis(prompt, model)
+        if cached is not None:
+            return cached['summary']
+
+        if admit:
+            await admit.charge_async()
+        return await self.single_flight.do_async(
+            cache_key,
+            _admitted_async(lambda: self._run_summary_async(prompt, cache_key, model), admit),
+            recheck=lambda: (self._cached(cache_key) or {}).get('summary')
+        )
+
+    async def _run_summary_async(self, prompt: str, cache_key: str, model: str = None) -> str:
+        try:
+            response = await self._generate_async(prompt, 'summary', model=model)
+            return self._finish_summary(response.text, cache_key)
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            return f"{SUMMARY_ERROR_PREFIX}: {str(e)}"
+
+    def _finish_summary(self, response_text: str, cache_key: str) -> str:
+        summary = response_text.strip()
+        # Summaries share the analysis cache so other workers can pick them up too
+        if self.cache and summary:
+            self.cache.set(cache_key, {'summary': summary})
+        return summary
+
+    def summary_model(self, shift_notes: List[Dict]) -> str:
+        """Model generate_shift_summary would use for these notes"""
+        return self.router.model_for('summary', estimate_tokens(self._build_summary_prompt(shift_notes)))
+
+    def summary_failed(self, summary: str) -> bool:
+        """True if generate_shift_summary returned an error message instead of a summary"""
+        return not summary or summary.startswith(SUMMARY_ERROR_PREFIX)
+
+    def _build_summary_prompt(self, shift_notes: List[Dict]) -> str:
         notes_text = "\n".join([
             f"- [{note.get('caregiver_name', 'Unknown')}]: {note.get('content', '')}"
             for note in shift_notes
         ])
 
-        prompt = f"""Summarize these caregiver shift notes in 2-3 sentences:
+        return f"""Summarize these caregiver shift notes in 2-3 sentences:
 
 {notes_text}
 
 Provide a clear, concise summary focusing on the most important information."""
 
+
+class AnalysisResult:
+    """Validated analysis returned by the model in JSON mode"""
+
+    __slots__ = ('summary', 'suggestions', 'priorities')
+
+    def __init__(self, summary: str, suggestions: List[str], priorities: List[str]):
+        self.summary = summary
+        self.suggestions = suggestions
+        self.priorities = priorities
+
+    @classmethod
+    def from_json(cls, text: str) -> 'AnalysisResult':
+        """Parse and validate model output; raises ValueError if it does not match analysis_schema()"""
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            return response.text.strip()
-        except Exception as e:
-            print(f"Error generating summary: {e}")
-            return f"Error generating summary: {str(e)}"
+            data = json.loads(text)
+        except (TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f'not JSON: {e}')
+        if not isinstance(data, dict):
+            raise ValueError('expected a JSON object')
+
+        summary = data.get('summary')
+        if not isinstance(summary, str):
+            raise ValueError('summary must be a string')
+        return cls(summary.strip(), cls._items(data, 'suggestions'), cls._items(data, 'priorities'))
+
+    @staticmethod
+    def _items(data: Dict, field: str) -> List[str]:
+        items = data.get(field)
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise ValueError(f'{field} must be a list of strings')
+        return [item.strip() for item in items if item.strip()]
+
+    def to_dict(self) -> Dict:
+        return {
+            'suggestions': self.suggestions,
+            'summary': self.summary,
+            'priorities': self.priorities
+        }
+
+
+class StreamingResponseParser:
+    """
+    Incremental parser for the SUMMARY/SUGGESTIONS/PRIORITIES response format.
+
+    Text can be fed in arbitrary chunks; only complete lines are parsed, and
+    each finished summary or bullet is returned as an event.
+    """
+
+    def __init__(self):
+        self.result = {
+            'suggestions': [],
+            'summary': '',
+            'priorities': []
+        }
+        self._buffer = ''
+        self._section = None
+        self._summary_sent = False
+
+    def feed(self, text: str) -> List[Dict]:
+        """Add a chunk of model output and return events for any lines it completed"""
+        self._buffer += text
+        events = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            events.extend(self._process_line(line))
+        return events
+
+    def close(self) -> List[Dict]:
+        """Parse whatever is left once the model has finished"""
+        events = []
+        if self._buffer:
+            events.extend(self._process_line(self._buffer))
+            self._buffer = ''
+        events.extend(self._finish_summary())
+        return events
+
+    @staticmethod
+    def events_for(result: Dict) -> List[Dict]:
+        """Events equivalent to streaming an already complete result"""
+        events = []
+        if result.get('summary'):
+            events.append({'event': 'summary', 'data': {'text': result['summary']}})
+        for i, text in enumerate(result.get('suggestions', [])):
+            events.append({'event': 'suggestion', 'data': {'index': i, 'text': text}})
+        for i, text in enumerate(result.get('priorities', [])):
+            events.append({'event': 'priority', 'data': {'index': i, 'text': text}})
+        return events
+
+    def _finish_summary(self) -> List[Dict]:
+        if self._summary_sent or not self.result['summary']:
+            return []
+        self._summary_sent = True
+        return [{'event': 'summary', 'data': {'text': self.result['summary']}}]
+
+    def _process_line(self, line: str) -> List[Dict]:
+        line = line.strip()
+        result = self.result
+
+        if line.startswith('SUMMARY:'):
+            self._section = 'summary'
+            # Get summary text after "SUMMARY:"
+            summary_text = line.replace('SUMMARY:', '').strip()
+            if summary_text:
+                result['summary'] = summary_text
+            return []
+        elif line.startswith('SUGGESTIONS:'):
+            self._section = 'suggestions'
+            return self._finish_summary()
+        elif line.startswith('PRIORITIES:'):
+            self._section = 'priorities'
+            return self._finish_summary()
+
+        # Process content based on current section
+        if self._section == 'summary' and line:
+            if result['summary']:
+                result['summary'] += ' ' + line
+            else:
+                result['summary'] = line
+        elif self._section == 'suggestions' and line.startswith('-'):
+            suggestion = line[1:].strip()
+            if suggestion:
+                result['suggestions'].append(suggestion)
+                return [{'event': 'suggestion', 'data': {
+                    'index': len(result['suggestions']) - 1,
+                    'text': suggestion
+                }}]
+        elif self._section == 'priorities' and line.startswith('-'):
+            priority = line[1:].strip()
+            if priority:
+                result['priorities'].append(priority)
+                return [{'event': 'priority', 'data': {
+                    'index': len(result['priorities']) - 1,
+                    'text': priority
+                }}]
+        return []
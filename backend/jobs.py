@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', 30))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 300))
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of "analyze shift X" jobs plus the store of their results.
+
+    The web workers enqueue jobs and read results, and worker.py claims and runs
+    them, so all of them must see the same database file (same host or volume).
+    """
+
+    def __init__(self, path: str, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    shift_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    run_after REAL NOT NULL,
+                    leased_until REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, run_after);
+                CREATE INDEX IF NOT EXISTS jobs_shift ON jobs (shift_id, status);
+                CREATE TABLE IF NOT EXISTS analysis_results (
+                    shift_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # ============= PRODUCERS =============
+
+    def enqueue(self, shift_id: str, priority: int = 0) -> Dict:
+        """
+        Queue an analysis for a shift. If one is already waiting for the same
+        shift that job is returned instead of adding a duplicate.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE shift_id = ? AND status = ? ORDER BY id LIMIT 1',
+                (shift_id, QUEUED)
+            ).fetchone()
+            if row is None:
+                cursor = conn.execute(
+                    'INSERT INTO jobs (shift_id, status, max_attempts, priority, run_after, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (shift_id, QUEUED, self.max_attempts, priority, now, now, now)
+                )
+                row = conn.execute('SELECT * FROM jobs WHERE id = ?', (cursor.lastrowid,)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self._job_dict(row)
+
+    def enqueue_many(self, shift_ids: List[str], priority: int = 0) -> List[Dict]:
+        return [self.enqueue(shift_id, priority) for shift_id in shift_ids]
+
+    # ============= WORKER =============
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Lease the next runnable job. Jobs whose lease ran out (the worker died
+        mid-job) become claimable again, unless they have used up their
+        attempts; those are marked failed instead.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, leased_until = NULL, last_error = ?, updated_at = ? '
+                'WHERE status = ? AND leased_until < ? AND attempts >= max_attempts',
+                (FAILED, 'Lease expired after the last attempt', now, RUNNING, now)
+            )
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE (status = ? AND run_after <= ?) OR (status = ? AND leased_until < ?) '
+                'ORDER BY priority DESC, run_after LIMIT 1',
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, leased_until = ?, updated_at = ? WHERE id = ?',
+                (RUNNING, now + JOB_LEASE_SECONDS, now, row['id'])
+            )
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self._job_dict(row)
+
+    def complete(self, job_id: int):
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, leased_until = NULL, last_error = NULL, updated_at = ? WHERE id = ?',
+            (SUCCEEDED, time.time(), job_id)
+        )
+
+    def fail(self, job: Dict, error: str):
+        """Requeue with exponential backoff, or mark failed once attempts run out"""
+        now = time.time()
+        if job['attempts'] >= job['max_attempts']:
+            status, run_after = FAILED, now
+        else:
+            status, run_after = QUEUED, now + JOB_RETRY_BASE_SECONDS * (2 ** (job['attempts'] - 1))
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, run_after = ?, leased_until = NULL, last_error = ?, updated_at = ? WHERE id = ?',
+            (status, run_after, error, now, job['id'])
+        )
+
+    # ============= RESULTS =============
+
+    def store_result(self, shift_id: str, fingerprint: str, result: Dict):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO analysis_results (shift_id, fingerprint, result, updated_at) VALUES (?, ?, ?, ?)',
+            (shift_id, fingerprint, json.dumps(result), time.time())
+        )
+
+    def get_result(self, shift_id: str, fingerprint: str) -> Optional[Dict]:
+        """Precomputed analysis for the shift, or None if missing or stale"""
+        row = self._connect().execute(
+            'SELECT result FROM analysis_results WHERE shift_id = ? AND fingerprint = ?',
+            (shift_id, fingerprint)
+        ).fetchone()
+        return json.loads(row['result']) if row else None
+
+    # ============= STATUS =============
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def stats(self) -> Dict:
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for row in self._connect().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status'):
+            counts[row['status']] = row['n']
+        counts['precomputed_results'] = self._connect().execute(
+            'SELECT COUNT(*) FROM analysis_results'
+        ).fetchone()[0]
+        return counts
+
+    def _job_dict(self, row) -> Dict:
+        return {
+            'id': row['id'],
+            'shift_id': row['shift_id'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'priority': row['priority'],
+            'run_after': row['run_after'],
+            'last_error': row['last_error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+
+
+def create_job_queue() -> Optional[JobQueue]:
+    """
+    JOBS_BACKEND: 'sqlite' (default) or 'none'
+    JOBS_DB_PATH: SQLite file shared by the web app and worker.py (default jobs.db)
+    """
+    backend_name = os.getenv('JOBS_BACKEND', 'sqlite').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'sqlite':
+        return JobQueue(os.getenv('JOBS_DB_PATH', 'jobs.db'))
+    raise ValueError(f"Unknown JOBS_BACKEND '{backend_name}', expected sqlite or none")
@@ -0,0 +1,280 @@
+"""
+In-process latency and usage metrics, exposed in the Prometheus text format on /metrics.
+
+Each request records how long every stage took (Supabase queries, prompt
+building, cache lookups, the Gemini call, response parsing) into per-stage
+histograms, together with prompt/response sizes, Gemini token usage and
+request/error counts per route.
+
+Metrics live in the memory of each worker process, so with several gunicorn
+workers a scrape shows the worker that answered it; scrape each worker (or
+run one worker per container) for complete numbers.
+
+METRICS_ENABLED: record metrics (default true)
+METRICS_TIMING_HEADER: add a Server-Timing header with the stage timings of
+    each request (default false)
+"""
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+METRICS_TIMING_HEADER = os.getenv('METRICS_TIMING_HEADER', 'false').lower() in ('1', 'true', 'yes')
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings: contextvars.ContextVar = contextvars.ContextVar('request_timings', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_label_text(self.labelnames, labels)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def snapshot(self) -> Dict[Tuple, Tuple[int, float]]:
+        """(count, sum) per label set"""
+        with self._lock:
+            return {labels: (series[2], series[1]) for labels, series in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.labelnames, labels)} {total:.6f}')
+            lines.append(f'{self.name}_count{_label_text(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'careapp_stage_seconds', 'Time spent in each stage of request handling', ('stage',)
+)
+REQUEST_SECONDS = registry.histogram(
+    'careapp_http_request_seconds', 'HTTP request latency by route', ('route', 'method')
+)
+REQUESTS = registry.counter(
+    'careapp_http_requests_total', 'HTTP requests by route and status', ('route', 'method', 'status')
+)
+REQUEST_ERRORS = registry.counter(
+    'careapp_http_request_errors_total', 'HTTP requests answered with a 5xx status, by route', ('route',)
+)
+PROMPT_BYTES = registry.histogram(
+    'careapp_gemini_prompt_bytes', 'Size of prompts sent to Gemini', ('operation',), buckets=SIZE_BUCKETS
+)
+RESPONSE_BYTES = registry.histogram(
+    'careapp_gemini_response_bytes', 'Size of Gemini response text', ('operation',), buckets=SIZE_BUCKETS
+)
+GEMINI_TOKENS = registry.counter(
+    'careapp_gemini_tokens_total', 'Tokens reported by the Gemini API', ('model', 'kind')
+)
+GEMINI_ERRORS = registry.counter(
+    'careapp_gemini_errors_total', 'Gemini calls that failed after retries', ('operation',)
+)
+STRUCTURED_FALLBACKS = registry.counter(
+    'careapp_structured_output_fallbacks_total', 'JSON-mode analyses that had to use the text parser'
+)
+NEAR_DUPLICATE_REUSES = registry.counter(
+    'careapp_near_duplicate_reuses_total', 'Analyses reused from a shift with near-identical notes'
+)
+ADMISSION_REJECTIONS = registry.counter(
+    'careapp_admission_rejections_total', 'Requests shed by admission control', ('reason',)
+)
+
+# usage_metadata fields counted per token kind
+_TOKEN_FIELDS = (
+    ('prompt', 'prompt_token_count'),
+    ('response', 'candidates_token_count'),
+    ('total', 'total_token_count'),
+)
+
+
+# ============= RECORDING =============
+
+class stage:
+    """Time the enclosed block as one stage of the current request"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def observe_stage(name: str, elapsed: float):
+    """Record a stage that was timed by the caller (e.g. one spread over a generator)"""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(elapsed, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, elapsed))
+
+
+def timed(name: str):
+    """Decorator form of stage for synchronous functions"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_generation(model: str, operation: str, prompt: str, response_text: Optional[str], usage=None):
+    """Prompt/response sizes and token usage of one Gemini call"""
+    if not METRICS_ENABLED:
+        return
+    PROMPT_BYTES.observe(len(prompt.encode('utf-8')), operation)
+    if response_text is not None:
+        RESPONSE_BYTES.observe(len(response_text.encode('utf-8')), operation)
+    if usage is not None:
+        for kind, field in _TOKEN_FIELDS:
+            tokens = getattr(usage, field, None)
+            if tokens:
+                GEMINI_TOKENS.inc(model, kind, amount=tokens)
+
+
+def record_gemini_error(operation: str):
+    if METRICS_ENABLED:
+        GEMINI_ERRORS.inc(operation)
+
+
+def record_structured_fallback():
+    if METRICS_ENABLED:
+        STRUCTURED_FALLBACKS.inc()
+
+
+def record_near_duplicate_reuse():
+    if METRICS_ENABLED:
+        NEAR_DUPLICATE_REUSES.inc()
+
+
+def record_admission_rejection(reason: str):
+    if METRICS_ENABLED:
+        ADMISSION_REJECTIONS.inc(reason)
+
+
+def start_request():
+    """Begin collecting stage timings for the current request; returns the timings list"""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def finish_request(route: str, method: str, status: int, elapsed: float):
+    if not METRICS_ENABLED:
+        return
+    REQUEST_SECONDS.observe(elapsed, route, method)
+    REQUESTS.inc(route, method, str(status))
+    if status >= 500:
+        REQUEST_ERRORS.inc(route)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float = None) -> str:
+    """Server-Timing header value, e.g. 'shift_query;dur=12.1, gemini_call;dur=803.4'"""
+    entries = [f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in timings]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def render() -> str:
+    return registry.render()
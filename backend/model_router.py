@@ -0,0 +1,327 @@
+"""
+Chooses the Gemini model for each call and enforces per-model limits.
+
+Shift summaries and small analyses go to a cheaper, faster model; everything
+else goes to the analysis model. Each model has its own concurrency limit, and
+a call that times out, is rate limited or finds its model saturated moves to
+the other model for its next attempt.
+
+GEMINI_ANALYSIS_MODEL: model for full analyses (default gemini-2.5-flash)
+GEMINI_FAST_MODEL: model for summaries and small analyses, and the fallback
+    of the analysis model (default gemini-2.5-flash-lite, '' disables it)
+GEMINI_FAST_SUMMARY_MAX_TOKENS: summary prompts up to this size use the fast
+    model (default 4000)
+GEMINI_FAST_ANALYSIS_MAX_TOKENS: analysis prompts up to this size use the fast
+    model (default 0, analyses always use the analysis model)
+GEMINI_MODEL_CONCURRENCY: per-model in-flight limits, e.g.
+    'gemini-2.5-flash=16,gemini-2.5-flash-lite=32' (default GEMINI_POOL_SIZE each)
+GEMINI_MODEL_PRICES: USD per million prompt/response tokens for the cost
+    estimate on /health, e.g. 'gemini-2.5-flash=0.30/2.50'
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+import requests
+from clients import GEMINI_POOL_SIZE, ModelBusy
+
+GEMINI_ANALYSIS_MODEL = os.getenv('GEMINI_ANALYSIS_MODEL', 'gemini-2.5-flash')
+GEMINI_FAST_MODEL = os.getenv('GEMINI_FAST_MODEL', 'gemini-2.5-flash-lite')
+GEMINI_FAST_SUMMARY_MAX_TOKENS = int(os.getenv('GEMINI_FAST_SUMMARY_MAX_TOKENS', 4000))
+GEMINI_FAST_ANALYSIS_MAX_TOKENS = int(os.getenv('GEMINI_FAST_ANALYSIS_MAX_TOKENS', 0))
+
+# List prices in USD per million (prompt, response) tokens
+DEFAULT_MODEL_PRICES = {
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.5-pro': (1.25, 10.00),
+}
+
+# Errors that say "this model, right now" rather than "this request":
+# rate limiting, overload and timeouts
+FALLBACK_STATUS_CODES = {408, 429, 503, 504}
+
+# How often a coroutine waiting for a model slot checks again
+ASYNC_SLOT_POLL = 0.01
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    pairs = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for name, value in _parse_pairs(spec).items():
+        prompt_price, _, response_price = value.partition('/')
+        prices[name] = (float(prompt_price), float(response_price or prompt_price))
+    return prices
+
+
+def should_fall_back(error: Exception) -> bool:
+    """True if the next attempt is better spent on the other model"""
+    from google.genai import errors as genai_errors
+    if isinstance(error, ModelBusy):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code in FALLBACK_STATUS_CODES
+    return isinstance(error, requests.exceptions.Timeout)
+
+
+class ModelSlots:
+    """In-flight limit for one model, usable from threads and coroutines alike"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < self.limit, timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout: float) -> bool:
+        # Polling keeps the event loop free; a threading.Condition wait would block it
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(ASYNC_SLOT_POLL)
+        return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+
+class ModelStats:
+    """Call counts, latency, token usage and estimated cost of one model"""
+
+    def __init__(self, prices: Tuple[float, float] = None):
+        self.prices = prices
+        self.routed = 0
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    def to_dict(self) -> Dict:
+        stats = {
+            'routed': self.routed,
+            'calls': self.calls,
+            'errors': self.errors,
+            'fallbacks': self.fallbacks,
+            'avg_latency_ms': round(self.latency_total / self.calls * 1000, 1) if self.calls else 0.0,
+            'max_latency_ms': round(self.latency_max * 1000, 1),
+            'prompt_tokens': self.prompt_tokens,
+            'response_tokens': self.response_tokens,
+        }
+        if self.prices:
+            stats['estimated_cost_usd'] = round(
+                (self.prompt_tokens * self.prices[0] + self.response_tokens * self.prices[1]) / 1_000_000, 6
+            )
+        return stats
+
+
+class ModelRouter:
+    """
+    Picks a model per call from the task and prompt size, limits concurrent
+    calls per model and switches to the other model when one is struggling.
+    """
+
+    def __init__(
+        self,
+        analysis_model: str = GEMINI_ANALYSIS_MODEL,
+        fast_model: Optional[str] = GEMINI_FAST_MODEL,
+        fast_summary_max_tokens: int = GEMINI_FAST_SUMMARY_MAX_TOKENS,
+        fast_analysis_max_tokens: int = GEMINI_FAST_ANALYSIS_MAX_TOKENS,
+        concurrency: Dict[str, int] = None,
+        prices: Dict[str, Tuple[float, float]] = None
+    ):
+        self.analysis_model = analysis_model
+        self.fast_model = fast_model if fast_model and fast_model != analysis_model else None
+        self.fast_summary_max_tokens = fast_summary_max_tokens
+        self.fast_analysis_max_tokens = fast_analysis_max_tokens
+        if concurrency is None:
+            concurrency = {name: int(limit) for name, limit in
+                           _parse_pairs(os.getenv('GEMINI_MODEL_CONCURRENCY', '')).items()}
+        if prices is None:
+            prices = {**DEFAULT_MODEL_PRICES, **_parse_prices(os.getenv('GEMINI_MODEL_PRICES', ''))}
+        self._lock = threading.Lock()
+        self._slots: Dict[str, ModelSlots] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        for model in self.models():
+            self._slots[model] = ModelSlots(concurrency.get(model, GEMINI_POOL_SIZE))
+            self._stats[model] = ModelStats(prices.get(model))
+
+    def models(self) -> Tuple[str, ...]:
+        return (self.analysis_model, self.fast_model) if self.fast_model else (self.analysis_model,)
+
+    def model_for(self, task: str, prompt_tokens: int) -> str:
+        """Model for a 'summary' or 'analysis' prompt of about prompt_tokens tokens, without counting a call"""
+        limit = self.fast_summary_max_tokens if task == 'summary' else self.fast_analysis_max_tokens
+        return self.fast_model if self.fast_model and prompt_tokens <= limit else self.analysis_model
+
+    def route(self, task: str, prompt_tokens: int) -> str:
+        """model_for() of a prompt that is about to be sent"""
+        model = self.model_for(task, prompt_tokens)
+        with self._lock:
+            self._stats[model].routed += 1
+        return model
+
+    def fallback_for(self, model: str) -> Optional[str]:
+        if not self.fast_model:
+            return None
+        return self.fast_model if model == self.analysis_model else self.analysis_model
+
+    def call(self, model: str, fn: Callable[[str, float], object]) -> 'RoutedCall':
+        """
+        Attempt function for RetryPolicy.call: runs fn(model, timeout) within
+        the model's concurrency limit, moving to the fallback model after a
+        timeout, rate limit or saturation.
+        """
+        return RoutedCall(self, model, fn)
+
+    def call_async(self, model: str, fn: Callable[[str, float], object]) -> 'AsyncRoutedCall':
+        """Same as call() for a coroutine function, for RetryPolicy.call_async"""
+        return AsyncRoutedCall(self, model, fn)
+
+    def acquire(self, model: str, timeout: float) -> str:
+        """
+        Reserve a slot, preferring `model` and taking the fallback if `model`
+        is saturated. Returns the model reserved; raises ModelBusy on timeout.
+        """
+        fallback = self.fallback_for(model)
+        if self._slots[model].try_acquire():
+            return model
+        if fallback and self._slots[fallback].try_acquire():
+            self._count_fallback(model)
+            return fallback
+        if self._slots[model].acquire(timeout):
+            return model
+        raise ModelBusy(f'{model} is at its concurrency limit')
+
+    async def acquire_async(self, model: str, timeout: float) -> str:
+        fallback = self.fallback_for(model)
+        if self._slots[model].try_acquire():
+            return model
+        if fallback and self._slots[fallback].try_acquire():
+            self._count_fallback(model)
+            return fallback
+        if await self._slots[model].acquire_async(timeout):
+            return model
+        raise ModelBusy(f'{model} is at its concurrency limit')
+
+    def release(self, model: str, elapsed: float, error: Exception = None):
+        self._slots[model].release()
+        with self._lock:
+            stats = self._stats[model]
+            stats.calls += 1
+            stats.latency_total += elapsed
+            stats.latency_max = max(stats.latency_max, elapsed)
+            if error is not None:
+                stats.errors += 1
+
+    def record_usage(self, model: str, usage):
+        """Token counts from a response's usage_metadata"""
+        if usage is None or model not in self._stats:
+            return
+        with self._lock:
+            stats = self._stats[model]
+            stats.prompt_tokens += getattr(usage, 'prompt_token_count', None) or 0
+            stats.response_tokens += getattr(usage, 'candidates_token_count', None) or 0
+
+    def _count_fallback(self, model: str):
+        with self._lock:
+            self._stats[model].fallbacks += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            models = {model: stats.to_dict() for model, stats in self._stats.items()}
+        for model, slots in self._slots.items():
+            models[model]['in_flight'] = slots.in_flight
+            models[model]['max_concurrency'] = slots.limit
+        return {
+            'analysis_model': self.analysis_model,
+            'fast_model': self.fast_model,
+            'fast_summary_max_tokens': self.fast_summary_max_tokens,
+            'fast_analysis_max_tokens': self.fast_analysis_max_tokens,
+            'models': models,
+        }
+
+
+class RoutedCall:
+    """
+    One routed generate_content call across retry attempts. `model` is the
+    model of the latest attempt, i.e. the one that answered once it succeeds.
+    """
+
+    def __init__(self, router: ModelRouter, model: str, fn: Callable[[str, float], object]):
+        self.router = router
+        self.model = model
+        self.fn = fn
+
+    def _failed(self, model: str, error: Exception):
+        fallback = self.router.fallback_for(model)
+        if fallback and should_fall_back(error):
+            print(f"Falling back from {model} to {fallback} after error: {error}")
+            self.router._count_fallback(model)
+            self.model = fallback
+
+    def __call__(self, timeout: float):
+        started = time.monotonic()
+        try:
+            model = self.model = self.router.acquire(self.model, timeout)
+        except ModelBusy as e:
+            self._failed(self.model, e)
+            raise
+        remaining = max(0.001, timeout - (time.monotonic() - started))
+        start = time.perf_counter()
+        try:
+            response = self.fn(model, remaining)
+        except Exception as e:
+            self.router.release(model, time.perf_counter() - start, e)
+            self._failed(model, e)
+            raise
+        self.router.release(model, time.perf_counter() - start)
+        return response
+
+
+class AsyncRoutedCall(RoutedCall):
+    async def __call__(self, timeout: float):
+        started = time.monotonic()
+        try:
+            model = self.model = await self.router.acquire_async(self.model, timeout)
+        except ModelBusy as e:
+            self._failed(self.model, e)
+            raise
+        remaining = max(0.001, timeout - (time.monotonic() - started))
+        start = time.perf_counter()
+        try:
+            response = await self.fn(model, remaining)
+        except Exception as e:
+            self.router.release(model, time.perf_counter() - start, e)
+            self._failed(model, e)
+            raise
+        self.router.release(model, time.perf_counter() - start)
+        return response
@@ -0,0 +1,210 @@
+"""
+Near-duplicate detection for shift notes.
+
+Many shifts of the same recipient read almost the same (routine days with the
+same meals and medication), yet their prompts differ, so the exact-prompt
+analysis cache never matches them. This index keeps a MinHash signature of
+every analyzed shift's normalized notes, per recipient, in one NumPy array.
+A new shift whose notes are estimated to be at least NEAR_DUPLICATE_THRESHOLD
+similar (Jaccard similarity of word shingles) to an analyzed one of the same
+recipient, with an unchanged profile, reuses that analysis instead of calling
+the model. Each row keeps the shift context (date, shift number) its analysis
+was written for, so the caller can re-stamp the reused text.
+
+NEAR_DUPLICATE_BACKEND: 'memory' (default) or 'none'
+NEAR_DUPLICATE_THRESHOLD: estimated similarity needed for reuse (default 0.95)
+NEAR_DUPLICATE_PERMUTATIONS: MinHash signature length (default 128)
+NEAR_DUPLICATE_MAX_PER_RECIPIENT: analyzed shifts kept per recipient (default 64)
+NEAR_DUPLICATE_MAX_RECIPIENTS: recipients kept per process (default 1024)
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+import numpy as np
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.95))
+NEAR_DUPLICATE_PERMUTATIONS = int(os.getenv('NEAR_DUPLICATE_PERMUTATIONS', 128))
+NEAR_DUPLICATE_MAX_PER_RECIPIENT = int(os.getenv('NEAR_DUPLICATE_MAX_PER_RECIPIENT', 64))
+NEAR_DUPLICATE_MAX_RECIPIENTS = int(os.getenv('NEAR_DUPLICATE_MAX_RECIPIENTS', 1024))
+
+# Shingles are runs of this many words
+SHINGLE_WORDS = 3
+
+# Smallest prime above 2**32; permutations are (a * hash + b) mod this prime
+_PRIME = np.uint64((1 << 32) + 15)
+
+# Case, punctuation and spacing do not change what a note says. Numbers are
+# kept as they are, since "2 tablets" and "4 tablets" must not match.
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def shingles(text: str) -> Set[str]:
+    """Word shingles of the normalized text (the whole text if it is shorter than one shingle)"""
+    words = normalize(text).split()
+    if len(words) <= SHINGLE_WORDS:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class MinHasher:
+    """MinHash signatures; the fraction of equal positions estimates Jaccard similarity"""
+
+    def __init__(self, num_perm: int = NEAR_DUPLICATE_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # Below 2**31 so a * hash + b stays within uint64 for 32-bit hashes
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint32 signature of the text, or None if it has no words"""
+        tokens = shingles(text)
+        if not tokens:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=4).digest(), 'little') for t in tokens),
+            dtype=np.uint64, count=len(tokens)
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class SimilarityProbe:
+    """One shift's notes as seen by the index: recipient, profile version, signature and shift context"""
+
+    __slots__ = ('recipient_id', 'version', 'context', 'signature')
+
+    def __init__(self, recipient_id: Hashable, version: Hashable, signature: np.ndarray, context: Hashable = None):
+        self.recipient_id = recipient_id
+        self.version = version
+        self.context = context
+        self.signature = signature
+
+
+class _RecipientIndex:
+    """Signatures (one row per analyzed shift) and their analyses for one profile version"""
+
+    def __init__(self, version: Hashable, num_perm: int):
+        self.version = version
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.contexts = []
+        self.analyses = []
+
+    def best_match(self, signature: np.ndarray) -> Tuple[int, float]:
+        if not self.analyses:
+            return -1, 0.0
+        similarity = (self.signatures == signature).mean(axis=1)
+        row = int(similarity.argmax())
+        return row, float(similarity[row])
+
+
+class NearDuplicateIndex:
+    """
+    Per-recipient MinHash index of analyzed shift notes.
+
+    Each recipient holds the analyses of its last `max_per_recipient` distinct
+    shifts for a single profile version; when the profile changes its entries
+    are dropped, so an analysis is never reused across profile edits.
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        num_perm: int = NEAR_DUPLICATE_PERMUTATIONS,
+        max_per_recipient: int = NEAR_DUPLICATE_MAX_PER_RECIPIENT,
+        max_recipients: int = NEAR_DUPLICATE_MAX_RECIPIENTS
+    ):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.max_per_recipient = max_per_recipient
+        self.max_recipients = max_recipients
+        self._recipients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(
+        self, recipient_id: Hashable, version: Hashable, text: str, context: Hashable = None
+    ) -> Optional[SimilarityProbe]:
+        """Signature of a shift's notes, or None if there is nothing to compare"""
+        if recipient_id is None:
+            return None
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        return SimilarityProbe(recipient_id, version, signature, context)
+
+    def find(self, probe: SimilarityProbe) -> Optional[Tuple[Dict, float, Hashable]]:
+        """
+        (analysis, estimated similarity, shift context it was written for) of
+        the most similar indexed shift above the threshold
+        """
+        with self._lock:
+            index = self._recipients.get(probe.recipient_id)
+            if index is not None and index.version == probe.version:
+                row, similarity = index.best_match(probe.signature)
+                if row >= 0 and similarity >= self.threshold:
+                    self._recipients.move_to_end(probe.recipient_id)
+                    self.hits += 1
+                    return index.analyses[row], similarity, index.contexts[row]
+            self.misses += 1
+            return None
+
+    def add(self, probe: SimilarityProbe, analysis: Dict):
+        with self._lock:
+            index = self._recipients.get(probe.recipient_id)
+            if index is None or index.version != probe.version:
+                index = self._recipients[probe.recipient_id] = _RecipientIndex(probe.version, self.hasher.num_perm)
+            self._recipients.move_to_end(probe.recipient_id)
+            row, similarity = index.best_match(probe.signature)
+            if similarity == 1.0:
+                # Same notes as an indexed shift; keep the newer analysis
+                index.analyses[row] = analysis
+                index.contexts[row] = probe.context
+                return
+            index.signatures = np.vstack([index.signatures, probe.signature])[-self.max_per_recipient:]
+            index.contexts = (index.contexts + [probe.context])[-self.max_per_recipient:]
+            index.analyses = (index.analyses + [analysis])[-self.max_per_recipient:]
+            while len(self._recipients) > self.max_recipients:
+                self._recipients.popitem(last=False)
+
+    def invalidate(self, recipient_id=None):
+        """Drop one recipient, or every recipient"""
+        with self._lock:
+            if recipient_id is None:
+                self._recipients.clear()
+            else:
+                self._recipients.pop(recipient_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'recipients': len(self._recipients),
+                'shifts': sum(len(index.analyses) for index in self._recipients.values()),
+                'signature_bytes': sum(index.signatures.nbytes for index in self._recipients.values())
+            }
+
+
+def create_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """
+    Build the index selected by NEAR_DUPLICATE_BACKEND: 'memory' (default) or
+    'none'. Returns None when disabled.
+    """
+    backend_name = os.getenv('NEAR_DUPLICATE_BACKEND', 'memory').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'memory':
+        return NearDuplicateIndex()
+    raise ValueError(f"Unknown NEAR_DUPLICATE_BACKEND '{backend_name}', expected memory or none")
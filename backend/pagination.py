@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import json
+import os
+import re
+from urllib.parse import urlencode
+from typing import Dict, List, Optional
+from flask import request, Response
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+
+_COLUMN_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class PaginationError(ValueError):
+    """Raised for malformed limit, cursor or fields query parameters"""
+
+
+def parse_limit() -> int:
+    """Page size from ?limit=, clamped to MAX_PAGE_SIZE"""
+    raw = request.args.get('limit')
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be at least 1')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(key_columns: List[str]) -> str:
+    """
+    Turn ?fields=a,b,c into a projected select string.
+    The keyset columns are always included so the next cursor can be built.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return '*'
+
+    columns = []
+    for column in raw.split(','):
+        column = column.strip()
+        if not column:
+            continue
+        if not _COLUMN_NAME.match(column):
+            raise PaginationError(f"Invalid field name '{column}'")
+        if column not in columns:
+            columns.append(column)
+
+    for column in key_columns:
+        if column not in columns:
+            columns.append(column)
+    return ','.join(columns)
+
+
+def encode_cursor(row: Dict, key_columns: List[str]) -> str:
+    """Opaque cursor pointing just after `row` in keyset order"""
+    payload = json.dumps([row.get(column) for column in key_columns], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], key_columns: List[str]) -> Optional[List]:
+    """Inverse of encode_cursor; returns None when no cursor was given"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeDecodeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        raise PaginationError('Invalid cursor')
+    # Cursor values end up inside PostgREST filter strings, so refuse anything
+    # that could change the filter's meaning. null stands for a NULL key column;
+    # the route has to filter for it with is.null.
+    for value in values:
+        if value is None:
+            continue
+        if not isinstance(value, (str, int, float)) or any(c in str(value) for c in ',()"'):
+            raise PaginationError('Invalid cursor')
+    return values
+
+
+def page_response(rows: List[Dict], limit: int, key_columns: List[str]) -> Response:
+    """
+    Build a JSON array response for one page.
+
+    `rows` is the result of a query with limit + 1, so an extra row means there
+    is a next page; its cursor goes in the X-Next-Cursor header (and a Link
+    header). The body is serialized once and hashed into an ETag, so a client
+    sending a matching If-None-Match gets an empty 304.
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], key_columns)
+
+    body = json.dumps(rows, separators=(',', ':'), default=str)
+    response = Response(body, mimetype='application/json')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(next_args)}>; rel="next"'
+
+    response.set_etag(hashlib.sha256(body.encode('utf-8')).hexdigest()[:32])
+    # Clients may keep the page but must revalidate it with If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
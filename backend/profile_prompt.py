@@ -0,0 +1,154 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+PROFILE_PROMPT_CACHE_SIZE = int(os.getenv('PROFILE_PROMPT_CACHE_SIZE', 1024))
+
+# Order and labels of the CARE RECIPIENT PROFILE section. A field is listed
+# only when it is set; the routine times share a single "Daily Routine" line.
+DAILY_ROUTINE = (
+    ('wake_up', 'Wake up'),
+    ('breakfast', 'Breakfast'),
+    ('lunch', 'Lunch'),
+    ('dinner', 'Dinner'),
+    ('bedtime', 'Bedtime'),
+)
+
+PROFILE_FIELDS = (
+    # Basic info
+    ('preferred_form_of_address', 'Preferred Form of Address'),
+    ('age', 'Age'),
+    ('birthday', 'Birthday'),
+    ('daily_routine', DAILY_ROUTINE),
+    # Communication preferences
+    ('speech_pace', 'Speech Pace Preference'),
+    ('hearing_status', 'Hearing Status'),
+    ('visual_cues', 'Visual Cues'),
+    ('instructions', 'Instructions Preference'),
+    # Food and medication
+    ('food_preferences', 'Food Preferences'),
+    ('medication_preferences', 'Medication Preferences'),
+    # Support needs
+    ('mobility_support', 'Mobility Support'),
+    ('hearing_vision_support', 'Hearing/Vision Support'),
+    ('memory_reminders', 'Memory Reminders'),
+    # Safety information
+    ('fall_risk', 'Fall Risk'),
+    ('allergies', 'ALLERGIES'),
+    ('medical_conditions', 'Medical Conditions'),
+    # Personal interests
+    ('hobbies', 'Hobbies'),
+    ('favourite_topics', 'Favorite Topics'),
+    # Boundaries and preferences
+    ('privacy_boundaries', 'Privacy Boundaries'),
+    ('sensitive_topics', 'Sensitive Topics to Avoid'),
+    ('independence_preferences', 'Independence Preferences'),
+    ('physical_comfort', 'Physical Comfort Preferences'),
+)
+
+PROFILE_HEADER = "\nCARE RECIPIENT PROFILE:\n"
+
+
+def _compile(fields):
+    """
+    Flatten the field table into (key, prefix, group) steps with the line
+    prefixes pre-built, so rendering is a single pass of lookups and joins.
+    """
+    steps = []
+    for key, label in fields:
+        if isinstance(label, tuple):
+            steps.append((None, '- Daily Routine: ', tuple((k, f"{l}: ") for k, l in label)))
+        else:
+            steps.append((key, f"- {label}: ", None))
+    return tuple(steps)
+
+
+_STEPS = _compile(PROFILE_FIELDS)
+
+# Every profile column the section reads; a change to any of them re-renders it
+PROFILE_KEYS = tuple(
+    k for key, label in PROFILE_FIELDS
+    for k in ([key] if not isinstance(label, tuple) else [k for k, _ in label])
+)
+
+
+def render_profile_section(care_recipient_profile: Dict) -> str:
+    """CARE RECIPIENT PROFILE block of the analysis prompt ('' without a profile)"""
+    if not care_recipient_profile:
+        return ""
+
+    get = care_recipient_profile.get
+    parts = [PROFILE_HEADER]
+    for key, prefix, group in _STEPS:
+        if group is None:
+            value = get(key)
+            if value:
+                parts.append(f"{prefix}{value}\n")
+        else:
+            times = [f"{time_prefix}{get(k)}" for k, time_prefix in group if get(k)]
+            if times:
+                parts.append(f"{prefix}{', '.join(times)}\n")
+    return ''.join(parts)
+
+
+class ProfilePromptCache:
+    """
+    Rendered profile sections memoized per care recipient.
+
+    An entry is keyed by the recipient id and remembers the profile values it
+    was rendered from. When any of them differ (the profile was edited) the
+    section is rendered again and replaces the old entry, so a stale profile is
+    never served and each recipient holds at most one entry.
+    """
+
+    def __init__(self, max_entries: int = PROFILE_PROMPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, care_recipient_profile: Optional[Dict]) -> str:
+        if not care_recipient_profile or self.max_entries <= 0:
+            return render_profile_section(care_recipient_profile)
+        recipient_id = care_recipient_profile.get('id')
+        if recipient_id is None:
+            return render_profile_section(care_recipient_profile)
+
+        get = care_recipient_profile.get
+        version = tuple(get(k) for k in PROFILE_KEYS)
+
+        with self._lock:
+            entry = self._entries.get(recipient_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(recipient_id)
+                self.hits += 1
+                return entry[1]
+
+        text = render_profile_section(care_recipient_profile)
+        with self._lock:
+            self.misses += 1
+            self._entries[recipient_id] = (version, text)
+            self._entries.move_to_end(recipient_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def invalidate(self, recipient_id=None):
+        """Drop one recipient's section, or every section"""
+        with self._lock:
+            if recipient_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(recipient_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'entries': len(self._entries)
+            }
@@ -0,0 +1,51 @@
+import os
+from typing import List
+
+# Upper bound on the estimated size of an analysis prompt (0 disables the budget)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 6000))
+
+# Gemini's tokenizer averages about 4 characters per token on English text
+CHARS_PER_TOKEN = 4
+
+# Profile fields removed first, in this order, when a prompt is over budget.
+# Anything not listed (allergies, fall_risk, medical_conditions, medication,
+# mobility, routine, boundaries, ...) is never dropped.
+LOW_PRIORITY_PROFILE_FIELDS = (
+    'hobbies',
+    'favourite_topics',
+    'physical_comfort',
+    'independence_preferences',
+    'visual_cues',
+    'birthday',
+    'food_preferences',
+    'speech_pace',
+    'instructions',
+)
+
+TRUNCATION_MARKER = ' [... {} characters omitted ...] '
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate, so budgeting needs no count_tokens round trip"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """
+    Shorten text to about max_chars, keeping its beginning and end. Notes
+    usually open with the situation and close with the latest observations.
+    """
+    if len(text) <= max_chars:
+        return text
+    keep = max(0, max_chars - len(TRUNCATION_MARKER) - 8)
+    head, tail = keep - keep // 2, keep // 2
+    return text[:head] + TRUNCATION_MARKER.format(len(text) - head - tail) + (text[len(text) - tail:] if tail else '')
+
+
+def drop_oldest_lines(text: str, excess_chars: int) -> str:
+    """Remove whole lines from the start of a digest until excess_chars are gone"""
+    lines: List[str] = text.split('\n')
+    removed = 0
+    while lines and removed < excess_chars:
+        removed += len(lines.pop(0)) + 1
+    return '\n'.join(lines)
@@ -0,0 +1,174 @@
+import asyncio
+import copy
+import fcntl
+import hashlib
+import os
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+LOCK_STRIPES = 256
+
+
+class _Call:
+    """One in-flight call that followers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and receive a copy of the same result, or
+    the same exception. Within a process this covers threads (do) and
+    coroutines (do_async).
+
+    When lock_dir is set, leaders in different worker processes also take an
+    exclusive file lock for the key. A leader that had to wait for the lock
+    calls `recheck` first, so if another worker already stored the result in a
+    shared store (such as the SQLite analysis cache) it is reused instead of
+    making a second model call.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None):
+        self.lock_dir = lock_dir
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_across_workers = 0
+
+    def do(self, key: str, fn: Callable[[], object], recheck: Callable[[], object] = None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = self._run_locked(key, fn, recheck)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[object]],
+        recheck: Callable[[], object] = None
+    ):
+        future = self._async_calls.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            # shield() so a cancelled follower does not cancel the leader's call
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        with self._lock:
+            self.leaders += 1
+
+        try:
+            if self.lock_dir:
+                lock_file, waited = await asyncio.to_thread(self._acquire_file_lock, key)
+                try:
+                    result = await self._recheck_or_run_async(waited, fn, recheck)
+                finally:
+                    self._release_file_lock(lock_file)
+            else:
+                result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+
+    def _run_locked(self, key: str, fn: Callable[[], object], recheck: Callable[[], object]):
+        if not self.lock_dir:
+            return fn()
+
+        lock_file, waited = self._acquire_file_lock(key)
+        try:
+            if waited and recheck:
+                shared = recheck()
+                if shared is not None:
+                    with self._lock:
+                        self.shared_across_workers += 1
+                    return shared
+            return fn()
+        finally:
+            self._release_file_lock(lock_file)
+
+    async def _recheck_or_run_async(self, waited, fn, recheck):
+        if waited and recheck:
+            shared = recheck()
+            if shared is not None:
+                with self._lock:
+                    self.shared_across_workers += 1
+                return shared
+        return await fn()
+
+    def _acquire_file_lock(self, key: str):
+        """
+        Lock one of LOCK_STRIPES files chosen by the key, so the number of lock
+        files stays fixed. Returns (file, waited).
+        """
+        stripe = int(hashlib.sha256(key.encode('utf-8')).hexdigest(), 16) % LOCK_STRIPES
+        lock_file = open(os.path.join(self.lock_dir, f'flight-{stripe}.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file, False
+        except BlockingIOError:
+            # Another worker is already running this call, wait for it to finish
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            return lock_file, True
+
+    def _release_file_lock(self, lock_file):
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'shared_across_workers': self.shared_across_workers,
+                'cross_worker': bool(self.lock_dir),
+                'in_flight': len(self._calls) + len(self._async_calls)
+            }
+
+
+def create_single_flight() -> SingleFlight:
+    """
+    SINGLE_FLIGHT_LOCK_DIR: directory for cross-worker lock files.
+    Unset means calls are only deduplicated within each worker process.
+    """
+    return SingleFlight(lock_dir=os.getenv('SINGLE_FLIGHT_LOCK_DIR') or None)
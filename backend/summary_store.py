@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class SummaryStore:
+    """
+    Durable store of generated summaries in a local SQLite file.
+
+    Per-shift summaries are keyed by shift id and a hash of the notes they
+    summarize, so an edited shift is summarized again. Weekly digests are
+    keyed by care recipient and ISO week, and checked against a hash of the
+    summaries they condense in the same way.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS shift_summaries ('
+                'shift_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, '
+                'summary TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS weekly_digests ('
+                'care_recipient_id TEXT NOT NULL, week TEXT NOT NULL, content_hash TEXT NOT NULL, '
+                'digest TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (care_recipient_id, week))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS checkpoints ('
+                'name TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get_shift_summary(self, shift_id: str, content: str) -> Optional[str]:
+        row = self._connect().execute(
+            'SELECT summary FROM shift_summaries WHERE shift_id = ? AND content_hash = ?',
+            (shift_id, content_hash(content))
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_shift_summary(self, shift_id: str, content: str, summary: str):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO shift_summaries (shift_id, content_hash, summary, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                (shift_id, content_hash(content), summary, time.time())
+            )
+
+    def get_content_hashes(self, shift_ids: Iterable[str]) -> Dict[str, str]:
+        """Content hash of the stored summary of each shift that has one"""
+        shift_ids = list(shift_ids)
+        hashes = {}
+        # Stay below SQLite's default limit on bound parameters
+        for start in range(0, len(shift_ids), 500):
+            chunk = shift_ids[start:start + 500]
+            rows = self._connect().execute(
+                f'SELECT shift_id, content_hash FROM shift_summaries WHERE shift_id IN ({",".join("?" * len(chunk))})',
+                chunk
+            ).fetchall()
+            hashes.update(rows)
+        return hashes
+
+    def set_shift_summaries(self, entries: List[Tuple[str, str, str]]):
+        """Bulk set_shift_summary of (shift_id, content, summary) in one transaction"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO shift_summaries (shift_id, content_hash, summary, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                [(shift_id, content_hash(content), summary, now) for shift_id, content, summary in entries]
+            )
+
+    def get_checkpoint(self, name: str):
+        row = self._connect().execute('SELECT value FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_checkpoint(self, name: str, value):
+        """Remember a JSON-serializable position of a scheduled job; None clears it"""
+        with self._connect() as conn:
+            if value is None:
+                conn.execute('DELETE FROM checkpoints WHERE name = ?', (name,))
+            else:
+                conn.execute(
+                    'INSERT OR REPLACE INTO checkpoints (name, value, updated_at) VALUES (?, ?, ?)',
+                    (name, json.dumps(value), time.time())
+                )
+
+    def get_weekly_digest(self, care_recipient_id: str, week: str, content: str) -> Optional[str]:
+        row = self._connect().execute(
+            'SELECT digest FROM weekly_digests WHERE care_recipient_id = ? AND week = ? AND content_hash = ?',
+            (str(care_recipient_id), week, content_hash(content))
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_weekly_digest(self, care_recipient_id: str, week: str, content: str, digest: str):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO weekly_digests (care_recipient_id, week, content_hash, digest, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (str(care_recipient_id), week, content_hash(content), digest, time.time())
+            )
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        return {
+            'shift_summaries': conn.execute('SELECT COUNT(*) FROM shift_summaries').fetchone()[0],
+            'digests': conn.execute('SELECT COUNT(*) FROM weekly_digests').fetchone()[0]
+        }
+
+
+def create_summary_store() -> Optional[SummaryStore]:
+    """
+    SUMMARY_STORE_BACKEND: 'sqlite' (default) or 'none'
+    SUMMARY_STORE_PATH: SQLite file (default summaries.db)
+    """
+    backend_name = os.getenv('SUMMARY_STORE_BACKEND', 'sqlite').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'sqlite':
+        return SummaryStore(os.getenv('SUMMARY_STORE_PATH', 'summaries.db'))
+    raise ValueError(f"Unknown SUMMARY_STORE_BACKEND '{backend_name}', expected sqlite or none")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are imported flat (import admission, import jobs, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import (
+    ADMITTED, QUEUED, FULL, PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE,
+    AdmissionController, AdmissionRejected, Admitter, MemoryAdmissionStore, SQLiteAdmissionStore, Ticket,
+    client_address, _parse_networks
+)
+from benchmarks.fakes import FakeGenaiClient
+from gemini_service import GeminiService
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryAdmissionStore()
+    return SQLiteAdmissionStore(str(tmp_path / 'admission.db'))
+
+
+# ============= TOKEN BUCKETS =============
+
+def test_bucket_allows_burst_then_reports_wait(store):
+    buckets = [('client:a', 0.5, 2)]
+    assert store.take(buckets, now=100.0) == (0, None)
+    assert store.take(buckets, now=100.0) == (0, None)
+    wait, limited = store.take(buckets, now=100.0)
+    assert limited == 'client:a'
+    assert wait == pytest.approx(2.0)
+
+
+def test_bucket_refills_at_rate(store):
+    buckets = [('client:a', 0.5, 2)]
+    store.take(buckets, now=100.0)
+    store.take(buckets, now=100.0)
+    # Half a token after one second, one full token after two
+    assert store.take(buckets, now=101.0)[0] == pytest.approx(1.0)
+    assert store.take(buckets, now=102.0) == (0, None)
+    assert store.take(buckets, now=102.0)[0] == pytest.approx(2.0)
+
+
+def test_bucket_refill_is_capped_at_burst(store):
+    buckets = [('client:a', 1.0, 2)]
+    store.take(buckets, now=100.0)
+    for _ in range(2):
+        assert store.take(buckets, now=1000.0) == (0, None)
+    assert store.take(buckets, now=1000.0)[0] > 0
+
+
+def test_take_is_all_or_nothing(store):
+    client = ('client:a', 1.0, 5)
+    recipient = ('recipient:r', 1.0, 1)
+    assert store.take([client, recipient], now=100.0) == (0, None)
+    wait, limited = store.take([client, recipient], now=100.0)
+    assert limited == 'recipient:r' and wait == pytest.approx(1.0)
+    # The client bucket was not charged for the rejected request
+    for _ in range(4):
+        assert store.take([client], now=100.0) == (0, None)
+    assert store.take([client], now=100.0)[1] == 'client:a'
+
+
+def test_check_rate_rejects_with_429_and_retry_after(store):
+    controller = AdmissionController(store, client_rate=1, client_burst=1, recipient_rate=0)
+    controller.check_rate('a')
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check_rate('a')
+    assert rejected.value.status == 429
+    assert 0 < rejected.value.retry_after <= 1
+    controller.check_rate('b')
+
+
+# ============= PRIORITY QUEUE =============
+
+def _enter(store, priority, enqueued_at, max_in_flight=1, max_waiting=10):
+    ticket = Ticket(priority, timeout=60)
+    ticket.enqueued_at = enqueued_at
+    ticket.deadline = enqueued_at + 60
+    return ticket, store.enter(ticket, max_in_flight, max_waiting, lease_until=enqueued_at + 300)
+
+
+def test_higher_priority_leaves_queue_first(store):
+    now = time.time()
+    holder, state = _enter(store, PRIORITY_INTERACTIVE, now)
+    assert state == ADMITTED
+    background, state = _enter(store, PRIORITY_BACKGROUND, now + 0.001)
+    assert state == QUEUED
+    batch, _ = _enter(store, PRIORITY_BATCH, now + 0.002)
+    interactive, _ = _enter(store, PRIORITY_INTERACTIVE, now + 0.003)
+
+    store.release(holder)
+    lease_until = now + 300
+    assert not store.try_admit(background, 1, lease_until)
+    assert not store.try_admit(batch, 1, lease_until)
+    assert store.try_admit(interactive, 1, lease_until)
+
+    store.release(interactive)
+    assert not store.try_admit(background, 1, lease_until)
+    assert store.try_admit(batch, 1, lease_until)
+
+    store.release(batch)
+    assert store.try_admit(background, 1, lease_until)
+    assert store.counts() == (1, 0)
+
+
+def test_same_priority_is_first_come_first_served(store):
+    now = time.time()
+    holder, _ = _enter(store, PRIORITY_INTERACTIVE, now)
+    first, _ = _enter(store, PRIORITY_BATCH, now + 0.001)
+    second, _ = _enter(store, PRIORITY_BATCH, now + 0.002)
+    store.release(holder)
+    assert not store.try_admit(second, 1, now + 300)
+    assert store.try_admit(first, 1, now + 300)
+
+
+def test_full_queue_is_rejected(store):
+    now = time.time()
+    _enter(store, PRIORITY_INTERACTIVE, now, max_waiting=1)
+    assert _enter(store, PRIORITY_INTERACTIVE, now + 0.001, max_waiting=1)[1] == QUEUED
+    assert _enter(store, PRIORITY_INTERACTIVE, now + 0.002, max_waiting=1)[1] == FULL
+
+
+# ============= ADMITTER AND CLIENT ADDRESS =============
+
+def test_admitter_charges_rate_limits_once():
+    controller = AdmissionController(MemoryAdmissionStore(), client_rate=0.001, client_burst=1, recipient_rate=0)
+    admitter = Admitter(controller, 'a')
+    for _ in range(3):
+        admitter.charge()
+        with admitter.slot():
+            pass
+    with pytest.raises(AdmissionRejected):
+        Admitter(controller, 'a').charge()
+    # The slot alone is not rate limited
+    with Admitter(controller, 'a').slot():
+        pass
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_failed_charge_is_repeated_to_later_calls():
+    controller = AdmissionController(MemoryAdmissionStore(), client_rate=0.001, client_burst=1, recipient_rate=0)
+    controller.check_rate('a')
+    admitter = Admitter(controller, 'a')
+    for _ in range(2):
+        with pytest.raises(AdmissionRejected):
+            admitter.charge()
+    assert admitter.rejection.status == 429
+    assert controller.stats()['rate_limited'] == 1
+
+
+def test_async_slot_waits_for_a_free_slot(store):
+    controller = AdmissionController(store, max_in_flight=1, queue_timeout=2, poll_interval=0.005)
+
+    async def run():
+        first = await controller.acquire_async()
+        waiter = asyncio.create_task(controller.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        controller.release(first)
+        controller.release(await waiter)
+        async with Admitter(controller, 'a').slot_async():
+            assert controller.stats()['in_flight'] == 1
+
+    asyncio.run(run())
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_rate_limited_caller_does_not_fail_a_shared_call():
+    controller = AdmissionController(MemoryAdmissionStore(), client_rate=0.001, client_burst=1, recipient_rate=0)
+    Admitter(controller, 'limited').charge()
+    service = GeminiService(client=FakeGenaiClient(latency=0.2))
+    notes = [{'content': 'Ate lunch and took medication', 'caregiver_name': 'A', 'timestamp': '12:00'}]
+    results = {}
+
+    def analyze(client_id):
+        try:
+            results[client_id] = service.analyze_shift_notes(notes, admit=Admitter(controller, client_id))
+        except AdmissionRejected as e:
+            results[client_id] = e
+
+    threads = [threading.Thread(target=analyze, args=(client_id,)) for client_id in ('ok', 'limited')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert isinstance(results['limited'], AdmissionRejected) and results['limited'].status == 429
+    assert results['ok']['summary']
+    assert service.client.models.calls == 1
+
+
+def test_client_address_ignores_forwarded_for_from_untrusted_peers():
+    assert client_address('1.2.3.4', '6.6.6.6', trusted_proxies=()) == '1.2.3.4'
+    assert client_address(None, None, trusted_proxies=()) == 'unknown'
+
+
+def test_client_address_skips_trusted_hops():
+    proxies = _parse_networks('10.0.0.0/8')
+    assert client_address('10.0.0.1', 'spoofed, 7.7.7.7, 10.2.2.2', proxies) == '7.7.7.7'
@@ -0,0 +1,189 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from clients import DeadlineExceeded, ModelBusy, RetryBudget, RetryPolicy, _install_pooled_session
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+def failing(errors):
+    """fn for RetryPolicy.call that raises each of `errors` in turn, then returns 'ok'"""
+    errors = list(errors)
+
+    def fn(timeout):
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+    return fn
+
+
+# ============= RETRY BUDGET =============
+
+def test_budget_denies_once_tokens_run_out(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    # Two first attempts pay for one more retry
+    budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+
+
+def test_budget_refills_over_time_up_to_max(clock):
+    budget = RetryBudget(ratio=0, min_per_second=1, max_tokens=2)
+    budget.try_spend()
+    budget.try_spend()
+    assert not budget.try_spend()
+    clock.now += 1
+    assert budget.try_spend()
+    clock.now += 60
+    assert budget.available() == 2
+
+
+# ============= RETRY POLICY =============
+
+def test_retries_retryable_errors_until_success():
+    policy = RetryPolicy(max_attempts=3, backoff_base=0, budget=RetryBudget())
+    assert policy.call(failing([ModelBusy(), ModelBusy()])) == 'ok'
+    stats = policy.stats()
+    assert (stats['attempts'], stats['retries'], stats['failures']) == (3, 2, 0)
+
+
+def test_non_retryable_error_is_raised_at_once():
+    policy = RetryPolicy(max_attempts=3, backoff_base=0, budget=RetryBudget())
+    with pytest.raises(ValueError):
+        policy.call(failing([ValueError('bad request')]))
+    assert policy.stats()['attempts'] == 1
+
+
+def test_gives_up_after_max_attempts():
+    policy = RetryPolicy(max_attempts=2, backoff_base=0, budget=RetryBudget())
+    with pytest.raises(ModelBusy):
+        policy.call(failing([ModelBusy()] * 3))
+    stats = policy.stats()
+    assert (stats['attempts'], stats['failures']) == (2, 1)
+
+
+def test_retry_denied_by_budget():
+    policy = RetryPolicy(max_attempts=5, backoff_base=0, budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=1))
+    with pytest.raises(ModelBusy):
+        policy.call(failing([ModelBusy()] * 5))
+    stats = policy.stats()
+    assert (stats['attempts'], stats['retries'], stats['retries_denied_by_budget']) == (2, 1, 1)
+
+
+def test_attempt_timeout_never_exceeds_time_left(clock):
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        clock.now += 4
+        if len(calls) < 3:
+            raise ModelBusy()
+        return 'ok'
+
+    policy = RetryPolicy(max_attempts=5, attempt_timeout=5, deadline=10, backoff_base=0, budget=RetryBudget())
+    assert policy.call(fn) == 'ok'
+    assert calls == [5, 5, 2]
+
+
+def test_no_retry_once_the_backoff_would_pass_the_deadline(clock):
+    def fn(timeout):
+        clock.now += 9
+        raise ModelBusy()
+
+    # The backoff is at least 1s here, and only 1s is left after the first attempt
+    policy = RetryPolicy(max_attempts=5, deadline=10, backoff_base=1, budget=RetryBudget())
+    policy._backoff = lambda attempt: 1.0
+    with pytest.raises(ModelBusy):
+        policy.call(fn)
+    stats = policy.stats()
+    assert (stats['attempts'], stats['retries'], stats['deadline_exceeded']) == (1, 0, 1)
+
+
+def test_deadline_exceeded_before_an_attempt():
+    policy = RetryPolicy(deadline=0, budget=RetryBudget())
+    with pytest.raises(DeadlineExceeded):
+        policy.call(failing([]))
+    stats = policy.stats()
+    assert (stats['attempts'], stats['deadline_exceeded']) == (0, 1)
+
+
+def test_call_async_retries_and_honours_budget():
+    policy = RetryPolicy(max_attempts=5, backoff_base=0, budget=RetryBudget(ratio=0, min_per_second=0, max_tokens=1))
+    errors = [ModelBusy()] * 5
+
+    async def fn(timeout):
+        raise errors.pop(0)
+
+    with pytest.raises(ModelBusy):
+        asyncio.run(policy.call_async(fn))
+    assert policy.stats()['retries_denied_by_budget'] == 1
+
+    policy = RetryPolicy(max_attempts=3, backoff_base=0, budget=RetryBudget())
+    sync_fn = failing([ModelBusy()])
+
+    async def succeeds_second_time(timeout):
+        return sync_fn(timeout)
+
+    assert asyncio.run(policy.call_async(succeeds_second_time)) == 'ok'
+
+
+# ============= POOLED GEMINI SESSION =============
+
+GENERATE_RESPONSE = b'{"candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}}]}'
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """Session that sent each HTTP request, with a canned generate_content answer"""
+    sessions = []
+
+    def fake_request(self, method, url, **kwargs):
+        sessions.append(self)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = GENERATE_RESPONSE
+        return response
+
+    monkeypatch.setattr(requests.Session, 'request', fake_request)
+    return sessions
+
+
+def test_pinned_sdk_still_has_the_patched_method():
+    # Fails when a google-genai upgrade renames or removes the private method
+    from google import genai
+    client = genai.Client(api_key='test-key')
+    assert callable(getattr(client._api_client, '_request_unauthorized', None))
+
+
+def test_gemini_requests_share_one_pooled_session(sessions):
+    from google import genai
+    client = genai.Client(api_key='test-key')
+    assert _install_pooled_session(client, pool_size=4)
+
+    for _ in range(2):
+        assert client.models.generate_content(model='gemini-test', contents='hi').text == 'ok'
+    assert len(sessions) == 2
+    assert sessions[0] is sessions[1]
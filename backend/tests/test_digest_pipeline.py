@@ -0,0 +1,73 @@
+import pytest
+
+import app as backend
+from benchmarks.fakes import FakeGenaiClient, FakeSupabase, seed_tables
+from digest_pipeline import CHECKPOINT_NAME, DigestPipeline
+from gemini_service import GeminiService
+from summary_store import SummaryStore
+
+
+@pytest.fixture
+def tables(monkeypatch, tmp_path):
+    tables = seed_tables(recipients=2, shifts_per_recipient=4)
+    # Rows written before the changed column existed have no value in it
+    for shift in tables['shifts'][:3]:
+        shift['updated_at'] = None
+    monkeypatch.setattr(backend, 'supabase', FakeSupabase(tables, latency=0))
+    monkeypatch.setattr(backend, 'gemini_service', GeminiService(client=FakeGenaiClient(latency=0)))
+    monkeypatch.setattr(backend, 'summary_store', SummaryStore(str(tmp_path / 'summaries.db')))
+    return tables
+
+
+def model_calls():
+    return backend.gemini_service.client.models.calls
+
+
+class StopAfterPages(DigestPipeline):
+    """A run that is stopped (e.g. by SIGTERM) once `pages` pages are done"""
+
+    def __init__(self, pages, **kwargs):
+        super().__init__(**kwargs)
+        self.pages = pages
+
+    def _process_page(self, shifts):
+        result = super()._process_page(shifts)
+        self.stopping = self.stats['pages'] >= self.pages
+        return result
+
+
+def test_restarted_run_resumes_after_the_checkpoint(tables):
+    first = StopAfterPages(1, page_size=2)
+    assert first.run()
+    assert first.stats['summarized'] == 2
+    # The first page holds NULL-keyed shifts, so the checkpoint has a NULL value
+    checkpoint = backend.summary_store.get_checkpoint(CHECKPOINT_NAME)
+    assert checkpoint[0] is None
+
+    second = DigestPipeline(page_size=2)
+    assert second.run()
+    assert second.stats['summarized'] == len(tables['shifts']) - 2
+    # Every shift was summarized exactly once across the two runs
+    assert model_calls() == len(tables['shifts'])
+    for shift in tables['shifts']:
+        assert backend.summary_store.get_shift_summary(shift['uuid'], shift['content'])
+
+    last = max((s for s in tables['shifts'] if s['updated_at']), key=lambda s: (s['updated_at'], s['uuid']))
+    assert backend.summary_store.get_checkpoint(CHECKPOINT_NAME) == [last['updated_at'], last['uuid']]
+
+
+def test_run_after_the_checkpoint_only_sees_new_changes(tables):
+    assert DigestPipeline(page_size=3).run()
+    calls = model_calls()
+
+    rerun = DigestPipeline(page_size=3)
+    assert rerun.run()
+    assert rerun.stats['shifts'] == 0
+
+    edited = tables['shifts'][4]
+    edited['content'] += ' Walked further today.'
+    edited['updated_at'] = '2030-01-01T00:00:00+00:00'
+    rerun = DigestPipeline(page_size=3)
+    assert rerun.run()
+    assert (rerun.stats['shifts'], rerun.stats['summarized']) == (1, 1)
+    assert model_calls() == calls + 1
@@ -0,0 +1,137 @@
+import pytest
+
+import jobs
+from benchmarks.fakes import FakeGenaiClient
+from gemini_service import GeminiService
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+
+class Clock:
+    """Stand-in for the time module in jobs.py that only moves when told to"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, 'time', clock)
+    monkeypatch.setattr(jobs, 'JOB_LEASE_SECONDS', 60)
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BASE_SECONDS', 10)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / 'jobs.db'), max_attempts=2)
+
+
+# ============= QUEUEING =============
+
+def test_enqueue_reuses_a_waiting_job(queue):
+    first = queue.enqueue('shift-1')
+    assert queue.enqueue('shift-1')['id'] == first['id']
+    assert queue.enqueue('shift-2')['id'] != first['id']
+    assert queue.stats()[QUEUED] == 2
+
+
+def test_claim_takes_higher_priority_first(queue):
+    queue.enqueue('shift-low', priority=0)
+    queue.enqueue('shift-high', priority=5)
+    assert queue.claim()['shift_id'] == 'shift-high'
+    assert queue.claim()['shift_id'] == 'shift-low'
+    assert queue.claim() is None
+
+
+def test_complete_marks_succeeded(queue):
+    job = queue.enqueue('shift-1')
+    claimed = queue.claim()
+    assert (claimed['id'], claimed['status'], claimed['attempts']) == (job['id'], RUNNING, 1)
+    queue.complete(claimed['id'])
+    assert queue.get(job['id'])['status'] == SUCCEEDED
+    assert queue.claim() is None
+
+
+# ============= LEASES =============
+
+def test_running_job_is_not_reclaimed_before_its_lease_expires(queue, clock):
+    queue.enqueue('shift-1')
+    queue.claim()
+    clock.now += 59
+    assert queue.claim() is None
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    job = queue.enqueue('shift-1')
+    queue.claim()
+    # The worker died mid-job and never called complete() or fail()
+    clock.now += 61
+    reclaimed = queue.claim()
+    assert (reclaimed['id'], reclaimed['attempts']) == (job['id'], 2)
+
+
+def test_expired_lease_after_the_last_attempt_fails_the_job(queue, clock):
+    job = queue.enqueue('shift-1')
+    queue.claim()
+    clock.now += 61
+    queue.claim()
+    clock.now += 61
+    assert queue.claim() is None
+    failed = queue.get(job['id'])
+    assert failed['status'] == FAILED
+    assert 'Lease expired' in failed['last_error']
+
+
+# ============= FAILURES =============
+
+def test_fail_requeues_with_backoff_until_attempts_run_out(queue, clock):
+    job = queue.enqueue('shift-1')
+    queue.fail(queue.claim(), 'model unavailable')
+    requeued = queue.get(job['id'])
+    assert (requeued['status'], requeued['run_after']) == (QUEUED, clock.now + 10)
+    assert queue.claim() is None
+
+    clock.now += 10
+    queue.fail(queue.claim(), 'model unavailable again')
+    failed = queue.get(job['id'])
+    assert (failed['status'], failed['attempts'], failed['last_error']) == (FAILED, 2, 'model unavailable again')
+
+
+# ============= RESULTS =============
+
+def test_result_is_only_served_for_the_same_fingerprint(queue):
+    queue.store_result('shift-1', 'fingerprint-a', {'summary': 'fine'})
+    assert queue.get_result('shift-1', 'fingerprint-a') == {'summary': 'fine'}
+    assert queue.get_result('shift-1', 'fingerprint-b') is None
+    queue.store_result('shift-1', 'fingerprint-b', {'summary': 'newer'})
+    assert queue.get_result('shift-1', 'fingerprint-a') is None
+    assert queue.stats()['precomputed_results'] == 1
+
+
+def test_fingerprint_covers_every_prompt_input():
+    service = GeminiService(client=FakeGenaiClient(latency=0))
+    notes = [{'content': 'Ate lunch', 'caregiver_name': 'A', 'timestamp': '2024-03-01'}]
+    context = {'date': '2024-03-01', 'shift_number': 1}
+    profile = {'id': 7, 'name': 'Ann', 'allergies': 'penicillin'}
+    key = service.analysis_key(notes, 'Ann', context, profile)
+
+    assert service.analysis_key(notes, 'Ann', dict(context), dict(profile)) == key
+    assert service.analysis_key([{**notes[0], 'content': 'Skipped lunch'}], 'Ann', context, profile) != key
+    assert service.analysis_key(notes, 'Ann', {**context, 'date': '2024-03-02'}, profile) != key
+    assert service.analysis_key(notes, 'Ann', {**context, 'shift_number': 2}, profile) != key
+    assert service.analysis_key(notes, 'Ann', context, {**profile, 'allergies': 'none'}) != key
+    assert GeminiService(client=FakeGenaiClient(latency=0), output_mode='text').analysis_key(
+        notes, 'Ann', context, profile
+    ) != key
+
+
+def test_fingerprint_does_not_count_as_a_routed_call():
+    service = GeminiService(client=FakeGenaiClient(latency=0))
+    notes = [{'content': 'Ate lunch', 'caregiver_name': 'A', 'timestamp': '2024-03-01'}]
+    before = service.router.stats()
+    service.analysis_key(notes, 'Ann', {'date': '2024-03-01'}, {'id': 7})
+    assert service.router.stats() == before
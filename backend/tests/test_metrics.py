@@ -0,0 +1,39 @@
+import pytest
+
+import app as backend
+import metrics
+from benchmarks.fakes import FakeGenaiClient, FakeSupabase, seed_tables
+from gemini_service import GeminiService
+
+STREAM_ROUTE = '/shifts/<shift_id>/analyze/stream'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(backend, 'supabase', FakeSupabase(seed_tables(recipients=1, shifts_per_recipient=2), latency=0))
+    monkeypatch.setattr(backend, 'gemini_service', GeminiService(client=FakeGenaiClient(latency=0)))
+    monkeypatch.setattr(backend, 'job_queue', None)
+    return backend.app.test_client()
+
+
+def test_structured_fallback_is_one_parse_observation():
+    service = GeminiService(client=FakeGenaiClient(latency=0, json_text='not json'), output_mode='json')
+    notes = [{'content': 'Ate lunch', 'caregiver_name': 'A', 'timestamp': '12:00'}]
+    fallbacks = metrics.STRUCTURED_FALLBACKS.value()
+    parses = metrics.STAGE_SECONDS.count('parse')
+
+    service.analyze_shift_notes(notes, 'Ann', {'date': '2024-03-01'})
+    assert metrics.STRUCTURED_FALLBACKS.value() == fallbacks + 1
+    assert metrics.STAGE_SECONDS.count('parse') == parses + 1
+
+
+def test_stream_latency_is_recorded_when_the_stream_ends(client):
+    requests = metrics.REQUEST_SECONDS.count(STREAM_ROUTE, 'GET')
+
+    response = client.get('/shifts/shift-0-0/analyze/stream', buffered=False)
+    assert response.status_code == 200
+    assert metrics.REQUEST_SECONDS.count(STREAM_ROUTE, 'GET') == requests
+
+    assert 'event: done' in response.get_data(as_text=True)
+    response.close()
+    assert metrics.REQUEST_SECONDS.count(STREAM_ROUTE, 'GET') == requests + 1
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from benchmarks.fakes import FakeGenaiClient
+from gemini_service import GeminiService
+from near_duplicates import NearDuplicateIndex
+
+ROUTINE = (
+    "Woke up at 7am in good spirits. Had porridge and tea for breakfast, finished the bowl. "
+    "Took morning medication with water, no issues. Walked in the garden for twenty minutes with the frame. "
+    "Lunch was rice with fish and vegetables. Napped after lunch for an hour. Watched television and chatted "
+    "about grandchildren. Dinner eaten well. Evening medication taken. Went to bed at 9pm, settled quickly."
+)
+DIFFERENT = "Refused breakfast, seemed confused and agitated. Fell near the bathroom, small bruise on left arm. Called nurse."
+PROFILE = {'id': 7, 'allergies': 'penicillin'}
+
+ANALYSIS_JSON = json.dumps({
+    'summary': 'On 2024-03-01 (Shift 1) the day followed the usual routine.',
+    'suggestions': ['Keep the walk in the garden after breakfast.'],
+    'priorities': ['Evening medication after the shift 1 handover.']
+})
+
+
+def notes(text):
+    return [{'content': text, 'caregiver_name': 'A', 'timestamp': '08:00'}]
+
+
+@pytest.fixture
+def service():
+    client = FakeGenaiClient(latency=0, json_text=ANALYSIS_JSON)
+    return GeminiService(client=client, near_duplicates=NearDuplicateIndex(threshold=0.85), output_mode='json')
+
+
+def test_lightly_edited_note_on_another_date_reuses_the_analysis(service):
+    first = service.analyze_shift_notes(notes(ROUTINE), 'Ann', {'date': '2024-03-01', 'shift_number': 1}, PROFILE)
+    assert 'near_duplicate' not in first
+
+    edited = ROUTINE.replace('twenty minutes', 'twenty five minutes')
+    reused = service.analyze_shift_notes(notes(edited), 'Ann', {'date': '2024-03-08', 'shift_number': 4}, PROFILE)
+    assert reused['near_duplicate']['similarity'] >= 0.85
+    assert service.client.models.calls == 1
+    # The reused text is re-stamped with the new shift's date and number
+    assert reused['summary'] == 'On 2024-03-08 (Shift 4) the day followed the usual routine.'
+    assert reused['priorities'] == ['Evening medication after the shift 4 handover.']
+    assert reused['suggestions'] == first['suggestions']
+
+
+def test_different_note_is_analyzed_by_the_model(service):
+    service.analyze_shift_notes(notes(ROUTINE), 'Ann', {'date': '2024-03-01', 'shift_number': 1}, PROFILE)
+    result = service.analyze_shift_notes(notes(DIFFERENT), 'Ann', {'date': '2024-03-08', 'shift_number': 1}, PROFILE)
+    assert 'near_duplicate' not in result
+    assert service.client.models.calls == 2
+
+
+def test_profile_change_stops_reuse(service):
+    service.analyze_shift_notes(notes(ROUTINE), 'Ann', {'date': '2024-03-01'}, PROFILE)
+    result = service.analyze_shift_notes(notes(ROUTINE), 'Ann', {'date': '2024-03-08'}, {**PROFILE, 'allergies': 'none'})
+    assert 'near_duplicate' not in result
+    assert service.client.models.calls == 2
@@ -0,0 +1,118 @@
+import base64
+import json
+
+import pytest
+from flask import Flask
+
+from pagination import (
+    MAX_PAGE_SIZE, PaginationError, decode_cursor, encode_cursor, page_response, parse_fields, parse_limit
+)
+
+KEYS = ['date', 'uuid']
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def raw_cursor(values) -> str:
+    """Cursor built by hand, the way a client tampering with one would"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+# ============= CURSORS =============
+
+@pytest.mark.parametrize('row', [
+    {'date': '2024-03-01', 'uuid': 'shift-1'},
+    {'date': None, 'uuid': 'shift-2'},
+    {'date': 20240301, 'uuid': 'shift-3', 'content': 'not part of the key'},
+])
+def test_cursor_round_trip(row):
+    cursor = encode_cursor(row, KEYS)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, KEYS) == [row['date'], row['uuid']]
+
+
+def test_missing_cursor_decodes_to_none():
+    assert decode_cursor(None, KEYS) is None
+    assert decode_cursor('', KEYS) is None
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    base64.urlsafe_b64encode(b'\xff\xfe').decode('ascii'),
+    raw_cursor('2024-03-01'),
+    raw_cursor(['2024-03-01']),
+    raw_cursor(['2024-03-01', 'shift-1', 'extra']),
+    raw_cursor([['2024-03-01'], 'shift-1']),
+    raw_cursor([{'a': 1}, 'shift-1']),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor, KEYS)
+
+
+@pytest.mark.parametrize('value', [
+    '2024-03-01,uuid.gt.x',
+    '2024-03-01)',
+    'or(uuid.neq.x',
+    '2024"',
+])
+def test_cursor_that_could_rewrite_the_filter_is_rejected(value):
+    with pytest.raises(PaginationError):
+        decode_cursor(raw_cursor([value, 'shift-1']), KEYS)
+
+
+# ============= QUERY PARAMETERS =============
+
+def test_limit_defaults_and_is_clamped(app):
+    with app.test_request_context('/shifts'):
+        assert parse_limit() >= 1
+    with app.test_request_context(f'/shifts?limit={MAX_PAGE_SIZE + 1}'):
+        assert parse_limit() == MAX_PAGE_SIZE
+    for bad in ('0', 'ten'):
+        with app.test_request_context(f'/shifts?limit={bad}'):
+            with pytest.raises(PaginationError):
+                parse_limit()
+
+
+def test_fields_always_include_the_key_columns(app):
+    with app.test_request_context('/shifts'):
+        assert parse_fields(KEYS) == '*'
+    with app.test_request_context('/shifts?fields=content,uuid,content'):
+        assert parse_fields(KEYS) == 'content,uuid,date'
+    with app.test_request_context('/shifts?fields=content,uuid.eq.x'):
+        with pytest.raises(PaginationError):
+            parse_fields(KEYS)
+
+
+# ============= PAGES =============
+
+def test_page_response_links_the_next_page(app):
+    rows = [{'date': f'2024-03-0{i}', 'uuid': f'shift-{i}'} for i in range(1, 4)]
+    with app.test_request_context('/shifts?limit=2&fields=uuid'):
+        response = page_response(rows, 2, KEYS)
+    assert json.loads(response.get_data()) == rows[:2]
+    cursor = response.headers['X-Next-Cursor']
+    assert decode_cursor(cursor, KEYS) == ['2024-03-02', 'shift-2']
+    assert f'cursor={cursor}' in response.headers['Link']
+    assert 'limit=2' in response.headers['Link']
+
+
+def test_last_page_has_no_cursor(app):
+    rows = [{'date': '2024-03-01', 'uuid': 'shift-1'}]
+    with app.test_request_context('/shifts?limit=2'):
+        response = page_response(rows, 2, KEYS)
+    assert 'X-Next-Cursor' not in response.headers
+    assert 'Link' not in response.headers
+
+
+def test_matching_etag_gives_empty_304(app):
+    rows = [{'date': '2024-03-01', 'uuid': 'shift-1'}]
+    app.add_url_rule('/shifts', 'shifts', lambda: page_response(rows, 2, KEYS))
+    client = app.test_client()
+    etag = client.get('/shifts').headers['ETag']
+    response = client.get('/shifts', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers):
+    """Call flight.do from `callers` threads at once; returns (results, errors)"""
+    results, errors = [], []
+    barrier = threading.Barrier(callers)
+
+    def call():
+        barrier.wait()
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def _blocking(result=None, error=None):
+    """fn that counts its calls and blocks until released, so followers pile up"""
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        if error:
+            raise error
+        return result
+
+    return fn, release, calls
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    fn, release, calls = _blocking(result={'summary': 'ok', 'suggestions': ['a']})
+    threading.Timer(0.2, release.set).start()
+
+    results, errors = _run_concurrently(flight, 'key', fn, callers=5)
+
+    assert errors == []
+    assert len(calls) == 1
+    assert results == [{'summary': 'ok', 'suggestions': ['a']}] * 5
+    stats = flight.stats()
+    assert stats['leaders'] == 1 and stats['coalesced'] == 4 and stats['in_flight'] == 0
+
+
+def test_followers_get_copies_of_the_result():
+    flight = SingleFlight()
+    fn, release, _ = _blocking(result={'suggestions': []})
+    threading.Timer(0.2, release.set).start()
+
+    results, _ = _run_concurrently(flight, 'key', fn, callers=3)
+
+    results[0]['suggestions'].append('changed')
+    assert sum(1 for r in results if r['suggestions'] == []) == 2
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+    fn, release, calls = _blocking(error=RuntimeError('model down'))
+    threading.Timer(0.2, release.set).start()
+
+    results, errors = _run_concurrently(flight, 'key', fn, callers=4)
+
+    assert results == [] and len(calls) == 1
+    assert len(errors) == 4 and all(str(e) == 'model down' for e in errors)
+
+
+def test_key_is_free_again_after_an_error():
+    flight = SingleFlight()
+
+    def failing():
+        raise ValueError('first')
+
+    with pytest.raises(ValueError):
+        flight.do('key', failing)
+    assert flight.do('key', lambda: 'second') == 'second'
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    assert flight.stats()['leaders'] == 2
+
+
+def test_async_calls_share_one_run_and_error():
+    flight = SingleFlight()
+    calls = []
+
+    async def ok():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'summary': 'ok'}
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError('model down')
+
+    async def main():
+        results = await asyncio.gather(*(flight.do_async('ok', ok) for _ in range(5)))
+        errors = await asyncio.gather(*(flight.do_async('bad', failing) for _ in range(3)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert results == [{'summary': 'ok'}] * 5
+    assert all(isinstance(e, RuntimeError) for e in errors) and len(errors) == 3
+    assert len(calls) == 2
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_waiting_leader_reuses_result_from_another_worker(tmp_path):
+    # Two SingleFlights sharing a lock dir stand in for two worker processes,
+    # and `shared` for the analysis cache both of them read
+    first, second = SingleFlight(str(tmp_path)), SingleFlight(str(tmp_path))
+    shared = {}
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        shared['key'] = 'computed'
+        return 'computed'
+
+    thread = threading.Thread(target=first.do, args=('key', compute))
+    thread.start()
+    assert started.wait(5)
+    threading.Timer(0.2, release.set).start()
+
+    assert second.do('key', lambda: 'second call', recheck=lambda: shared.get('key')) == 'computed'
+    thread.join(5)
+    assert second.stats()['shared_across_workers'] == 1
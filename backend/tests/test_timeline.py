@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from benchmarks.fakes import FakeGenaiClient
+from gemini_service import GeminiService
+from model_router import ModelRouter
+from summary_store import SummaryStore
+from timeline import RecipientTimeline
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SummaryStore(str(tmp_path / 'summaries.db'))
+
+
+def service(fast_model='gemini-fast-1'):
+    router = ModelRouter(analysis_model='gemini-analysis', fast_model=fast_model)
+    return GeminiService(client=FakeGenaiClient(latency=0), router=router)
+
+
+def shifts(days):
+    """One shift a day from Monday 2024-03-04 on, so the first weeks are complete"""
+    start = datetime.date(2024, 3, 4)
+    return [{
+        'uuid': f'shift-{n}',
+        'care_recipient_id': 'recipient-1',
+        'date': (start + datetime.timedelta(days=n)).isoformat(),
+        'content': f'Day {n}: ate breakfast, took medication and walked in the garden.'
+    } for n in range(days)]
+
+
+def build(gemini_service, store, history):
+    return RecipientTimeline(gemini_service, store).build_digest(history, current_date='2024-03-20')
+
+
+def test_complete_weeks_are_digested_once(store):
+    history = shifts(16)
+    _, stats = build(service(), store, history)
+    assert (stats['digests_generated'], stats['summaries_generated']) == (2, 16)
+
+    _, stats = build(service(), store, history)
+    assert (stats['digests_reused'], stats['digests_generated'], stats['summaries_generated']) == (2, 0, 0)
+
+
+def test_changing_the_summary_model_regenerates_weekly_digests(store):
+    history = shifts(16)
+    build(service('gemini-fast-1'), store, history)
+
+    _, stats = build(service('gemini-fast-2'), store, history)
+    assert (stats['digests_reused'], stats['digests_generated']) == (0, 2)
+
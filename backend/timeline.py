@@ -0,0 +1,154 @@
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from summary_store import SummaryStore
+
+if TYPE_CHECKING:
+    from admission import Admitter
+
+TIMELINE_CONCURRENCY = int(os.getenv('TIMELINE_CONCURRENCY', 4))
+
+
+class RecipientTimeline:
+    """
+    Builds a compact rolling digest of a care recipient's earlier shifts.
+
+    Two levels: each shift is summarized once with generate_shift_summary and
+    the summary is kept in the SummaryStore; the summaries of each complete
+    earlier calendar week are then condensed into one weekly digest, stored
+    per recipient and ISO week. Shifts from the current week, and from the
+    oldest week when the window starts partway into it, are listed as
+    individual summaries, so a digest never covers part of a week and is
+    reused as the window moves forward. A new analysis normally only pays
+    for the newest shift's summary. `admit` (an Admitter) is charged once and
+    holds a slot around each model call, so every parallel summary takes its
+    own admission slot.
+    """
+
+    def __init__(
+        self,
+        gemini_service,
+        summary_store: Optional[SummaryStore] = None,
+        concurrency: int = TIMELINE_CONCURRENCY,
+        admit: 'Admitter' = None
+    ):
+        self.gemini_service = gemini_service
+        self.summary_store = summary_store
+        self.concurrency = max(1, concurrency)
+        self.admit = admit
+
+    def build_digest(
+        self,
+        shifts: List[Dict],
+        current_date: str = None,
+        care_recipient_id=None,
+        truncated: bool = False
+    ) -> Tuple[Optional[str], Dict]:
+        """
+        Digest of `shifts` (oldest first, each with 'uuid', 'date' and 'content').
+        Shifts in the same week as current_date (default: the newest shift) are
+        kept as individual summaries. `truncated` means the recipient has older
+        shifts than these, so the oldest week is partial and kept as individual
+        summaries too. Returns (digest text or None, stats).
+        """
+        stats = {
+            'shifts_covered': len(shifts),
+            'summaries_reused': 0,
+            'summaries_generated': 0,
+            'digests_reused': 0,
+            'digests_generated': 0
+        }
+        if not shifts:
+            return None, stats
+
+        summaries = self._shift_summaries(shifts, stats)
+        current_week = _week_of(current_date or shifts[-1].get('date'))
+        partial_week = _week_of(shifts[0].get('date')) if truncated else None
+        if care_recipient_id is None:
+            care_recipient_id = shifts[0].get('care_recipient_id')
+
+        # Group consecutive summaries by calendar week, oldest first
+        weeks = []
+        for shift, summary in zip(shifts, summaries):
+            if not summary:
+                continue
+            week = _week_of(shift.get('date'))
+            if not weeks or weeks[-1][0] != week:
+                weeks.append((week, []))
+            weeks[-1][1].append((shift.get('date') or '', summary))
+
+        lines = []
+        for week, entries in weeks:
+            if week in (current_week, partial_week) or len(entries) == 1:
+                lines.extend(f"- {date}: {summary}" for date, summary in entries)
+            else:
+                digest = self._digest_week(care_recipient_id, week, entries, stats)
+                lines.append(f"- {entries[0][0]} to {entries[-1][0]}: {digest}")
+
+        stats['digest_chars'] = sum(len(line) for line in lines)
+        return '\n'.join(lines), stats
+
+    def _shift_summaries(self, shifts: List[Dict], stats: Dict) -> List[Optional[str]]:
+        """Stored summary per shift, generating the missing ones in parallel"""
+        summaries = [
+            self.summary_store.get_shift_summary(shift['uuid'], shift.get('content'))
+            if self.summary_store else None
+            for shift in shifts
+        ]
+        missing = [i for i, summary in enumerate(summaries) if summary is None]
+        stats['summaries_reused'] += len(shifts) - len(missing)
+
+        def summarize(i):
+            shift = shifts[i]
+            summary = self.gemini_service.generate_shift_summary([{
+                'content': shift.get('content'),
+                'caregiver_name': 'Shift Caregiver',
+                'timestamp': shift.get('date', '')
+            }], admit=self.admit)
+            if self.gemini_service.summary_failed(summary):
+                return None
+            if self.summary_store:
+                self.summary_store.set_shift_summary(shift['uuid'], shift.get('content'), summary)
+            return summary
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(missing))) as executor:
+                for i, summary in zip(missing, executor.map(summarize, missing)):
+                    summaries[i] = summary
+                    if summary:
+                        stats['summaries_generated'] += 1
+        return summaries
+
+    def _digest_week(self, care_recipient_id, week: str, entries: List[Tuple[str, str]], stats: Dict) -> str:
+        """Condense one complete week of (date, summary) entries, reusing the stored digest"""
+        notes = [{'caregiver_name': date, 'content': summary} for date, summary in entries]
+        # An edited shift or a change of the (routed) summary model regenerates the week's digest
+        content = self.gemini_service.summary_model(notes) + '\0' + '\n'.join(
+            f"{date}: {summary}" for date, summary in entries
+        )
+        store = self.summary_store if care_recipient_id is not None else None
+
+        digest = store.get_weekly_digest(care_recipient_id, week, content) if store else None
+        if digest is not None:
+            stats['digests_reused'] += 1
+            return digest
+
+        digest = self.gemini_service.generate_shift_summary(notes, admit=self.admit)
+        if self.gemini_service.summary_failed(digest):
+            # Fall back to the uncondensed summaries rather than losing the history
+            return ' '.join(summary for _, summary in entries)
+
+        stats['digests_generated'] += 1
+        if store:
+            store.set_weekly_digest(care_recipient_id, week, content, digest)
+        return digest
+
+
+def _week_of(date_value) -> str:
+    """ISO year-week of a 'YYYY-MM-DD...' date, or the raw value if it does not parse"""
+    try:
+        year, week, _ = datetime.date.fromisoformat(str(date_value)[:10]).isocalendar()
+        return f"{year}-W{week:02d}"
+    except ValueError:
+        return str(date_value)
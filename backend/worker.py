@@ -0,0 +1,93 @@
+"""
+Background worker that precomputes shift analyses from the job queue.
+
+Run next to the web app, on the same host and sharing the same
+JOBS_DB_PATH (the queue is a local SQLite file, see SETUP.md):
+    python worker.py
+
+JOB_WORKER_CONCURRENCY sets how many analyses run at once (default 2),
+JOB_POLL_INTERVAL how long to sleep when the queue is empty (default 2s).
+"""
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import app as backend
+from admission import PRIORITY_BACKGROUND
+
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 2))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 2))
+
+
+def run_job(job):
+    """Analyze the shift's current content and store the result, or schedule a retry"""
+    queue = backend.job_queue
+    try:
+        shift, care_recipient_profile = backend._load_shift_with_recipient(job['shift_id'])
+        if not shift:
+            queue.fail(job, 'Shift not found')
+            return
+
+        fingerprint = backend._analysis_fingerprint(shift, care_recipient_profile)
+        if not shift.get('content'):
+            queue.store_result(shift['uuid'], fingerprint, backend._empty_analysis())
+            queue.complete(job['id'])
+            return
+
+        # Skip the model call if the stored result already matches these inputs
+        if queue.get_result(shift['uuid'], fingerprint) is not None:
+            queue.complete(job['id'])
+            return
+
+        # Background work yields to interactive requests for Gemini slots; a
+        # shed job fails here and is retried with backoff
+        analysis = backend._analyze_and_store(
+            shift, care_recipient_profile, backend._admitter(priority=PRIORITY_BACKGROUND)
+        )
+        if analysis.get('error'):
+            queue.fail(job, analysis['error'])
+            return
+
+        queue.complete(job['id'])
+        print(f"Job {job['id']}: analyzed shift {shift['uuid']}")
+    except Exception as e:
+        print(f"Job {job['id']}: error analyzing shift {job['shift_id']}: {e}")
+        queue.fail(job, str(e))
+
+
+def main():
+    if not backend.job_queue:
+        raise SystemExit('Background jobs are disabled (JOBS_BACKEND=none)')
+    if not backend.gemini_service or not backend.supabase:
+        raise SystemExit('Worker needs both GEMINI_API_KEY and SUPABASE_URL/SUPABASE_ANON_KEY configured')
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        print('Stopping worker after in-flight jobs finish...')
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Analysis worker started with concurrency {JOB_WORKER_CONCURRENCY}")
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=JOB_WORKER_CONCURRENCY) as executor:
+        while not stopping:
+            # Only claim as many jobs as there are free slots, so leases are not wasted
+            while len(in_flight) < JOB_WORKER_CONCURRENCY:
+                job = backend.job_queue.claim()
+                if job is None:
+                    break
+                in_flight.add(executor.submit(run_job, job))
+
+            if in_flight:
+                _, in_flight = wait(in_flight, timeout=JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(JOB_POLL_INTERVAL)
+
+
+if __name__ == '__main__':
+    main()